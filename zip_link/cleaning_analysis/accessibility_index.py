@@ -1,47 +1,348 @@
+import warnings
+from contextlib import contextmanager
+import numpy as np
 import pandas as pd
+from zip_link.cleaning_analysis.raw_sources import read_raw, zip_prefix_filter
+from zip_link.cleaning_analysis.storage import read_table, write_table
+from zip_link.cleaning_analysis.zip_codes import zip_codes
 
-def calculate_accessibility_index(path):
+# Services making up the Accessibility Index, in the order of the weight vectors
+SERVICE_COLUMNS = [
+    "total_healthcare_services",
+    "park_count",
+    "grocery_store_count",
+    "num_public_transit_stops",
+    "school_count",
+]
+
+
+@contextmanager
+def nan_quiet():
+    # Divisions by zero and all-NaN columns give NaN without warnings, as in pandas
+    with np.errstate(divide="ignore", invalid="ignore"), warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        yield
+
+
+# Missing counts are skipped by the column statistics, as pandas does, and stay missing in their own cell
+def minmax(values):
+    with nan_quiet():
+        return (values - np.nanmin(values, axis=0)) / (np.nanmax(values, axis=0) - np.nanmin(values, axis=0))
+
+
+def zscore(values):
+    with nan_quiet():
+        return (values - np.nanmean(values, axis=0)) / np.nanstd(values, axis=0)
+
+
+def percentile(values):
+    # Average rank of each value in its column, scaled to [0, 1]
+    ranks = pd.DataFrame(values).rank(axis=0, method="average").to_numpy()
+    return (ranks - 1) / max(len(values) - 1, 1)
+
+
+def share_of_max(values):
+    with nan_quiet():
+        return values / np.nanmax(values, axis=0)
+
+
+# Column normalization strategies, each takes and returns a (ZIPs x services) array
+NORMALIZATIONS = {"minmax": minmax, "zscore": zscore, "percentile": percentile, "max": share_of_max}
+
+
+def per_capita_index(normalized, weights, population, area):
+    # The Accessibility Index: weighted normalized services per resident
+    return normalized @ weights / population
+
+
+def per_sq_mile_index(normalized, weights, population, area):
+    return normalized @ weights / area
+
+
+def zscore_index(normalized, weights, population, area):
+    # Services per resident standardized across ZIPs, then averaged with the weights
+    return zscore(normalized / population[:, None]) @ weights / weights.sum()
+
+
+def percentile_index(normalized, weights, population, area):
+    # Share of ZIPs with a lower Accessibility Index
+    return percentile(per_capita_index(normalized, weights, population, area)[:, None])[:, 0]
+
+
+def log_index(normalized, weights, population, area):
+    # Accessibility Index per 100,000 residents on a log scale, so the few small ZIPs with very high ratios do not flatten the others
+    return np.log1p(100_000 * per_capita_index(normalized, weights, population, area))
+
+
+# Index definitions, each takes the shared (ZIPs x services) normalized matrix, the weights, the population and the area in square miles
+INDEX_DEFINITIONS = {"per_capita": per_capita_index, "per_sq_mile": per_sq_mile_index, "zscore": zscore_index,
+                     "percentile": percentile_index, "log": log_index}
+
+# Square feet in a square mile, the unit of SHAPE_AREA in the ZIP boundaries
+SQ_FEET_PER_SQ_MILE = 5280 ** 2
+
+
+def accessibility_scores(values, population, weights=None, normalization="minmax"):
+    """
+    Accessibility engine: normalizes every service column and scores any number
+    of weight vectors in one matrix product, all in memory.
+
+    Inputs:
+    values (array or dataframe): (ZIPs x services) counts, columns in SERVICE_COLUMNS order
+    population (array): Population of each ZIP
+    weights (array): One weight per service, or a (configurations x services) batch; all 1 by default
+    normalization (str or callable): Key of NORMALIZATIONS, or a function of the values array
+
+    Returns:
+    normalized (array): (ZIPs x services) normalized values
+    index (array): Weighted normalized services per person, (ZIPs,) or (ZIPs x configurations) for a batch
+    normalized_index (array): index rescaled to [0, 1] per configuration and rounded to 2 decimals
+    """
+    values = np.asarray(values, dtype=float)
+    population = np.asarray(population, dtype=float)
+    weights = np.ones(values.shape[1]) if weights is None else np.asarray(weights, dtype=float)
+    if isinstance(normalization, str) and normalization not in NORMALIZATIONS:
+        raise ValueError(f"normalization must be one of {sorted(NORMALIZATIONS)} or a function, got '{normalization}'")
+    normalize = NORMALIZATIONS[normalization] if isinstance(normalization, str) else normalization
+
+    normalized = normalize(values)
+    # (ZIPs x services) @ (services x configurations), divided by each ZIP's population;
+    # a missing service adds nothing, like the skipna sum of the original index
+    with np.errstate(divide="ignore", invalid="ignore"):
+        index = (np.nan_to_num(normalized, nan=0.0) @ weights.T) / (population[:, None] if weights.ndim == 2 else population)
+
+    # Rescale with (max - min) rounded to 6 decimal places, as the dashboard always has
+    with nan_quiet():
+        low, high = np.nanmin(index, axis=0), np.nanmax(index, axis=0)
+        normalized_index = np.round((index - low) / np.round(high - low, 6), 2)
+    return normalized, index, normalized_index
+
+
+def score_weight_sets(df, weight_sets, normalization="minmax"):
+    """
+    Scores a batch of weight configurations in a single engine call.
+
+    Inputs:
+    df (dataframe): Merged dataset with Zip Code, Population and SERVICE_COLUMNS
+    weight_sets (dict): Configuration name -> weights for SERVICE_COLUMNS (list, or dict service -> weight, missing services 0)
+    normalization (str or callable): See accessibility_scores
+
+    Returns:
+    scores (dataframe): Zip Code and the Normalized Accessibility Index of each configuration
+    """
+    weights = np.array([[w.get(col, 0) for col in SERVICE_COLUMNS] if isinstance(w, dict) else w
+                        for w in weight_sets.values()], dtype=float)
+    _, _, normalized_index = accessibility_scores(df[SERVICE_COLUMNS], df["Population"], weights, normalization)
+    scores = pd.DataFrame(normalized_index, columns=list(weight_sets), index=df.index)
+    return pd.concat([df[["Zip Code"]], scores], axis=1)
+
+
+def zip_areas(boundaries_path=None, transit_path=None, zip_prefix="606"):
+    """
+    Area of every ZIP in square miles, from the SHAPE_AREA of the ZIP boundaries
+    if the metro has them, else from the ZCTA_AREA20 of the transit file.
+
+    Inputs:
+    boundaries_path (str): CSV of the ZIP polygons, None to use the transit file
+    transit_path (str): Raw transit file, the registered one if None
+    zip_prefix (str): ZIP prefix of the metro, for the transit file
+
+    Returns:
+    areas (dataframe): Zip Code and area_sq_miles
+    """
+    if boundaries_path is not None:
+        df = pd.read_csv(boundaries_path, usecols=["ZIP", "SHAPE_AREA"], dtype={"ZIP": str})
+        # ZIPs split in several polygons have one row per polygon
+        areas = df.groupby("ZIP", as_index=False)["SHAPE_AREA"].sum()
+        areas = pd.DataFrame({"Zip Code": areas["ZIP"], "area_sq_miles": areas["SHAPE_AREA"] / SQ_FEET_PER_SQ_MILE})
+    else:
+        df = read_raw("zcta_areas", transit_path, predicate=zip_prefix_filter("ZCTA20", zip_prefix))
+        areas = pd.DataFrame({"Zip Code": df["ZCTA20"], "area_sq_miles": pd.to_numeric(df["ZCTA_AREA20"], errors="coerce")})
+    areas["Zip Code"] = zip_codes(areas["Zip Code"])
+    return areas
+
+
+def index_definitions(data, areas, weights=None, normalization="minmax", definitions=INDEX_DEFINITIONS, sink=None):
+    """
+    Computes every index definition from one normalized feature matrix, so the
+    dashboard can switch between them without recomputing anything.
+
+    Inputs:
+    data (path or dataframe): Merged dataset with Zip Code, Population and SERVICE_COLUMNS
+    areas (dataframe): Zip Code and area_sq_miles (see zip_areas)
+    weights (list): One weight per service in SERVICE_COLUMNS, equal weights by default
+    normalization (str or callable): See accessibility_scores
+    definitions (dict): Name -> index function, see INDEX_DEFINITIONS
+    sink (DiskSink or MemorySink): Where the table is saved as index_definitions, nothing is saved if None
+
+    Returns:
+    df (dataframe): Zip Code and one <name>_index column per definition
+    """
+    df = read_table(data) if isinstance(data, str) else data
+    normalized, _, _ = accessibility_scores(df[SERVICE_COLUMNS], df["Population"], weights, normalization)
+    weights = np.ones(len(SERVICE_COLUMNS)) if weights is None else np.asarray(weights, dtype=float)
+    population = df["Population"].to_numpy(dtype=float)
+    area = zip_codes(df["Zip Code"]).map(dict(zip(areas["Zip Code"], areas["area_sq_miles"]))).to_numpy(dtype=float)
+
+    result = pd.DataFrame({"Zip Code": df["Zip Code"].to_numpy()})
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for name, definition in definitions.items():
+            result[f"{name}_index"] = definition(normalized, weights, population, area)
+
+    if sink is not None:
+        sink.write("index_definitions", result)
+    return result
+
+
+def rank_columns(index):
+    """
+    Rank of every ZIP (1 = most accessible) in each column of a (ZIPs x samples) index.
+    """
+    order = np.argsort(-index, axis=0, kind="stable")
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, np.arange(1, len(index) + 1)[:, None], axis=0)
+    return ranks
+
+
+def baseline_discordance(ranks, base_rank):
+    """
+    For each ZIP, the number of other ZIPs whose order with it is not the baseline
+    order, summed over the samples. The ZIPs are walked in baseline order and, in
+    each sample, those already walked that rank better are counted with a Fenwick
+    tree (one per sample, updated for the whole batch at once): O(n log n) per
+    sample instead of comparing every pair.
+
+    Inputs:
+    ranks (array): (ZIPs x samples) ranks, see rank_columns
+    base_rank (array): Rank of every ZIP in the baseline
+
+    Returns:
+    discordant (array): Per ZIP, the sum over the samples of its flipped pairs
+    """
+    n, batch = ranks.shape
+    order = np.argsort(base_rank, kind="stable")
+    walked = ranks[order]
+    tree = np.zeros((batch, n + 2), dtype=np.int64)  # Column n + 1 absorbs the updates past the end
+    columns = np.arange(batch)
+    steps = n.bit_length() + 1
+    better = np.empty_like(walked)
+    for k in range(n):
+        # ZIPs ahead of this one in the baseline that also rank better in the sample
+        position, count = walked[k] - 1, np.zeros(batch, dtype=np.int64)
+        for _ in range(steps):
+            count += tree[columns, position]
+            position = position - (position & -position)
+        better[k] = count
+        position = walked[k].copy()
+        for _ in range(steps):
+            tree[columns, position] += 1
+            position = np.minimum(position + (position & -position), n + 1)
+
+    # Flipped: ahead in the baseline but ranking worse, or behind and ranking better
+    ahead = np.arange(n)[:, None]
+    discordant = np.empty(n, dtype=np.int64)
+    discordant[order] = (ahead - better + walked - 1 - better).sum(axis=1)
+    return discordant
+
+
+def weight_sensitivity(df, samples=100_000, concentration=1.0, normalization="minmax", batch_size=5_000, seed=0, sink=None):
+    """
+    Monte Carlo sensitivity of the ZIP rankings to the service weights: weight
+    vectors are drawn from a Dirichlet distribution and every batch of them is
+    scored in one accessibility_scores call. Ranks are only kept as running counts
+    of the (ZIP, rank) pairs that occur, and pair flips are counted against the
+    baseline order (see baseline_discordance), so neither memory nor time grows
+    with the number of ZIP pairs or samples kept.
+
+    Inputs:
+    df (dataframe): Merged dataset with Zip Code, Population and SERVICE_COLUMNS
+    samples (int): Number of weight vectors
+    concentration (float): Dirichlet parameter of every service, 1 is uniform over all
+    weightings, larger values stay closer to equal weights
+    normalization (str or callable): See accessibility_scores
+    batch_size (int): Weight vectors scored per matrix product
+    seed (int): Seed of the random generator
+    sink (DiskSink or MemorySink): Where the summary is saved as weight_sensitivity, nothing is saved if None
+
+    Returns:
+    summary (dataframe): Per Zip Code, its rank with equal weights, the 5th, 50th and 95th
+    percentile and range of its ranks, the probability its rank changes and the probability
+    that its order with another ZIP flips (averaged over the other ZIPs)
+    """
+    rng = np.random.default_rng(seed)
+    n = len(df)
+    _, base_index, _ = accessibility_scores(df[SERVICE_COLUMNS], df["Population"], normalization=normalization)
+    base_rank = rank_columns(base_index[:, None])[:, 0]
+
+    # Running counts: each (ZIP, rank) pair seen as the code ZIP * n + rank - 1, with its count
+    codes, counts = np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    unchanged = np.zeros(n, dtype=np.int64)
+    discordant = np.zeros(n, dtype=np.int64)
+    for start in range(0, samples, batch_size):
+        weights = rng.dirichlet(np.full(len(SERVICE_COLUMNS), concentration), size=min(batch_size, samples - start))
+        _, index, _ = accessibility_scores(df[SERVICE_COLUMNS], df["Population"], weights, normalization)
+        ranks = rank_columns(index)
+        batch_codes, batch_counts = np.unique(np.arange(n)[:, None] * n + ranks - 1, return_counts=True)
+        codes, position = np.unique(np.concatenate([codes, batch_codes]), return_inverse=True)
+        counts = np.bincount(position, weights=np.concatenate([counts, batch_counts]), minlength=len(codes)).astype(np.int64)
+        unchanged += (ranks == base_rank[:, None]).sum(axis=1)
+        discordant += baseline_discordance(ranks, base_rank)
+
+    # Codes are sorted by ZIP then rank, so each ZIP's ranks are one run
+    zip_of, rank = codes // n, codes % n + 1
+    starts = np.searchsorted(zip_of, np.arange(n))
+    ends = np.searchsorted(zip_of, np.arange(n), side="right")
+    total = np.cumsum(counts)
+    cumulative = (total - np.concatenate([[0], total])[starts][zip_of]) / samples
+
+    def percentile(q):
+        reached = np.flatnonzero(cumulative >= q / 100)
+        return rank[reached[np.searchsorted(zip_of[reached], np.arange(n))]]
+
+    summary = pd.DataFrame({
+        "Zip Code": df["Zip Code"].to_numpy(),
+        "baseline_rank": base_rank,
+        "rank_p05": percentile(5),
+        "rank_median": percentile(50),
+        "rank_p95": percentile(95),
+        "rank_min": rank[starts],
+        "rank_max": rank[ends - 1],
+        "rank_change_probability": 1 - unchanged / samples,
+        "flip_probability": discordant / samples / max(n - 1, 1),
+    })
+
+    if sink is not None:
+        sink.write("weight_sensitivity", summary)
+    return summary
+
+
+def calculate_accessibility_index(data, sink=None, weights=None, normalization="minmax"):
     """
      Computes the Accessibility Index by normalizing individual service counts per ZIP code,
-     then using these normalized values to compute the index.
-    """
-    df = pd.read_csv(path)
-
-    # List of variables to normalize
-    service_columns = [
-        "total_healthcare_services",
-        "park_count",
-        "grocery_store_count",
-        "num_public_transit_stops",
-        "school_count",
-    ]
-
-    # Normalize each service variable
-    for col in service_columns:
-        min_val = df[col].min()
-        max_val = df[col].max()
-        df[f"normalized_{col}"] = (df[col] - min_val) / (max_val - min_val)
-
-    # Compute total normalized services count per ZIP code
-    df["total_normalized_services"] = df[
-        [f"normalized_{col}" for col in service_columns]
-    ].sum(axis=1)
-
-    # Compute Accessibility Index using normalized values
-    df["Accessibility Index"] = df["total_normalized_services"] / df["Population"]
-
-    min_index = df["Accessibility Index"].min()
-    max_index = df["Accessibility Index"].max()
-    
-    # Round (max - min) to 6 decimal places 
-    max_min_diff = round(max_index - min_index, 6)
-
-    # Normalize the Accessibility Index 
-    df["Normalized Accessibility Index"] = (
-        (df["Accessibility Index"] - min_index) / max_min_diff
-    ).round(2)
-    
+     then using these normalized values to compute the index (see accessibility_scores).
+
+     Input:
+     data (path or dataframe): Merged dataset, or the path of the saved one
+     sink (DiskSink or MemorySink): Where the dataset with the index is saved as zipatlas_bulk_merge.
+     Without a sink, a dataset read from a path is written back to that path.
+     weights (list): One weight per service in SERVICE_COLUMNS, equal weights by default
+     normalization (str or callable): How the service columns are normalized, min-max by default
+    """
+    df = read_table(data) if isinstance(data, str) else data.copy()
+
+    normalized, index, normalized_index = accessibility_scores(df[SERVICE_COLUMNS], df["Population"], weights, normalization)
+    df[[f"normalized_{col}" for col in SERVICE_COLUMNS]] = normalized
+
+    # Compute total weighted normalized services count per ZIP code (Accessibility Index times Population)
+    weights = np.ones(len(SERVICE_COLUMNS)) if weights is None else np.asarray(weights, dtype=float)
+    df["total_normalized_services"] = np.nan_to_num(normalized, nan=0.0) @ weights
+    df["Accessibility Index"] = index
+    df["Normalized Accessibility Index"] = normalized_index
+
     # Save updated combined dataset
-    df.to_csv("data/preprocessed/zipatlas_bulk_merge.csv", index=False)
+    if sink is not None:
+        sink.write("zipatlas_bulk_merge", df)
+    elif isinstance(data, str):
+        write_table(df, data)
     print("Accessibility Index calculated using normalized variables and added to the dataset.")
     return df[["Zip Code", "Accessibility Index", "Normalized Accessibility Index"]]
@@ -1,7 +1,8 @@
 import pandas as pd
-import os
+from zip_link.cleaning_analysis.raw_sources import read_raw, zip_prefix_filter
+from zip_link.cleaning_analysis.zip_codes import zip_codes, count_by_zip
 
-def clean_parks_data(path):
+def clean_parks_data(path, sink=None):
 
     """
     Preprocesses the raw parks data by:
@@ -14,14 +15,14 @@ def clean_parks_data(path):
 
      Input:
      path (str): Takes the path of the raw parks data 
+     sink (DiskSink or MemorySink): Where the cleaned data is saved, nothing is saved if None
 
      Returns:
      zip_counts (dataframe): Zip Code and count of parks
 
     """
 
-    df = pd.read_csv(path)
-    df = df[['PARK', 'LOCATION', 'ZIP', 'PARK_CLASS']] # Subset cols
+    df = read_raw("parks", path)  # Only reads the PARK, LOCATION, ZIP and PARK_CLASS cols
 
     # Drop null rows if either PARK or ZIP is empty
     df = df.dropna(subset=['PARK', 'ZIP'])
@@ -30,19 +31,19 @@ def clean_parks_data(path):
     df = df[df['PARK'].str.contains(r'[a-zA-Z]', na=False)]
 
     # Ensure ZIP is 5 digits
-    df['ZIP'] = df['ZIP'].astype(str).str[:5].str.zfill(5)
+    df['ZIP'] = zip_codes(df['ZIP'])
 
     # Rename columns and drop duplicates 
     df.columns = ['Park', 'Location', 'Zip Code', 'Park_Class']
     df = df.drop_duplicates()
 
     # Get park_count for each Zip Code 
-    zip_counts = df["Zip Code"].value_counts().reset_index()
-    zip_counts.columns = ["Zip Code", "park_count"]
-    df.to_csv("data/preprocessed/park_data.csv", index=False)
+    zip_counts = count_by_zip(df["Zip Code"], "park_count")
+    if sink is not None:
+        sink.write("park_data", df)
     return zip_counts
  
-def clean_grocery_data(path):
+def clean_grocery_data(path, sink=None):
 
     """
     Preprocesses the raw grocery stores data by:
@@ -54,16 +55,15 @@ def clean_grocery_data(path):
 
      Input:
      path (str): Takes the path of the raw grocery stores data 
+     sink (DiskSink or MemorySink): Where the cleaned data is saved, nothing is saved if None
 
      Returns:
      zip_counts (dataframe): Zip Code and count of grocery stores
 
     """
-    df = pd.read_csv(path)
-    # Filter open stores only
-    df = df[df['New status'] == 'OPEN']
+    df = read_raw("grocery_stores", path)  # Only keeps OPEN stores while reading
     # Ensure Zip Code is 5 digits long
-    df['Zip'] = df['Zip'].astype(str).str[:5].str.zfill(5) 
+    df['Zip'] = zip_codes(df['Zip'])
 
     # Remove unnecessary spaces
     df['Store Name'] = df['Store Name'].str.replace(r'\s+', ' ', regex=True).str.strip()
@@ -77,96 +77,99 @@ def clean_grocery_data(path):
     df.columns = ['GroceryStore', 'Address', 'Zip Code', 'Status']
 
     # Calculate Grocery Store Count for each Zip Code
-    zip_counts = df["Zip Code"].value_counts().reset_index()
-    zip_counts.columns = ["Zip Code", "grocery_store_count"]
-    df.to_csv("data/preprocessed/grocery_store_data.csv", index=False)
+    zip_counts = count_by_zip(df["Zip Code"], "grocery_store_count")
+    if sink is not None:
+        sink.write("grocery_store_data", df)
     return zip_counts
 
-def clean_publictransit_data(path):
+def clean_publictransit_data(path, sink=None, zip_prefix="606"):
 
     """
     Preprocesses the public transit data by:
-     - Ensuring Zip Codes are 5 digits and extracting relevant ones starting with 606
+     - Ensuring Zip Codes are 5 digits and extracting relevant ones starting with zip_prefix
      - Filtering columns and enaming them
 
      Input:
      path (str): Takes the path of the raw public transit data 
+     sink (DiskSink or MemorySink): Where the cleaned data is saved, nothing is saved if None
+     zip_prefix (str): ZIP prefix of the metro, 606 for Chicago
 
      Returns:
      df (dataframe): Zip Code and count of public transit stops
 
     """  
-    df = pd.read_csv(path)
-    # Filter relevant Zip Codes
-    df['ZCTA20'] = df['ZCTA20'].astype(str).str[:5].str.zfill(5)
-    df = df[df['ZCTA20'].str.startswith('606')]
-    df= df[['ZCTA20', 'COUNT_NTM_STOPS']]
+    # Only reads the two cols and the ZCTAs of the metro
+    df = read_raw("public_transit", path, predicate=zip_prefix_filter("ZCTA20", zip_prefix))
+    df['ZCTA20'] = zip_codes(df['ZCTA20'])
     df.columns = ['Zip Code', 'num_public_transit_stops']
-    df.to_csv("data/preprocessed/public_transit_data.csv", index=False)
+    if sink is not None:
+        sink.write("public_transit_data", df)
     return df 
 
-def clean_hospital_data(path):
+def clean_hospital_data(path, sink=None):
 
     """
     Cleans the hospital data by:
     - Dropping missing values
     - Ensuring ZIP code is 5 digits
     - Removing duplicates
-    - Saving cleaned data to preprocessed folder
+    - Saving cleaned data to the sink
 
     Input:
     path (str): Takes the path of the raw hospital data 
+    sink (DiskSink or MemorySink): Where the cleaned data is saved, nothing is saved if None
 
     Returns:
     zip_hospital_counts (dataframe): Zip Code and count of hospitals
 
     """
-    df = pd.read_csv(path)
+    df = read_raw("hospitals", path)
     df = df.dropna(subset=['Hospital Name', 'ZIP Code'])  # Drop null values
-    df['ZIP Code'] = df['ZIP Code'].astype(str).str[:5].str.zfill(5)  # Standardize ZIP codes
+    df['ZIP Code'] = zip_codes(df['ZIP Code'])  # Standardize ZIP codes
     df.columns = ['Hospital Name', 'Zip Code']  # Rename columns
     df = df.drop_duplicates()  # Remove duplicates
         
     # Count hospitals per ZIP code
-    zip_hospital_counts = df["Zip Code"].value_counts().reset_index()
-    zip_hospital_counts.columns = ["Zip Code", "hospital_count"]
+    zip_hospital_counts = count_by_zip(df["Zip Code"], "hospital_count")
         
     # Save cleaned data
-    df.to_csv("data/preprocessed/hospital_data.csv", index=False)
+    if sink is not None:
+        sink.write("hospital_data", df)
     return zip_hospital_counts
 
-def clean_school_data(path):
+def clean_school_data(path, sink=None):
         
     """
     Cleans the school data by:
     - Dropping missing values
     - Ensuring ZIP code is 5 digits
     - Removing duplicates
-    - Saving cleaned data to preprocessed folder
+    - Saving cleaned data to the sink
 
     Input:
     path (str): Takes the path of the raw school data 
+    sink (DiskSink or MemorySink): Where the cleaned data is saved, nothing is saved if None
 
     Returns:
     zip_school_counts (dataframe): Zip Code and public school count
 
     """
-    df = pd.read_csv(path)
+    df = read_raw("schools", path)
     df = df.dropna(subset=['School Name', 'Zip Code'])  # Drop null values
-    df['Zip Code'] = df['Zip Code'].astype(str).str[:5].str.zfill(5)  # Standardize ZIP codes
+    df['Zip Code'] = zip_codes(df['Zip Code'])  # Standardize ZIP codes
     df = df.drop_duplicates()  # Remove duplicates
         
     # Count hospitals per ZIP code
-    zip_school_counts = df["Zip Code"].value_counts().reset_index()
-    zip_school_counts.columns = ["Zip Code", "school_count"]
+    zip_school_counts = count_by_zip(df["Zip Code"], "school_count")
         
     # Save cleaned data
-    df.to_csv("data/preprocessed/school_data.csv", index=False)
+    if sink is not None:
+        sink.write("school_data", df)
     return zip_school_counts
 
 
 
-def clean_population_data(path):
+def clean_population_data(path, sink=None):
 
     """
     Cleans the population data by:
@@ -175,18 +178,19 @@ def clean_population_data(path):
     - Standardizing ZIP codes to 5 digits
     - Removing duplicates
     - Aggregating population per ZIP code
-    - Saving cleaned data to preprocessed folder
+    - Saving cleaned data to the sink
     - Returning the cleaned DataFrame
 
     Input:
     path (str): Takes the path of the raw population data 
+    sink (DiskSink or MemorySink): Where the cleaned data is saved, nothing is saved if None
 
     Returns:
     population_df (dataframe): Zip Code and population
 
     """
     # Load the dataset
-    population_df = pd.read_csv(path)
+    population_df = read_raw("population", path)
 
     # Keep only relevant columns and rename them
     population_df = population_df[['Entity properties name', 'Variable observation value']].rename(columns={
@@ -198,7 +202,7 @@ def clean_population_data(path):
     population_df = population_df.dropna(subset=['Zip Code', 'Population'])
 
     # Ensure ZIP codes are standardized (5 digits)
-    population_df['Zip Code'] = population_df['Zip Code'].astype(str).str[:5].str.zfill(5)
+    population_df['Zip Code'] = zip_codes(population_df['Zip Code'])
 
     # Convert Population to integer
     population_df['Population'] = pd.to_numeric(population_df['Population'], errors='coerce').fillna(0).astype(int)
@@ -207,8 +211,7 @@ def clean_population_data(path):
     population_df = population_df.drop_duplicates()
 
     # Save cleaned data
-    output_path = "data/preprocessed/population_data.csv"
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)  # Ensure directory exists
-    population_df.to_csv(output_path, index=False)
+    if sink is not None:
+        sink.write("population_data", population_df)
 
     return population_df  
\ No newline at end of file
@@ -0,0 +1,181 @@
+import re
+import jellyfish
+import numpy as np
+import pandas as pd
+from rapidfuzz import process
+from rapidfuzz.distance import JaroWinkler
+
+
+# Blocking keys. A key function takes a record (dict) and returns a hashable
+# key, or None to leave the record out of that key's blocks.
+
+def phone_key(record):
+    """
+    Blocking key: digits of the telephone number. Two records can only match with
+    the same number, so blocking on it never loses a match. Missing numbers (NaN)
+    never match and get no key.
+    """
+    phone = record["Telephone Number"]
+    if isinstance(phone, float) and phone != phone:
+        return None
+    return re.sub(r"\D", "", str(phone))
+
+
+def zip_name_key(record, prefix=4):
+    """
+    Blocking key: Zip Code and the first letters of the lowercased facility name.
+    Only adds candidates; with the telephone rule of fuzzy_match they are already in the phone blocks.
+    """
+    name = str(record["Health Center Facility"]).lower().strip()
+    return (record.get("Zip Code"), name[:prefix])
+
+
+def candidate_pairs(records, keys):
+    """
+    Blocking stage of fuzzy_match: groups the records by each key function and
+    returns, for every record, the later records sharing at least one key with it.
+
+    Input:
+    records (list): Records as dicts
+    keys (list): Functions of a record returning a hashable key, or None to leave it out
+
+    Returns:
+    candidates (dict): Record position -> sorted positions of its later candidates
+    """
+    candidates = {}
+    for key in keys:
+        blocks = {}
+        for i, record in enumerate(records):
+            k = key(record)
+            if k is not None:
+                blocks.setdefault((key.__name__, k), []).append(i)
+        for block in blocks.values():
+            for n, i in enumerate(block):
+                if n + 1 < len(block):
+                    candidates.setdefault(i, set()).update(block[n + 1:])
+    return {i: sorted(js) for i, js in candidates.items()}
+
+
+def match_rule(name_sim, addr_sim, same_phone, threshold):
+    """
+    The health center matching rule: name or address similarity above the
+    threshold and the same telephone number. Works on single values or arrays.
+    """
+    return ((name_sim > threshold) | (addr_sim > threshold)) & same_phone
+
+
+def address_similarity(a, b):
+    # 0 when either address is missing or empty
+    return jellyfish.jaro_winkler_similarity(a, b) if isinstance(a, str) and isinstance(b, str) and a and b else 0
+
+
+def is_match(rec1, rec2, threshold=0.85):
+    """
+    match_rule applied to one pair of records (dicts or rows).
+    """
+    name_sim = jellyfish.jaro_winkler_similarity(rec1["Health Center Facility"], rec2["Health Center Facility"])
+    addr_sim = address_similarity(rec1["Address"], rec2["Address"])
+    return bool(match_rule(name_sim, addr_sim, rec1["Telephone Number"] == rec2["Telephone Number"], threshold))
+
+
+def jaro_winkler_batch(left, right):
+    """
+    Jaro-Winkler similarity of left[k] and right[k] for every k, as
+    jellyfish.jaro_winkler_similarity, scored in one call to rapidfuzz's
+    process.cpdist (compiled, all cores) instead of one Python call per pair.
+
+    Inputs:
+    left (list): Strings
+    right (list): Strings, same length as left
+
+    Returns:
+    sims (array): float64 similarities, 0 when either string is empty
+    """
+    left, right = np.asarray(left, dtype=str), np.asarray(right, dtype=str)
+    if len(left) == 0:
+        return np.zeros(0)
+    sims = process.cpdist(left, right, scorer=JaroWinkler.normalized_similarity, dtype=np.float64, workers=-1)
+    # rapidfuzz scores two empty strings 1, jellyfish 0
+    return np.where((np.char.str_len(left) == 0) | (np.char.str_len(right) == 0), 0.0, sims)
+
+
+def find_clusters(n, pairs):
+    """
+    Connected components of the matched pairs with union-find, so a chain
+    A~B, B~C ends up in one cluster whatever the row order.
+
+    Inputs:
+    n (int): Number of records
+    pairs (iterable): (i, j) positions of matched records
+
+    Returns:
+    roots (array): For each record, the smallest position of its cluster
+    """
+    parent = list(range(n))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]  # Path halving
+            i = parent[i]
+        return i
+
+    for i, j in pairs:
+        ri, rj = find(i), find(j)
+        if ri != rj:
+            parent[max(ri, rj)] = min(ri, rj)
+    return np.array([find(i) for i in range(n)], dtype=np.int64)
+
+
+def canonical_order(df):
+    """
+    Positions of the records from most to least complete (non-empty fields),
+    ties broken by the record values, so the choice never depends on row order.
+    """
+    filled = df.notna() & df.astype(str).apply(lambda col: col.str.strip() != "")
+    sort_df = df.astype(str).assign(_filled=-filled.sum(axis=1).to_numpy(), _pos=np.arange(len(df)))
+    return sort_df.sort_values(["_filled"] + list(df.columns) + ["_pos"])["_pos"].to_numpy()
+
+
+def resolve_entities(df, threshold=0.85, keys=(phone_key,)):
+    """
+    Entity resolution mode of fuzzy_match: every candidate pair (see candidate_pairs)
+    is scored in one batch (see jaro_winkler_batch), pairs matching match_rule
+    (name or address above the threshold and the same telephone number) are
+    linked, and each connected cluster is reduced to one canonical record, its
+    most complete one.
+
+    Input:
+    df (dataframe): combined_df with all rows from the pdf and HRSA data
+    threshold (float): Cut off for similarity
+    keys (list): Blocking key functions, phone_key by default
+
+    Returns:
+    records (dataframe): df with a cluster_id column
+    canonical (dataframe): One record per cluster with its cluster_id and cluster_size, by cluster_id
+    """
+    df = df.reset_index(drop=True)
+    candidates = candidate_pairs(df.to_dict(orient="records"), keys)
+    left = np.array([i for i, js in candidates.items() for _ in js], dtype=np.int64)
+    right = np.array([j for js in candidates.values() for j in js], dtype=np.int64)
+
+    names = df["Health Center Facility"].astype(str).to_numpy()
+    addresses = df["Address"].fillna("").astype(str).to_numpy()
+    phones = df["Telephone Number"].to_numpy(dtype=object)
+    name_sim = jaro_winkler_batch(names[left], names[right])
+    addr_sim = jaro_winkler_batch(addresses[left], addresses[right])  # 0 if either address is empty
+    same_phone = np.array([p == q for p, q in zip(phones[left], phones[right])], dtype=bool)
+    matched = match_rule(name_sim, addr_sim, same_phone, threshold)
+
+    roots = find_clusters(len(df), zip(left[matched], right[matched]))
+
+    # First record of each cluster in canonical order is its canonical record
+    order = canonical_order(df)
+    first = pd.Series(order).groupby(roots[order], sort=False).first()
+    canonical = df.iloc[first.to_numpy()].copy()
+
+    # Clusters are numbered in canonical record order, which does not depend on row order either
+    cluster_ids = pd.Series(np.arange(len(first)), index=first.index)
+    canonical.insert(0, "cluster_id", np.arange(len(first)))
+    canonical["cluster_size"] = np.bincount(roots, minlength=len(df))[first.index]
+    records = df.assign(cluster_id=cluster_ids.loc[roots].to_numpy())
+    return records, canonical.reset_index(drop=True)
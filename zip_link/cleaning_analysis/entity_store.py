@@ -0,0 +1,156 @@
+import numpy as np
+import pandas as pd
+from zip_link.cleaning_analysis.entity_resolution import canonical_order, resolve_entities, is_match
+
+# Persistent store of deduplicated health centers, kept in a sink next to the cleaned tables:
+# every source row seen, with its normalized keys and entity, and the canonical record of each entity
+SOURCES_TABLE = "health_center_sources"
+ENTITIES_TABLE = "health_center_entities"
+FIELDS = ["Health Center Facility", "Address", "Telephone Number", "Zip Code"]
+
+
+def normalize_rows(df, source):
+    """
+    Source rows in store format: the record fields, a hash of them to spot new and
+    changed rows, and the normalized phone used to find candidate entities (see phone_key).
+
+    Input:
+    df (dataframe): Rows from process_health_data or get_hrsa_data
+    source (str): Name of the source, e.g. 'pdf' or 'hrsa'
+
+    Returns:
+    rows (dataframe)
+    """
+    rows = df[FIELDS].astype(object).reset_index(drop=True)
+    rows["Zip Code"] = rows["Zip Code"].astype(str)
+    rows["source"] = source
+    rows["row_hash"] = pd.util.hash_pandas_object(rows[FIELDS], index=False).to_numpy()
+    phones = rows["Telephone Number"]
+    rows["phone_key"] = phones.where(phones.isna(), phones.astype(str).str.replace(r"\D", "", regex=True))
+    return rows
+
+
+def load_entity_store(sink):
+    """
+    Returns:
+    sources (dataframe): Stored source rows with their entity_id, empty on the first run
+    entities (dataframe): Canonical record of each entity
+    """
+    try:
+        return sink.read(SOURCES_TABLE), sink.read(ENTITIES_TABLE)
+    except (FileNotFoundError, KeyError):
+        sources = normalize_rows(pd.DataFrame(columns=FIELDS), "").assign(entity_id=pd.Series(dtype="int64"))
+        return sources, pd.DataFrame(columns=["entity_id"] + FIELDS)
+
+
+def update_entity_store(sink, sources_by_name, threshold=0.85):
+    """
+    Brings the persistent entity store up to date with the current extracts of
+    each source, doing work proportional to what changed:
+    - rows already in the store (same hash) are left alone
+    - rows no longer in an extract are removed, and the entities they belonged to
+      are re-clustered from their remaining rows (a removed row may have linked two groups)
+    - new or changed rows are compared only with the stored rows of their phone
+      block and join every entity they match; entities joined by one row are merged
+
+    The phone blocks and the members of each entity are indexed once when the
+    store is loaded and kept up to date as rows come and go, so a row only
+    looks at its own block and a merge only relabels the merged entities.
+    Stored entities keep their entity_id, new ones get the next free ids.
+
+    Input:
+    sink (DiskSink or MemorySink): Where the store is kept
+    sources_by_name (dict): Source name -> current rows (process_health_data / get_hrsa_data output)
+    threshold (float): Cut off for similarity
+
+    Returns:
+    entities (dataframe): entity_id and canonical record of every health center
+    """
+    sources, entities = load_entity_store(sink)
+    sources = sources.reset_index(drop=True)
+    next_id = int(sources["entity_id"].max()) + 1 if len(sources) else 0
+    touched = set()
+
+    # Row labels of every phone block, entity and source
+    blocks = {key: set(rows) for key, rows in sources.groupby("phone_key").indices.items()}
+    members = {entity_id: set(rows) for entity_id, rows in sources.groupby("entity_id").indices.items()}
+    by_source = {name: set(rows) for name, rows in sources.groupby("source").indices.items()}
+    removed_rows = set()
+
+    for name, df in sources_by_name.items():
+        rows = normalize_rows(df, name)
+        stored = sorted(by_source.get(name, set()))
+        stored_hashes = sources.loc[stored, "row_hash"]
+        removed = stored_hashes.index[~stored_hashes.isin(rows["row_hash"])]
+        added = rows[~rows["row_hash"].isin(stored_hashes)]
+
+        # Removed rows leave their block, source and entity
+        emptied = set()
+        for label in removed:
+            entity_id = sources.at[label, "entity_id"]
+            members[entity_id].discard(label)
+            by_source[name].discard(label)
+            if isinstance(sources.at[label, "phone_key"], str):
+                blocks[sources.at[label, "phone_key"]].discard(label)
+            emptied.add(entity_id)
+        removed_rows.update(removed)
+        touched.update(emptied)
+
+        # A removed row may have been the only link inside its entity, so the remaining rows are clustered again
+        for entity_id in [e for e in emptied if members[e]]:
+            labels = sorted(members[entity_id])
+            records, _ = resolve_entities(sources.loc[labels, FIELDS], threshold)
+            split = records["cluster_id"].to_numpy()
+            if split.max() > 0:
+                new_ids = np.where(split == 0, entity_id, next_id + split - 1)
+                sources.loc[labels, "entity_id"] = new_ids
+                for label, new_id in zip(labels, new_ids):
+                    if new_id != entity_id:
+                        members[entity_id].discard(label)
+                        members.setdefault(new_id, set()).add(label)
+                touched.update(new_ids)
+                next_id += int(split.max())
+
+        # New and changed rows are only compared with the rows of their phone block
+        if len(added):
+            start = sources.index.max() + 1 if len(sources) else 0
+            added = added.assign(entity_id=-1).set_axis(range(start, start + len(added)))
+            sources = pd.concat([df for df in [sources, added] if len(df)])
+            for label in added.index:
+                row = sources.loc[label]
+                block = blocks.setdefault(row["phone_key"], set()) if isinstance(row["phone_key"], str) else set()
+                matched = {sources.at[i, "entity_id"] for i in block if is_match(row, sources.loc[i], threshold)}
+                if matched:
+                    # The row links every entity it matches into one; only their members are relabeled
+                    entity_id = min(matched)
+                    for other in matched - {entity_id}:
+                        labels = members.pop(other)
+                        sources.loc[sorted(labels), "entity_id"] = entity_id
+                        members[entity_id].update(labels)
+                else:
+                    entity_id, next_id = next_id, next_id + 1
+                sources.at[label, "entity_id"] = entity_id
+                members.setdefault(entity_id, set()).add(label)
+                by_source.setdefault(name, set()).add(label)
+                block.add(label)
+                touched.update(matched | {entity_id})
+        print(f"[{name}] {len(added)} new or changed rows, {len(removed)} removed")
+
+    if not touched:
+        return entities
+
+    # Canonical records are recomputed only for the entities that changed
+    sources["entity_id"] = sources["entity_id"].astype("int64")
+    changed_labels = sorted(label for entity_id in touched for label in members.get(entity_id, ()))
+    changed = sources.loc[changed_labels].reset_index(drop=True)
+    order = canonical_order(changed[FIELDS])
+    first = pd.Series(order).groupby(changed["entity_id"].to_numpy()[order]).first()
+    kept = entities[~entities["entity_id"].isin(touched)]
+    canonical = changed.loc[first.to_numpy(), ["entity_id"] + FIELDS]
+    entities = pd.concat([df for df in [kept, canonical] if len(df)]) if len(kept) or len(canonical) else kept
+    entities = entities.sort_values("entity_id").reset_index(drop=True)
+    entities["entity_id"] = entities["entity_id"].astype("int64")
+
+    sink.write(SOURCES_TABLE, sources.drop(index=sorted(removed_rows)).reset_index(drop=True))
+    sink.write(ENTITIES_TABLE, entities)
+    return entities
@@ -0,0 +1,178 @@
+from dataclasses import dataclass
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+from scipy.sparse import coo_matrix, csr_matrix
+from shapely import STRtree
+from zip_link.cleaning_analysis.accessibility_index import accessibility_scores
+from zip_link.cleaning_analysis.raw_sources import read_raw
+from zip_link.cleaning_analysis.spatial_access import zip_centroids, two_step_fca, CATCHMENT_RADIUS
+
+# Distance from a hexagon's center to its corners, in meters
+HEX_SIZE = 500.0
+
+# Services scored in every cell, in the order of the weight vectors of hex_index
+HEX_SERVICES = ["grocery_access", "park_access"]
+
+
+@dataclass
+class HexSurface:
+    """
+    Hex grid covering a metro's ZIPs.
+
+    cells (array): Hexagons in the projected CRS
+    crs: Projected CRS of the cells (meters)
+    zips (list): Zip Codes, in matrix row order
+    population (array): Population of each cell, apportioned from the ZIPs by area
+    matrix (csr_matrix): Sparse (ZIPs x cells) roll up: entry (zip, cell) is the share of the ZIP's
+    area, so of its population, lying in the cell, and each row sums to 1. matrix @ cell_values is
+    the population weighted mean of the cells of each ZIP, matrix.T @ zip_totals spreads ZIP totals over the cells
+    """
+    cells: np.ndarray
+    crs: object
+    zips: list
+    population: np.ndarray
+    matrix: csr_matrix
+
+    def assign(self, geoms):
+        """
+        Cell of each facility (its point, or a point on its polygon) with one
+        vectorized point-in-polygon query, -1 outside the grid.
+        """
+        points = shapely.point_on_surface(geoms)
+        point_idx, cell_idx = STRtree(self.cells).query(points, predicate="intersects")
+        cell_of = np.full(len(points), -1)
+        # A point on the edge of two cells goes to the first one
+        first = np.unique(point_idx, return_index=True)[1]
+        cell_of[point_idx[first]] = cell_idx[first]
+        return cell_of
+
+
+def hex_cells(bounds, size=HEX_SIZE):
+    """
+    Pointy-top hexagons of the given size tiling a bounding box.
+
+    Inputs:
+    bounds (tuple): (minx, miny, maxx, maxy) in meters
+    size (float): Center to corner distance in meters
+
+    Returns:
+    cells (array): Shapely polygons
+    """
+    minx, miny, maxx, maxy = bounds
+    width, height = np.sqrt(3) * size, 1.5 * size
+    rows = np.arange(int(np.ceil((maxy - miny) / height)) + 2)
+    cols = np.arange(int(np.ceil((maxx - minx) / width)) + 2)
+    row, col = [a.ravel() for a in np.meshgrid(rows, cols, indexing="ij")]
+    # Odd rows are shifted by half a hexagon
+    centers_x = minx + col * width + (row % 2) * width / 2
+    centers_y = miny + row * height
+
+    angles = np.radians(30 + 60 * np.arange(6))
+    corners = np.stack([centers_x[:, None] + size * np.cos(angles), centers_y[:, None] + size * np.sin(angles)], axis=-1)
+    return shapely.polygons(corners)
+
+
+def build_hex_surface(zones, size=HEX_SIZE):
+    """
+    Tiles the ZIP polygons with hexagons, keeping the cells that overlap a ZIP,
+    and precomputes the sparse cell to ZIP matrix from the overlap areas.
+
+    Inputs:
+    zones (GeoDataFrame): Zip Code, Population and geometry, one row per ZIP (see zip_centroids)
+    size (float): Hexagon size in meters
+
+    Returns:
+    surface (HexSurface)
+    """
+    crs = zones.estimate_utm_crs()
+    zone_geoms = np.asarray(zones.to_crs(crs).geometry.values)
+    cells = hex_cells(shapely.total_bounds(zone_geoms), size)
+
+    # Overlap of every (ZIP, cell) pair found by the tree, as a share of the ZIP's area
+    zip_idx, cell_idx = STRtree(cells).query(zone_geoms, predicate="intersects")
+    overlap = shapely.area(shapely.intersection(zone_geoms[zip_idx], cells[cell_idx]))
+    keep = overlap > 0
+    zip_idx, cell_idx, share = zip_idx[keep], cell_idx[keep], overlap[keep] / shapely.area(zone_geoms)[zip_idx[keep]]
+
+    # Drop the cells outside every ZIP and renumber the others
+    used, cols = np.unique(cell_idx, return_inverse=True)
+    matrix = coo_matrix((share, (zip_idx, cols)), shape=(len(zones), len(used))).tocsr()
+    population = matrix.T @ zones["Population"].to_numpy(dtype=float)
+    return HexSurface(cells[used], crs, list(zones["Zip Code"]), population, matrix)
+
+
+def hex_access_data(population, boundaries_path, grocery_path=None, parks_path=None, size=HEX_SIZE,
+                    radius=CATCHMENT_RADIUS, decay="gaussian", sink=None):
+    """
+    Sub-ZIP accessibility surface: grocery stores and parks are counted per hex
+    cell, each cell gets the two-step floating catchment access of its center
+    (see spatial_access.two_step_fca) with the population apportioned to it, and
+    the precomputed cell to ZIP matrix rolls the cells back up to ZIPs.
+
+    Inputs:
+    population (dataframe): Zip Code and Population
+    boundaries_path (str): CSV of the ZIP polygons
+    grocery_path, parks_path (str): Raw files, the registered ones if None
+    size (float): Hexagon size in meters
+    radius (float), decay (str or callable): See two_step_fca
+    sink (DiskSink or MemorySink): Where hex_cells (one row per cell, WKT geometry in WGS84)
+    and hex_cell_zip (the matrix entries) are saved, nothing is saved if None
+
+    Returns:
+    cells (dataframe): One row per cell
+    surface (HexSurface): To roll other cell values up to ZIPs with surface.matrix @ cell_values
+    """
+    zones = zip_centroids(boundaries_path, population)
+    surface = build_hex_surface(zones, size)
+    centers = shapely.centroid(surface.cells)
+
+    groceries = read_raw("grocery_points", grocery_path).dropna(subset=["Location"])
+    parks = read_raw("park_shapes", parks_path).dropna(subset=["the_geom"])
+    facilities = {
+        "grocery": np.asarray(gpd.GeoSeries(shapely.from_wkt(groceries["Location"]), crs="EPSG:4326").to_crs(surface.crs).values),
+        "park": np.asarray(gpd.GeoSeries(shapely.from_wkt(parks["the_geom"]), crs="EPSG:4326").to_crs(surface.crs).values),
+    }
+
+    cells = pd.DataFrame({
+        "cell_id": np.arange(len(surface.cells)),
+        "geometry": shapely.to_wkt(gpd.GeoSeries(surface.cells, crs=surface.crs).to_crs("EPSG:4326").values, rounding_precision=6),
+        "Population": surface.population,
+    })
+    for name, geoms in facilities.items():
+        cell_of = surface.assign(geoms)
+        cells[f"{name}_count"] = np.bincount(cell_of[cell_of >= 0], minlength=len(cells))
+        cells[f"{name}_access"] = two_step_fca(centers, surface.population, geoms, radius=radius, decay=decay) * 1000
+
+    if sink is not None:
+        sink.write("hex_cells", cells)
+        entries = surface.matrix.tocoo()
+        sink.write("hex_cell_zip", pd.DataFrame({
+            "Zip Code": np.asarray(surface.zips)[entries.row], "cell_id": entries.col, "share": entries.data,
+        }))
+    return cells, surface
+
+
+def hex_index(cells, surface, weights=None, normalization="minmax"):
+    """
+    Accessibility index of every cell (see accessibility_scores, with the cell
+    access already per person) rolled up to ZIPs with one sparse product, for
+    one weight vector or a batch of them.
+
+    Inputs:
+    cells (dataframe): hex_access_data output
+    surface (HexSurface): The grid of the cells
+    weights (array): One weight per service in HEX_SERVICES, or a (configurations x services) batch
+    normalization (str or callable): See accessibility_scores
+
+    Returns:
+    cell_index (array): Index of each cell, (cells,) or (cells x configurations)
+    zip_index (dataframe): Zip Code and the population weighted mean index of its cells per configuration
+    """
+    _, cell_index, _ = accessibility_scores(cells[HEX_SERVICES], np.ones(len(cells)), weights, normalization)
+    rolled = surface.matrix @ cell_index
+    columns = ["hex_index"] if rolled.ndim == 1 else [f"hex_index_{i}" for i in range(rolled.shape[1])]
+    zip_index = pd.DataFrame(rolled.reshape(len(surface.zips), -1), columns=columns)
+    zip_index.insert(0, "Zip Code", surface.zips)
+    return cell_index, zip_index
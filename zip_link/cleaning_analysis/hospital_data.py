@@ -1,48 +1,104 @@
 import os
-import requests
-from lxml import html
+from lxml import etree
 import pandas as pd
+from zip_link.cleaning_analysis.http_session import make_client
 
 # URL of the webpage to scrape
-url = "https://cookcountysheriffil.gov/departments/c-c-s-p-d/cemeteries/hospitals-cook-county/"
+URL = "https://cookcountysheriffil.gov/departments/c-c-s-p-d/cemeteries/hospitals-cook-county/"
 
 # Headers for a real browser request
-headers = {
+HEADERS = {
     "User-Agent": "Mozilla/5.0"
 }
 
-# Request the webpage with headers
-response = requests.get(url, headers=headers)
-
-# Check if the request was successful
-if response.status_code == 200:
-    # Parse the HTML content with lxml
-    tree = html.fromstring(response.content)
-    
-    # Find all hospitals listed under Chicago
-    chicago_hospitals = []
-    
-    # Extract hospital names and ZIP codes 
-    for entry in tree.xpath("//td"):  
-        text = entry.text_content().strip()
-        lines = text.split("\n")
-        
-        if "Chicago, Illinois" in text:
-            name = lines[0].strip()
-            zip_code = lines[2].split(" ")[-1]  # Extract ZIP"
-            chicago_hospitals.append((name, zip_code))
-    
+# Define output path
+OUTPUT_FILE = "data/raw/hospitals/hospitals.csv"
+
+
+def parse_hospital_cell(text):
+    """
+    Extracts the hospital name and ZIP code from the text of one table cell.
+    A cell lists the name, street address and "City, State ZIP" on separate lines.
+
+    Input:
+    text (str): Text content of a <td>
+
+    Returns:
+    (name, zip_code) tuple for hospitals in Chicago, otherwise None
+    """
+    text = text.strip()
+    lines = text.split("\n")
+
+    if "Chicago, Illinois" in text and len(lines) > 2:
+        name = lines[0].strip()
+        zip_code = lines[2].split(" ")[-1]  # Extract ZIP
+        return name, zip_code
+    return None
+
+
+def iter_hospital_records(chunks):
+    """
+    Incrementally parses the hospitals page and yields (name, zip_code)
+    records as soon as each table cell is complete, freeing parsed cells
+    along the way so memory does not grow with the page size.
+
+    Input:
+    chunks (iterable): Bytes of the HTML page, e.g. from response.iter_bytes()
+
+    Yields:
+    (name, zip_code) tuples for hospitals in Chicago
+    """
+    parser = etree.HTMLPullParser(events=("end",), tag="td")
+
+    def drain():
+        for _, td in parser.read_events():
+            record = parse_hospital_cell(td.xpath("string()"))
+            if record:
+                yield record
+
+            # Drop the finished cell and the cells before it
+            td.clear(keep_tail=True)
+            while td.getprevious() is not None:
+                del td.getparent()[0]
+
+    for chunk in chunks:
+        parser.feed(chunk)
+        yield from drain()
+    parser.close()
+    yield from drain()
+
+
+def scrape_hospitals(url=URL, output_file=OUTPUT_FILE, use_cache=True, transport=None):
+    """
+    Scrapes the hospitals in Chicago from the Cook County Sheriff's page and
+    saves their names and ZIP codes as a CSV file. Nothing runs on import.
+
+    Input:
+    url (str): The webpage URL to scrape
+    output_file (path): Where the CSV file is saved
+    use_cache (bool): Revalidate against the on-disk response cache
+    transport (httpx.BaseTransport): Optional transport for the client
+
+    Returns:
+    df (dataframe): Hospital Name and ZIP Code, or None if the request failed
+    """
+    # Stream the webpage and parse cells as they arrive
+    with make_client(use_cache, transport=transport, headers=HEADERS, follow_redirects=True) as client:
+        with client.stream("GET", url) as response:
+            if response.status_code != 200:
+                print(f"Failed to fetch {url}, status code: {response.status_code}")
+                return None
+            chicago_hospitals = list(iter_hospital_records(response.iter_bytes()))
+
     # Convert to DataFrame
     df = pd.DataFrame(chicago_hospitals, columns=["Hospital Name", "ZIP Code"])
-     
-    # Define output path and ensure directory exists
-    output_dir = "data/raw/Hospitals"
-    os.makedirs(output_dir, exist_ok=True)
-    
-    output_file = os.path.join(output_dir, "hospitals.csv")
-    df.to_csv(output_file, index=False)
-    
 
+    # Ensure output directory exists
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    df.to_csv(output_file, index=False)
+    print(f"Data successfully saved to '{output_file}'.")
+    return df
 
-          
 
+if __name__ == "__main__":
+    scrape_hospitals()
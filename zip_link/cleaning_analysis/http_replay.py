@@ -0,0 +1,258 @@
+import argparse
+import hashlib
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+import httpx
+from zip_link.cleaning_analysis.storage import PACKAGE_DIR
+
+# How the scrapers reach the network, set through environment variables:
+#  - live (default): real requests through the shared session (see http_session)
+#  - record: like live, and every response is also saved as a fixture file
+#  - replay: responses are served from the fixture files, no network at all
+#  - server: requests are sent to a local stand-in server replaying the fixtures
+HTTP_MODE_ENV = "ZIP_LINK_HTTP_MODE"
+FIXTURE_DIR_ENV = "ZIP_LINK_HTTP_FIXTURES"
+REPLAY_SERVER_ENV = "ZIP_LINK_REPLAY_SERVER"
+
+FIXTURE_DIR = os.path.join(PACKAGE_DIR, "tests", "fixtures", "http")
+HTTP_MODES = ("live", "record", "replay", "server")
+
+# Header carrying the original URL of a request sent to the stand-in server
+REPLAY_URL_HEADER = "X-Replay-Url"
+
+
+class FixtureNotFound(LookupError):
+    pass
+
+
+def get_http_mode():
+    mode = os.environ.get(HTTP_MODE_ENV, "live").lower()
+    if mode not in HTTP_MODES:
+        raise ValueError(f"{HTTP_MODE_ENV} must be one of {HTTP_MODES}, got '{mode}'")
+    return mode
+
+
+def get_fixture_dir():
+    return os.environ.get(FIXTURE_DIR_ENV, FIXTURE_DIR)
+
+
+def fixture_name(method, url, body=b""):
+    """
+    File name of the fixture for a request: host plus a hash of the
+    method, url and request body.
+    """
+    digest = hashlib.sha256(method.upper().encode() + b" " + url.encode() + b"\n" + body).hexdigest()
+    return f"{urlsplit(url).hostname}-{digest[:16]}.json"
+
+
+def save_fixture(fixture_dir, request, status, headers, body):
+    """
+    Saves one request/response pair as a JSON fixture file.
+    """
+    os.makedirs(fixture_dir, exist_ok=True)
+    fixture = {
+        "method": request.method,
+        "url": str(request.url),
+        "request_body": request.content.decode("utf-8", errors="replace"),
+        "status": status,
+        "content_type": headers.get("content-type", ""),
+        "body": body.decode("utf-8"),
+    }
+    path = os.path.join(fixture_dir, fixture_name(request.method, str(request.url), request.content))
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(fixture, f, indent=1, ensure_ascii=False)
+
+
+def load_fixture(fixture_dir, method, url, body=b""):
+    """
+    Loads the fixture recorded for a request.
+
+    Returns:
+    (status, content_type, body) tuple
+    """
+    path = os.path.join(fixture_dir, fixture_name(method, url, body))
+    if not os.path.exists(path):
+        raise FixtureNotFound(f"No recorded response for {method} {url} in '{fixture_dir}'. "
+                              f"Run once with {HTTP_MODE_ENV}=record to capture it.")
+    with open(path, encoding="utf-8") as f:
+        fixture = json.load(f)
+    return fixture["status"], fixture["content_type"], fixture["body"].encode("utf-8")
+
+
+class RecordingTransport(httpx.BaseTransport):
+    """
+    Passes requests through and saves every response as a fixture.
+    """
+
+    def __init__(self, transport, fixture_dir=None):
+        self.transport = transport
+        self.fixture_dir = fixture_dir or get_fixture_dir()
+
+    def handle_request(self, request):
+        request.read()
+        response = self.transport.handle_request(request)
+        try:
+            body = response.read()
+        finally:
+            response.close()
+        save_fixture(self.fixture_dir, request, response.status_code, response.headers, body)
+        return httpx.Response(response.status_code, headers={"content-type": response.headers.get("content-type", "")},
+                              content=body, request=request)
+
+    def close(self):
+        self.transport.close()
+
+
+class AsyncRecordingTransport(httpx.AsyncBaseTransport):
+    """
+    Async version of RecordingTransport.
+    """
+
+    def __init__(self, transport, fixture_dir=None):
+        self.transport = transport
+        self.fixture_dir = fixture_dir or get_fixture_dir()
+
+    async def handle_async_request(self, request):
+        await request.aread()
+        response = await self.transport.handle_async_request(request)
+        try:
+            body = await response.aread()
+        finally:
+            await response.aclose()
+        save_fixture(self.fixture_dir, request, response.status_code, response.headers, body)
+        return httpx.Response(response.status_code, headers={"content-type": response.headers.get("content-type", "")},
+                              content=body, request=request)
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+class ReplayTransport(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    """
+    Serves every request from the fixture files without touching the network.
+    Works for both httpx.Client and httpx.AsyncClient.
+    """
+
+    def __init__(self, fixture_dir=None):
+        self.fixture_dir = fixture_dir or get_fixture_dir()
+
+    def replay(self, request, body):
+        status, content_type, content = load_fixture(self.fixture_dir, request.method, str(request.url), body)
+        return httpx.Response(status, headers={"content-type": content_type}, content=content, request=request)
+
+    def handle_request(self, request):
+        return self.replay(request, request.read())
+
+    async def handle_async_request(self, request):
+        return self.replay(request, await request.aread())
+
+
+def redirect_request(request, server_url, body):
+    """
+    Rewrites a request so it goes to the stand-in server, keeping the
+    original URL in a header for the fixture lookup.
+    """
+    headers = dict(request.headers)
+    headers.pop("host", None)
+    headers[REPLAY_URL_HEADER] = str(request.url)
+    return httpx.Request(request.method, server_url.rstrip("/") + "/replay", headers=headers, content=body)
+
+
+class ServerRedirectTransport(httpx.BaseTransport):
+    """
+    Sends every request to the local stand-in server instead of the real host.
+    """
+
+    def __init__(self, server_url, transport=None):
+        self.server_url = server_url
+        self.transport = transport or httpx.HTTPTransport()
+
+    def handle_request(self, request):
+        return self.transport.handle_request(redirect_request(request, self.server_url, request.read()))
+
+    def close(self):
+        self.transport.close()
+
+
+class AsyncServerRedirectTransport(httpx.AsyncBaseTransport):
+    """
+    Async version of ServerRedirectTransport.
+    """
+
+    def __init__(self, server_url, transport=None):
+        self.server_url = server_url
+        self.transport = transport or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request):
+        return await self.transport.handle_async_request(redirect_request(request, self.server_url, await request.aread()))
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+class ReplayServer:
+    """
+    Local HTTP server that replays the fixture files, so a full pipeline or
+    benchmark run can go through real sockets without reaching the internet.
+    Use as a context manager; `url` is where the scrapers should be pointed.
+    """
+
+    def __init__(self, fixture_dir=None, host="127.0.0.1", port=0):
+        fixture_dir = fixture_dir or get_fixture_dir()
+
+        class Handler(BaseHTTPRequestHandler):
+            def replay(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                url = self.headers.get(REPLAY_URL_HEADER, "")
+                try:
+                    status, content_type, content = load_fixture(fixture_dir, self.command, url, body)
+                except FixtureNotFound as e:
+                    status, content_type, content = 404, "text/plain", str(e).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            # Names required by BaseHTTPRequestHandler
+            def do_GET(self):  # noqa: N802
+                self.replay()
+
+            def do_POST(self):  # noqa: N802
+                self.replay()
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.url = f"http://{host}:{self.server.server_address[1]}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve recorded HTTP fixtures on a local port.")
+    parser.add_argument("--fixtures", default=FIXTURE_DIR)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    server = ReplayServer(args.fixtures, port=args.port)
+    print(f"Replaying fixtures from '{args.fixtures}' on {server.url} "
+          f"(set {HTTP_MODE_ENV}=server and {REPLAY_SERVER_ENV}={server.url})")
+    server.server.serve_forever()
@@ -0,0 +1,291 @@
+import asyncio
+import os
+import random
+import threading
+import time
+import httpx
+from zip_link.cleaning_analysis.http_replay import (get_http_mode, REPLAY_SERVER_ENV, ReplayTransport,
+                                                     ServerRedirectTransport, AsyncServerRedirectTransport,
+                                                     RecordingTransport, AsyncRecordingTransport)
+from zip_link.cleaning_analysis.response_cache import CachingTransport, AsyncCachingTransport
+
+# Defaults shared by every scraper
+TIMEOUT = 30
+MAX_CONNECTIONS = 10  # Connection pool size per client
+MAX_PER_HOST = 4  # Max requests in flight to one host
+MAX_RETRIES = 4
+BACKOFF = 0.5  # Base delay in seconds, doubled on every retry
+MAX_BACKOFF = 10
+
+# Responses worth retrying: rate limits and transient server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class SessionMetrics:
+    """
+    Thread-safe counters for the requests that went over the wire:
+    number of requests and retries, bytes received and latency.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.requests = 0
+            self.retries = 0
+            self.failures = 0
+            self.bytes = 0
+            self.total_latency = 0.0
+            self.max_latency = 0.0
+            self.by_host = {}
+
+    def record(self, host, latency, nbytes, retried=False, failed=False):
+        with self.lock:
+            self.requests += 1
+            self.retries += retried
+            self.failures += failed
+            self.bytes += nbytes
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+            self.by_host[host] = self.by_host.get(host, 0) + 1
+
+    def add_bytes(self, nbytes):
+        with self.lock:
+            self.bytes += nbytes
+
+    def summary(self):
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "retries": self.retries,
+                "failures": self.failures,
+                "bytes": self.bytes,
+                "mean_latency": self.total_latency / self.requests if self.requests else 0.0,
+                "max_latency": self.max_latency,
+                "by_host": dict(self.by_host),
+            }
+
+    def report(self):
+        s = self.summary()
+        return (f"HTTP: {s['requests']} requests, {s['retries']} retries, {s['failures']} failures, "
+                f"{s['bytes'] / 1024:.1f} KiB, mean latency {s['mean_latency']:.2f}s, max {s['max_latency']:.2f}s")
+
+
+# Counters shared by all sessions in the process
+METRICS = SessionMetrics()
+
+
+def backoff_delay(attempt, response=None, backoff=BACKOFF, max_backoff=MAX_BACKOFF):
+    """
+    Exponential backoff with full jitter. A numeric Retry-After header
+    from the server takes precedence.
+    """
+    if response is not None and response.headers.get("retry-after", "").isdigit():
+        return min(float(response.headers["retry-after"]), max_backoff)
+    return random.uniform(0, min(max_backoff, backoff * 2 ** attempt))
+
+
+class CountingStream(httpx.SyncByteStream):
+    """
+    Passes the chunks of a response body through, adding their size to the metrics as they go.
+    """
+
+    def __init__(self, stream, metrics):
+        self.stream = stream
+        self.metrics = metrics
+
+    def __iter__(self):
+        for chunk in self.stream:
+            self.metrics.add_bytes(len(chunk))
+            yield chunk
+
+    def close(self):
+        self.stream.close()
+
+
+class AsyncCountingStream(httpx.AsyncByteStream):
+    """
+    Async version of CountingStream.
+    """
+
+    def __init__(self, stream, metrics):
+        self.stream = stream
+        self.metrics = metrics
+
+    async def __aiter__(self):
+        async for chunk in self.stream:
+            self.metrics.add_bytes(len(chunk))
+            yield chunk
+
+    async def aclose(self):
+        await self.stream.aclose()
+
+
+class RetryTransport(httpx.BaseTransport):
+    """
+    Retries transient failures with exponential backoff and jitter, caps the
+    requests in flight per host and records every attempt in the metrics.
+    Retries are decided on the status and connection errors alone, so the body
+    is never read here and reaches the client as it streams in.
+    """
+
+    def __init__(self, transport, max_retries=MAX_RETRIES, backoff=BACKOFF, max_per_host=MAX_PER_HOST, metrics=METRICS):
+        self.transport = transport
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_per_host = max_per_host
+        self.metrics = metrics
+        self.host_slots = {}
+        self.lock = threading.Lock()
+
+    def host_slot(self, host):
+        with self.lock:
+            if host not in self.host_slots:
+                self.host_slots[host] = threading.BoundedSemaphore(self.max_per_host)
+            return self.host_slots[host]
+
+    def handle_request(self, request):
+        host = request.url.host
+        request.read()
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            start = time.perf_counter()
+            try:
+                with self.host_slot(host):
+                    response = self.transport.handle_request(request)
+            except httpx.TransportError:
+                self.metrics.record(host, time.perf_counter() - start, 0, retried=attempt > 0, failed=last_attempt)
+                if last_attempt:
+                    raise
+                time.sleep(backoff_delay(attempt, backoff=self.backoff))
+                continue
+
+            # Latency is the time to the response headers, the body bytes are counted as they are read
+            retry = response.status_code in RETRY_STATUSES and not last_attempt
+            self.metrics.record(host, time.perf_counter() - start, 0, retried=attempt > 0,
+                                failed=response.status_code in RETRY_STATUSES and last_attempt)
+            if not retry:
+                return httpx.Response(response.status_code, headers=response.headers,
+                                      stream=CountingStream(response.stream, self.metrics), request=request,
+                                      extensions=response.extensions)
+            response.close()
+            time.sleep(backoff_delay(attempt, response, backoff=self.backoff))
+
+    def close(self):
+        self.transport.close()
+
+
+class AsyncRetryTransport(httpx.AsyncBaseTransport):
+    """
+    Async version of RetryTransport.
+    """
+
+    def __init__(self, transport, max_retries=MAX_RETRIES, backoff=BACKOFF, max_per_host=MAX_PER_HOST, metrics=METRICS):
+        self.transport = transport
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_per_host = max_per_host
+        self.metrics = metrics
+        self.host_slots = {}
+
+    def host_slot(self, host):
+        if host not in self.host_slots:
+            self.host_slots[host] = asyncio.Semaphore(self.max_per_host)
+        return self.host_slots[host]
+
+    async def handle_async_request(self, request):
+        host = request.url.host
+        await request.aread()
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            start = time.perf_counter()
+            try:
+                async with self.host_slot(host):
+                    response = await self.transport.handle_async_request(request)
+            except httpx.TransportError:
+                self.metrics.record(host, time.perf_counter() - start, 0, retried=attempt > 0, failed=last_attempt)
+                if last_attempt:
+                    raise
+                await asyncio.sleep(backoff_delay(attempt, backoff=self.backoff))
+                continue
+
+            retry = response.status_code in RETRY_STATUSES and not last_attempt
+            self.metrics.record(host, time.perf_counter() - start, 0, retried=attempt > 0,
+                                failed=response.status_code in RETRY_STATUSES and last_attempt)
+            if not retry:
+                return httpx.Response(response.status_code, headers=response.headers,
+                                      stream=AsyncCountingStream(response.stream, self.metrics), request=request,
+                                      extensions=response.extensions)
+            await response.aclose()
+            await asyncio.sleep(backoff_delay(attempt, response, backoff=self.backoff))
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+def build_transport(use_cache=True, max_connections=MAX_CONNECTIONS, max_retries=MAX_RETRIES):
+    """
+    Builds the transport stack shared by the scrapers, from the inside out:
+    pooled connection (or fixture replay, see http_replay) -> retries and
+    metrics -> on-disk response cache -> fixture recording.
+
+    Inputs:
+    use_cache (bool): Revalidate against the on-disk response cache.
+    max_connections (int): Size of the connection pool.
+    max_retries (int): Retries for transient failures.
+    """
+    mode = get_http_mode()
+    if mode == "replay":
+        transport = ReplayTransport()
+    elif mode == "server":
+        transport = ServerRedirectTransport(os.environ[REPLAY_SERVER_ENV])
+    else:
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        transport = httpx.HTTPTransport(limits=limits)
+
+    transport = RetryTransport(transport, max_retries=max_retries)
+    if use_cache and mode in ("live", "record"):
+        transport = CachingTransport(transport=transport)
+    if mode == "record":
+        transport = RecordingTransport(transport)
+    return transport
+
+
+def build_async_transport(use_cache=True, max_connections=MAX_CONNECTIONS, max_retries=MAX_RETRIES):
+    """
+    Async version of build_transport.
+    """
+    mode = get_http_mode()
+    if mode == "replay":
+        transport = ReplayTransport()
+    elif mode == "server":
+        transport = AsyncServerRedirectTransport(os.environ[REPLAY_SERVER_ENV])
+    else:
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        transport = httpx.AsyncHTTPTransport(limits=limits)
+
+    transport = AsyncRetryTransport(transport, max_retries=max_retries)
+    if use_cache and mode in ("live", "record"):
+        transport = AsyncCachingTransport(transport=transport)
+    if mode == "record":
+        transport = AsyncRecordingTransport(transport)
+    return transport
+
+
+def make_client(use_cache=True, max_connections=MAX_CONNECTIONS, transport=None, **kwargs):
+    """
+    Returns an httpx.Client on the shared transport stack. Extra keyword
+    arguments (headers, follow_redirects, ...) are passed to httpx.Client.
+    """
+    transport = transport or build_transport(use_cache, max_connections)
+    return httpx.Client(transport=transport, timeout=kwargs.pop("timeout", TIMEOUT), **kwargs)
+
+
+def make_async_client(use_cache=True, max_connections=MAX_CONNECTIONS, transport=None, **kwargs):
+    """
+    Returns an httpx.AsyncClient on the shared transport stack.
+    """
+    transport = transport or build_async_transport(use_cache, max_connections)
+    return httpx.AsyncClient(transport=transport, timeout=kwargs.pop("timeout", TIMEOUT), **kwargs)
@@ -0,0 +1,65 @@
+import os
+from dataclasses import dataclass
+from zip_link.cleaning_analysis.storage import PACKAGE_DIR, PREPROCESSED_DIR
+
+# Raw files, relative to a metro's raw directory. National files (HRSA health
+# centers, NaNDA transit stops) are shared by every metro and always read from RAW_DIR.
+RAW_DIR = os.path.join(PACKAGE_DIR, "data", "raw")
+RAW_FILES = {
+    "health_pdf": "community_health_ctr/HealthCentre1.pdf",
+    "hrsa": "community_health_ctr/HRSA_Data.csv",
+    "parks": "parks/CPD_Parks_2025.csv",
+    "grocery_stores": "grocery_stores/grocery_stores_data.csv",
+    "public_transit": "public_transit/publictransit_2024.csv",
+    "hospitals": "hospitals/hospitals.csv",
+    "schools": "schools/schools_data.csv",
+    "population": "population/Population_Data.csv",
+}
+NATIONAL_FILES = {"hrsa", "public_transit"}
+
+
+@dataclass(frozen=True)
+class Metro:
+    """
+    One metro area the pipeline can run for.
+
+    name (str): Short name, used in partition paths
+    state (str): Two letter state code
+    city (str): City name as written in the HRSA data
+    zip_prefix (str): Prefix of the metro's ZIP codes in the national transit file
+    zipatlas_path (str): Part of the ZipAtlas URLs naming the city, e.g. 'us/il/chicago'
+    raw_dir (str): Folder with the metro's raw files, laid out like RAW_FILES
+    health_pdf (bool): Whether the metro has a community health center PDF to add to HRSA
+    zip_boundaries (str): CSV of the metro's ZIP polygons (ZIP and WKT the_geom columns), needed for
+    the distance based accessibility (see spatial_access)
+    """
+    name: str
+    state: str
+    city: str
+    zip_prefix: str
+    zipatlas_path: str
+    raw_dir: str = RAW_DIR
+    health_pdf: bool = False
+    zip_boundaries: str = None
+
+    @property
+    def partition(self):
+        return os.path.join(f"state={self.state}", f"metro={self.name}")
+
+    def raw_path(self, name):
+        return os.path.join(RAW_DIR if name in NATIONAL_FILES else self.raw_dir, RAW_FILES[name])
+
+
+# Metros to run. Chicago's raw files are the ones in data/raw; add a metro by
+# putting its files in data/raw/<state>/<name> and registering it here.
+METROS = {
+    "chicago": Metro("chicago", "IL", "Chicago", "606", "us/il/chicago", health_pdf=True,
+                     zip_boundaries=os.path.join(PACKAGE_DIR, "visualization", "Boundaries_-_ZIP_Codes_20250222.csv")),
+}
+
+
+def metro_dir(metro, root=PREPROCESSED_DIR):
+    """
+    Partition of a metro's preprocessed tables: <root>/state=<state>/metro=<name>.
+    """
+    return os.path.join(root, metro.partition)
@@ -0,0 +1,104 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+import pdfplumber
+from zip_link.cleaning_analysis.pipeline import hash_file
+from zip_link.cleaning_analysis.storage import PACKAGE_DIR
+
+# Extracted tables, one CSV per (PDF contents, engine), so an unchanged PDF is never parsed twice
+PDF_CACHE_DIR = os.path.join(PACKAGE_DIR, "data", "raw", "pdf_cache")
+
+# Columns of the extracted health center tables
+TABLE_COLUMNS = ["Health Care Facility", "Address", "Phone"]
+
+
+def compact_row(cells):
+    """
+    Maps a tabula row to the table columns: tabula packs the values of a row to
+    the left, so the non-empty cells are the columns in order, padded to the table
+    columns, e.g. ['X', '1 Main St', '312-...', None, None] -> ['X', '1 Main St', '312-...'].
+    """
+    cells = [str(c) for c in cells if c is not None and not pd.isna(c) and str(c) != ""]
+    return (cells + [""] * len(TABLE_COLUMNS))[:len(TABLE_COLUMNS)]
+
+
+def positional_row(cells):
+    """
+    Maps a pdfplumber row to the table columns by position. pdfplumber splits a
+    column into several cells when it is merged across grid lines (e.g. 9 cells
+    for 3 columns), so each column takes the non-empty cells of its share of the
+    row, and a blank column stays blank instead of shifting the next one left,
+    e.g. ['X', None, None, '', None, None, '312-...', None, None] -> ['X', '', '312-...'].
+    """
+    columns = [[] for _ in TABLE_COLUMNS]
+    for i, c in enumerate(cells):
+        if c is not None and not pd.isna(c) and str(c) != "":
+            columns[i * len(TABLE_COLUMNS) // max(len(cells), len(TABLE_COLUMNS))].append(str(c))
+    return [" ".join(column) for column in columns]
+
+
+def pdfplumber_page(pdf_path, page_number):
+    """
+    Rows of the tables on one page with pdfplumber (pure Python, no JVM).
+    Module-level so pages can be extracted in worker processes.
+    """
+    with pdfplumber.open(pdf_path) as pdf:
+        tables = pdf.pages[page_number].extract_tables()
+    return [positional_row(row) for table in tables for row in table]
+
+
+def pdfplumber_rows(pdf_path, workers=None):
+    """
+    Rows of every page, pages extracted in parallel processes and kept in page order.
+    """
+    with pdfplumber.open(pdf_path) as pdf:
+        pages = len(pdf.pages)
+    workers = min(workers or os.cpu_count() or 1, pages)
+    if workers <= 1:
+        return [row for page in range(pages) for row in pdfplumber_page(pdf_path, page)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return [row for rows in pool.map(pdfplumber_page, [pdf_path] * pages, range(pages)) for row in rows]
+
+
+def tabula_rows(pdf_path):
+    """
+    Rows of every page with tabula, in one call, so the JVM parses the file once.
+    """
+    import tabula  # Only needed here, so cached and pdfplumber extractions never load it
+    tables = tabula.read_pdf(pdf_path, pages="all", pandas_options={"header": None, "dtype": str})
+    return [compact_row(row) for table in tables for row in table.itertuples(index=False)]
+
+
+def extract_pdf_tables(pdf_path, engine="tabula", workers=None, cache_dir=PDF_CACHE_DIR):
+    """
+    Extracts the tables of a PDF as one dataframe, or returns the cached result
+    for the same PDF contents and engine without starting any extractor.
+
+    Inputs:
+    pdf_path (str): PDF to read
+    engine (str): 'tabula' (needs Java) or 'pdfplumber' (no JVM, pages in parallel)
+    workers (int): Processes for the pdfplumber pages, one per core by default
+    cache_dir (str): Where extractions are cached, None to always extract
+
+    Returns:
+    df (dataframe): TABLE_COLUMNS, one row per table row of every page, as strings
+    """
+    if engine not in ("tabula", "pdfplumber"):
+        raise ValueError(f"engine must be 'tabula' or 'pdfplumber', got '{engine}'")
+
+    cache_path = None
+    if cache_dir is not None:
+        cache_path = os.path.join(cache_dir, f"{hash_file(pdf_path)}-{engine}.csv")
+        if os.path.exists(cache_path):
+            print(f"Using cached extraction of '{pdf_path}'")
+            return pd.read_csv(cache_path, dtype=str, keep_default_na=False)
+
+    rows = tabula_rows(pdf_path) if engine == "tabula" else pdfplumber_rows(pdf_path, workers)
+    df = pd.DataFrame([row for row in rows if row != TABLE_COLUMNS], columns=TABLE_COLUMNS)  # Without repeated headers
+
+    if cache_path is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        df.to_csv(tmp_path, index=False)
+        os.replace(tmp_path, cache_path)
+    return df
@@ -0,0 +1,252 @@
+import hashlib
+import inspect
+import os
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from dataclasses import dataclass, field
+from zip_link.cleaning_analysis.storage import PREPROCESSED_DIR
+
+# Where stage results and their keys are cached between runs
+PIPELINE_CACHE_DIR = os.path.join(PREPROCESSED_DIR, ".pipeline_cache")
+
+
+@dataclass
+class Stage:
+    """
+    One node of the pipeline.
+
+    name (str): Unique name of the stage
+    func (callable): Called with the results of `deps` (in order) and `kwargs`
+    inputs (list): Files the stage reads; their contents are part of the cache key
+    outputs (list): Files the stage writes; the stage re-runs if one is missing
+    deps (list): Names of upstream stages whose results are passed to func
+    after (list): Names of upstream stages that must run first, without passing their results
+    kwargs (dict): Keyword arguments passed to func, part of the cache key
+    version (str): Bump to force a re-run when something outside func's package changes
+    """
+    name: str
+    func: callable
+    inputs: list = field(default_factory=list)
+    outputs: list = field(default_factory=list)
+    deps: list = field(default_factory=list)
+    after: list = field(default_factory=list)
+    kwargs: dict = field(default_factory=dict)
+    version: str = ""
+
+
+def hash_file(path):
+    """
+    sha256 of a file's contents, or of the marker 'missing' if it does not exist.
+    """
+    digest = hashlib.sha256()
+    if not os.path.exists(path):
+        digest.update(b"missing")
+        return digest.hexdigest()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def package_modules(module):
+    """
+    The module and every module of the same package it uses, directly or through
+    one another: the modules it imports and those defining the functions and
+    classes it imports, e.g. the cleaners a stage calls and their helpers.
+    """
+    package = module.__name__.split(".")[0]
+    found, todo = {}, [module]
+    while todo:
+        module = todo.pop()
+        if module is None or module.__name__ in found or module.__name__.split(".")[0] != package:
+            continue
+        found[module.__name__] = module
+        for value in vars(module).values():
+            todo.append(value if inspect.ismodule(value) else inspect.getmodule(value))
+    return [found[name] for name in sorted(found)]
+
+
+def code_version(func):
+    """
+    Hash of the source of the module defining func and of the package modules
+    it uses (see package_modules), so edits to the stage function, the helpers
+    next to it or the helpers it imports invalidate the cached result.
+    """
+    func = getattr(func, "func", func)  # Unwrap functools.partial
+    module = inspect.getmodule(func)
+    if module is None:
+        return hashlib.sha256(getattr(func, "__qualname__", repr(func)).encode()).hexdigest()
+    digest = hashlib.sha256()
+    for module in package_modules(module):
+        try:
+            source = inspect.getsource(module)
+        except (TypeError, OSError):
+            source = module.__name__
+        digest.update(source.encode())
+    return digest.hexdigest()
+
+
+def stage_key(stage, dep_keys):
+    """
+    Cache key of a stage: its code version, input file contents, kwargs and
+    the keys of the stages it depends on, so a change upstream ripples down.
+    """
+    digest = hashlib.sha256()
+    digest.update(stage.name.encode())
+    digest.update(stage.version.encode())
+    digest.update(code_version(stage.func).encode())
+    for path in stage.inputs:
+        digest.update(path.encode())
+        digest.update(hash_file(path).encode())
+    digest.update(repr(sorted(stage.kwargs.items())).encode())
+    for dep in stage.deps + stage.after:
+        digest.update(dep_keys[dep].encode())
+    return digest.hexdigest()
+
+
+def topological_order(stages):
+    """
+    Orders stages so every stage comes after its dependencies, keeping the
+    given order among independent stages.
+    """
+    by_name = {stage.name: stage for stage in stages}
+    ordered, visiting, done = [], set(), set()
+
+    def visit(stage):
+        if stage.name in done:
+            return
+        if stage.name in visiting:
+            raise ValueError(f"Pipeline has a cycle through stage '{stage.name}'")
+        visiting.add(stage.name)
+        for dep in stage.deps + stage.after:
+            if dep not in by_name:
+                raise ValueError(f"Stage '{stage.name}' depends on unknown stage '{dep}'")
+            visit(by_name[dep])
+        visiting.discard(stage.name)
+        done.add(stage.name)
+        ordered.append(stage)
+
+    for stage in stages:
+        visit(stage)
+    return ordered
+
+
+def load_cached(stage, key, cache_dir):
+    """
+    Returns (True, result) if the stage has a cached result for this key
+    and all its output files still exist, otherwise (False, None).
+    """
+    if cache_dir is None:
+        return False, None
+    path = os.path.join(cache_dir, f"{stage.name}.pkl")
+    if not os.path.exists(path) or not all(os.path.exists(p) for p in stage.outputs):
+        return False, None
+    with open(path, "rb") as f:
+        cached = pickle.load(f)
+    if cached["key"] != key:
+        return False, None
+    return True, cached["result"]
+
+
+def save_cached(stage, key, result, cache_dir):
+    if cache_dir is None:
+        return
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, f"{stage.name}.pkl")
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump({"key": key, "result": result}, f)
+    os.replace(tmp_path, path)
+
+
+class StageError(RuntimeError):
+    """
+    Raised when a stage fails, naming the stage that failed.
+    """
+
+    def __init__(self, stage_name, error):
+        super().__init__(f"Stage '{stage_name}' failed: {error!r}")
+        self.stage_name = stage_name
+        self.error = error
+
+    def __reduce__(self):
+        # Rebuilt from both arguments when a metro's pipeline fails in a worker process
+        return StageError, (self.stage_name, self.error)
+
+
+def run_stage(stage, dep_results):
+    """
+    Runs one stage and times it. Module-level so it can run in a worker process.
+    """
+    start = time.perf_counter()
+    result = stage.func(*dep_results, **stage.kwargs)
+    return result, time.perf_counter() - start
+
+
+def run_pipeline(stages, cache_dir=PIPELINE_CACHE_DIR, force=False, workers=1):
+    """
+    Runs the stages in dependency order, skipping every stage whose cached
+    result is still valid for its current key. With more than one worker,
+    stages whose dependencies are done run at the same time in a process pool.
+
+    Inputs:
+    stages (list): Stage objects
+    cache_dir (path): Where stage results are cached, None to run without the cache
+    force (bool): Re-run every stage
+    workers (int): Number of worker processes, 1 runs everything in this process
+
+    Returns:
+    results (dict): Stage name -> result
+    executed (list): Names of the stages that actually ran, in pipeline order
+    """
+    order = topological_order(stages)
+    position = {stage.name: i for i, stage in enumerate(order)}
+
+    # Keys only depend on inputs and code, so every cache hit is known upfront
+    keys, results, pending = {}, {}, []
+    for stage in order:
+        keys[stage.name] = stage_key(stage, keys)
+        hit, result = (False, None) if force else load_cached(stage, keys[stage.name], cache_dir)
+        if hit:
+            print(f"[{stage.name}] up to date, skipped")
+            results[stage.name] = result
+        else:
+            pending.append(stage)
+
+    def finish(stage, result, elapsed):
+        save_cached(stage, keys[stage.name], result, cache_dir)
+        results[stage.name] = result
+        print(f"[{stage.name}] ran in {elapsed:.2f}s")
+
+    if workers <= 1:
+        for stage in pending:
+            try:
+                result, elapsed = run_stage(stage, [results[dep] for dep in stage.deps])
+            except Exception as e:
+                raise StageError(stage.name, e) from e
+            finish(stage, result, elapsed)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            running, waiting = {}, list(pending)
+            while waiting or running:
+                # Submit every stage whose dependencies have finished
+                for stage in [s for s in waiting if all(d in results for d in s.deps + s.after)]:
+                    running[pool.submit(run_stage, stage, [results[dep] for dep in stage.deps])] = stage
+                    waiting.remove(stage)
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in sorted(done, key=lambda f: position[running[f].name]):
+                    stage = running.pop(future)
+                    try:
+                        result, elapsed = future.result()
+                    except Exception as e:
+                        for other in running:
+                            other.cancel()
+                        raise StageError(stage.name, e) from e
+                    finish(stage, result, elapsed)
+
+    # Same order whatever order the workers finished in
+    results = {stage.name: results[stage.name] for stage in order}
+    executed = [stage.name for stage in pending]
+    return results, executed
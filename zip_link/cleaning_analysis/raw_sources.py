@@ -0,0 +1,117 @@
+import os
+from dataclasses import dataclass, field
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+from zip_link.cleaning_analysis.metros import RAW_DIR, RAW_FILES
+
+# Bytes parsed per chunk; only the rows a source keeps are held across chunks
+BLOCK_SIZE = 1 << 20
+
+
+@dataclass
+class RawSource:
+    """
+    How to load one raw CSV file.
+
+    path (str): Default location of the file (Chicago's)
+    usecols (list): Columns to parse; the others are skipped by the reader
+    dtypes (dict): Column name -> pyarrow type for the columns that are not strings
+    predicate (callable): Takes a pyarrow RecordBatch and returns a boolean mask of the rows to keep
+    """
+    path: str
+    usecols: list
+    dtypes: dict = field(default_factory=dict)
+    predicate: callable = None
+
+
+def zip_prefix_filter(column, prefix):
+    """
+    Row predicate keeping the ZIPs of one metro, e.g. zip_prefix_filter('ZCTA20', '606').
+    """
+    return lambda batch: pc.starts_with(batch[column], prefix)
+
+
+# Raw sources cleaned in bulk_data_processing, with only what the cleaners use
+RAW_SOURCES = {
+    "parks": RawSource(
+        os.path.join(RAW_DIR, RAW_FILES["parks"]),
+        usecols=["PARK", "LOCATION", "ZIP", "PARK_CLASS"],  # Skips the_geom and the ~80 amenity columns
+    ),
+    "park_shapes": RawSource(
+        os.path.join(RAW_DIR, RAW_FILES["parks"]),
+        usecols=["PARK", "ZIP", "the_geom"],  # Park polygons, for the distance based accessibility
+    ),
+    "grocery_stores": RawSource(
+        os.path.join(RAW_DIR, RAW_FILES["grocery_stores"]),
+        usecols=["Store Name", "Address", "Zip", "New status"],
+        predicate=lambda batch: pc.equal(batch["New status"], "OPEN"),
+    ),
+    "grocery_points": RawSource(
+        os.path.join(RAW_DIR, RAW_FILES["grocery_stores"]),
+        usecols=["Store Name", "Zip", "New status", "Location"],  # Store points, for the spatial steps
+        predicate=lambda batch: pc.equal(batch["New status"], "OPEN"),
+    ),
+    "public_transit": RawSource(
+        os.path.join(RAW_DIR, RAW_FILES["public_transit"]),
+        usecols=["ZCTA20", "COUNT_NTM_STOPS"],
+        dtypes={"COUNT_NTM_STOPS": pa.int64()},
+        predicate=zip_prefix_filter("ZCTA20", "606"),  # Chicago, other metros pass their own prefix
+    ),
+    "zcta_areas": RawSource(
+        os.path.join(RAW_DIR, RAW_FILES["public_transit"]),
+        usecols=["ZCTA20", "ZCTA_AREA20"],  # Land area in square miles, for the per square mile index
+        # ZCTA_AREA20 stays a string: it is blank (' ') for ZCTAs without land area
+        predicate=zip_prefix_filter("ZCTA20", "606"),
+    ),
+    "hospitals": RawSource(
+        os.path.join(RAW_DIR, RAW_FILES["hospitals"]),
+        usecols=["Hospital Name", "ZIP Code"],
+    ),
+    "schools": RawSource(
+        os.path.join(RAW_DIR, RAW_FILES["schools"]),
+        usecols=["School Name", "address", "Zip Code"],
+    ),
+    "population": RawSource(
+        os.path.join(RAW_DIR, RAW_FILES["population"]),
+        usecols=["Entity properties name", "Variable observation value"],
+    ),
+}
+
+
+def read_raw(name, path=None, block_size=BLOCK_SIZE, predicate=None):
+    """
+    Loads a registered raw source chunk by chunk with the pyarrow CSV reader:
+    only the declared columns are converted, each one with a fixed type
+    (string unless the source says otherwise, since the reader would
+    otherwise infer types from the first chunk only), each chunk is filtered with the
+    source's predicate before the next one is read, and the rows kept are
+    turned into one dataframe at the end.
+
+    Inputs:
+    name (str): Key in RAW_SOURCES
+    path (str): File to read instead of the source's default path
+    block_size (int): Bytes parsed per chunk
+    predicate (callable): Row predicate to use instead of the source's one
+
+    Returns:
+    df (dataframe): Kept rows and columns, with missing values as NaN/None
+    """
+    source = RAW_SOURCES[name]
+    column_types = {column: pa.string() for column in source.usecols}
+    column_types.update(source.dtypes)
+    reader = pa_csv.open_csv(
+        path or source.path,
+        read_options=pa_csv.ReadOptions(block_size=block_size),
+        convert_options=pa_csv.ConvertOptions(include_columns=source.usecols, column_types=column_types,
+                                              strings_can_be_null=True),
+    )
+
+    predicate = predicate or source.predicate
+    batches = []
+    for batch in reader:
+        if predicate is not None:
+            batch = batch.filter(predicate(batch))
+        batches.append(batch)
+    return pa.Table.from_batches(batches, schema=reader.schema).to_pandas()
@@ -0,0 +1,347 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import httpx
+from zip_link.cleaning_analysis.storage import PACKAGE_DIR
+
+# Shared on-disk cache for all scrapers
+CACHE_DIR = os.path.join(PACKAGE_DIR, "data", "raw", "http_cache")
+MAX_CACHE_BYTES = 200 * 1024 * 1024  # 200 MB of response bodies
+MAX_CACHE_AGE = 30 * 24 * 60 * 60  # Entries not revalidated for 30 days are dropped
+
+# Only these headers are kept with a cached body (the body is stored as sent, so
+# its content-encoding is kept to decode it when it is served again)
+KEPT_HEADERS = ("content-type", "content-encoding", "etag", "last-modified")
+
+
+class ResponseCache:
+    """
+    Content-addressed store of HTTP response bodies together with their
+    ETag and Last-Modified validators.
+
+    Bodies live in `bodies/<sha256 of body>` so identical pages are stored
+    once, and `index.json` maps a hash of (method, url, request body) to the
+    body digest, the kept headers and timestamps used for eviction. The number
+    of entries per body and the bytes stored are kept up to date on every change,
+    so a put only evicts when it takes the cache over max_bytes.
+    """
+
+    def __init__(self, root=CACHE_DIR, max_bytes=MAX_CACHE_BYTES, max_age=MAX_CACHE_AGE):
+        self.root = root
+        self.bodies_dir = os.path.join(root, "bodies")
+        self.index_path = os.path.join(root, "index.json")
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        os.makedirs(self.bodies_dir, exist_ok=True)
+
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as f:
+                self.index = json.load(f)
+        else:
+            self.index = {}
+
+        # Entries pointing to each body, and the bytes of the distinct bodies
+        self.refs, self.stored_bytes = {}, 0
+        for entry in self.index.values():
+            self.add_ref(entry)
+        if any(time.time() - e["validated_at"] > self.max_age for e in self.index.values()):
+            self.evict()
+
+    def add_ref(self, entry):
+        if entry["digest"] not in self.refs:
+            self.refs[entry["digest"]] = 0
+            self.stored_bytes += entry["size"]
+        self.refs[entry["digest"]] += 1
+
+    def drop_entry(self, key, keep=None):
+        """
+        Removes an entry, and its body once no entry points to it (unless it is
+        the `keep` body, about to be pointed to again). Call with the lock held.
+        """
+        entry = self.index.pop(key)
+        self.refs[entry["digest"]] -= 1
+        if not self.refs[entry["digest"]]:
+            del self.refs[entry["digest"]]
+            self.stored_bytes -= entry["size"]
+            if entry["digest"] != keep and os.path.exists(self.body_path(entry["digest"])):
+                os.remove(self.body_path(entry["digest"]))
+
+    @staticmethod
+    def request_key(method, url, body=b""):
+        """
+        Hash of the request method, url and body, used as the index key.
+        """
+        return hashlib.sha256(method.encode() + b" " + url.encode() + b"\n" + body).hexdigest()
+
+    def get(self, key):
+        """
+        Returns the index entry for a request key, or None if it is not
+        cached or its body has gone missing.
+        """
+        entry = self.index.get(key)
+        if entry and os.path.exists(self.body_path(entry["digest"])):
+            return entry
+        return None
+
+    def body_path(self, digest):
+        return os.path.join(self.bodies_dir, digest)
+
+    def read_body(self, entry):
+        with open(self.body_path(entry["digest"]), "rb") as f:
+            return f.read()
+
+    @staticmethod
+    def conditional_headers(entry):
+        """
+        Headers that turn a request into a conditional one for a cached entry.
+        """
+        headers = {}
+        if entry["headers"].get("etag"):
+            headers["If-None-Match"] = entry["headers"]["etag"]
+        if entry["headers"].get("last-modified"):
+            headers["If-Modified-Since"] = entry["headers"]["last-modified"]
+        return headers
+
+    def put(self, key, url, status, headers, body):
+        """
+        Stores a response body and its validators under the request key.
+        """
+        writer = self.writer(key, url, status, headers)
+        writer.write(body)
+        writer.finish()
+
+    def writer(self, key, url, status, headers):
+        """
+        BodyWriter storing a body under the request key as its chunks arrive.
+        """
+        return BodyWriter(self, key, url, status, headers)
+
+    def put_file(self, key, url, status, headers, tmp_path, digest, size):
+        """
+        Moves a body written to tmp_path into the store and points the request key to it.
+        """
+        path = self.body_path(digest)
+        now = time.time()
+        # The body and the entry pointing to it are added together, so evict never sees the body as an orphan
+        with self.lock:
+            if os.path.exists(path):
+                os.remove(tmp_path)
+            else:
+                os.replace(tmp_path, path)
+            if key in self.index:
+                self.drop_entry(key, keep=digest)
+            self.index[key] = {
+                "url": url,
+                "status": status,
+                "headers": {h: headers[h] for h in KEPT_HEADERS if h in headers},
+                "digest": digest,
+                "size": size,
+                "validated_at": now,
+                "used_at": now,
+            }
+            self.add_ref(self.index[key])
+            over_budget = self.stored_bytes > self.max_bytes
+        if over_budget:
+            self.evict()
+        else:
+            self.save()
+
+    def touch(self, key):
+        """
+        Marks an entry as revalidated by the server (304 Not Modified).
+        """
+        with self.lock:
+            self.index[key]["validated_at"] = self.index[key]["used_at"] = time.time()
+        self.save()
+
+    def evict(self, now=None):
+        """
+        Drops entries that were not revalidated within max_age, then the least
+        recently used ones until the stored bodies fit in max_bytes, and
+        deletes bodies no entry points to anymore.
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            for key in [k for k, e in self.index.items() if now - e["validated_at"] > self.max_age]:
+                self.drop_entry(key)
+
+            # Bodies are shared, so a body's bytes are only freed with the last entry pointing to it
+            if self.stored_bytes > self.max_bytes:
+                for key in sorted(self.index, key=lambda k: self.index[k]["used_at"]):
+                    self.drop_entry(key)
+                    if self.stored_bytes <= self.max_bytes:
+                        break
+
+            # Bodies left by another process or an interrupted run
+            for digest in os.listdir(self.bodies_dir):
+                if digest not in self.refs and not digest.endswith(".tmp"):
+                    os.remove(self.body_path(digest))
+        self.save()
+
+    def save(self):
+        with self.lock:
+            tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.index, f)
+            os.replace(tmp_path, self.index_path)
+
+    def total_bytes(self):
+        return self.stored_bytes
+
+    def revalidated(self, key, entry, request):
+        """
+        Response served from the cache after a 304 Not Modified.
+        """
+        self.touch(key)
+        return httpx.Response(entry["status"], headers={**entry["headers"], "x-cache": "revalidated"},
+                              content=self.read_body(entry), request=request)
+
+    def cacheable(self, status, headers):
+        """
+        Headers kept from a fresh response, and whether its body should be stored (it carries validators).
+        """
+        kept = {h: headers[h] for h in KEPT_HEADERS if h in headers}
+        return kept, status == 200 and ("etag" in kept or "last-modified" in kept)
+
+
+class BodyWriter:
+    """
+    Writes a response body to a temporary file of the cache as it is read, and
+    stores it once complete, so caching never holds the whole body in memory.
+    """
+
+    def __init__(self, cache, key, url, status, headers):
+        self.cache, self.key, self.url, self.status, self.headers = cache, key, url, status, headers
+        self.tmp_path = os.path.join(cache.bodies_dir, f"{key}.{os.getpid()}.{threading.get_ident()}.tmp")
+        self.file = open(self.tmp_path, "wb")
+        self.hash = hashlib.sha256()
+        self.size = 0
+
+    def write(self, chunk):
+        self.file.write(chunk)
+        self.hash.update(chunk)
+        self.size += len(chunk)
+
+    def finish(self):
+        self.file.close()
+        self.cache.put_file(self.key, self.url, self.status, self.headers, self.tmp_path, self.hash.hexdigest(), self.size)
+
+    def abort(self):
+        # The body was not read to the end, nothing is stored
+        self.file.close()
+        os.remove(self.tmp_path)
+
+
+class TeeStream(httpx.SyncByteStream):
+    """
+    Passes the chunks of a response through to the client while the BodyWriter
+    stores them; the body is cached when the stream was read to the end.
+    """
+
+    def __init__(self, stream, writer):
+        self.stream = stream
+        self.writer = writer
+        self.complete = False
+
+    def __iter__(self):
+        for chunk in self.stream:
+            self.writer.write(chunk)
+            yield chunk
+        self.complete = True
+
+    def close(self):
+        self.stream.close()
+        if self.complete:
+            self.writer.finish()
+        else:
+            self.writer.abort()
+
+
+class AsyncTeeStream(httpx.AsyncByteStream):
+    """
+    Async version of TeeStream.
+    """
+
+    def __init__(self, stream, writer):
+        self.stream = stream
+        self.writer = writer
+        self.complete = False
+
+    async def __aiter__(self):
+        async for chunk in self.stream:
+            self.writer.write(chunk)
+            yield chunk
+        self.complete = True
+
+    async def aclose(self):
+        await self.stream.aclose()
+        if self.complete:
+            self.writer.finish()
+        else:
+            self.writer.abort()
+
+
+class CachingTransport(httpx.BaseTransport):
+    """
+    httpx transport that revalidates cached responses with conditional
+    requests, so an unchanged page costs a 304 round-trip and no body. Fresh
+    bodies are streamed through, not buffered (see TeeStream).
+    """
+
+    def __init__(self, cache=None, transport=None):
+        self.cache = cache or ResponseCache()
+        self.transport = transport or httpx.HTTPTransport()
+
+    def handle_request(self, request):
+        key = self.cache.request_key(request.method, str(request.url), request.read())
+        entry = self.cache.get(key)
+        if entry is not None:
+            request.headers.update(self.cache.conditional_headers(entry))
+
+        response = self.transport.handle_request(request)
+        if response.status_code == 304 and entry is not None:
+            response.close()
+            return self.cache.revalidated(key, entry, request)
+
+        # The body is streamed to the client as it arrives, and written to the cache on the way
+        kept, store = self.cache.cacheable(response.status_code, response.headers)
+        stream = response.stream
+        if store:
+            stream = TeeStream(stream, self.cache.writer(key, str(request.url), response.status_code, kept))
+        return httpx.Response(response.status_code, headers={**kept, "x-cache": "miss"}, stream=stream, request=request)
+
+    def close(self):
+        self.transport.close()
+
+
+class AsyncCachingTransport(httpx.AsyncBaseTransport):
+    """
+    Async version of CachingTransport sharing the same on-disk cache.
+    """
+
+    def __init__(self, cache=None, transport=None):
+        self.cache = cache or ResponseCache()
+        self.transport = transport or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request):
+        key = self.cache.request_key(request.method, str(request.url), await request.aread())
+        entry = self.cache.get(key)
+        if entry is not None:
+            request.headers.update(self.cache.conditional_headers(entry))
+
+        response = await self.transport.handle_async_request(request)
+        if response.status_code == 304 and entry is not None:
+            await response.aclose()
+            return self.cache.revalidated(key, entry, request)
+
+        kept, store = self.cache.cacheable(response.status_code, response.headers)
+        stream = response.stream
+        if store:
+            stream = AsyncTeeStream(stream, self.cache.writer(key, str(request.url), response.status_code, kept))
+        return httpx.Response(response.status_code, headers={**kept, "x-cache": "miss"}, stream=stream, request=request)
+
+    async def aclose(self):
+        await self.transport.aclose()
@@ -1,24 +1,34 @@
 import os
-import requests
+import asyncio
+import math
 import json
 import time
 import pandas as pd
+from zip_link.cleaning_analysis.http_session import make_client, make_async_client
 
 #API link
 URL = "https://www.cps.edu/api/v1/search/results"
 HEADERS = {"Content-Type": "application/json"}
 
-def fetch_data(page_number):
-    """
-    Fetching data from the API.
-    
-    Input: the individual page number
-    Output: information in json
+# Largest page size we ask the API for; it may return fewer results per page
+MAX_PAGE_SIZE = 100
+
+# Field of a results page holding the total number of schools found
+TOTAL_KEY = "totalResults"
+
+# Most pages probed when the API does not report a total, in case it never returns an empty page
+MAX_PROBE_PAGES = 500
+
+def build_payload(page_number, page_size=10):
     """
+    Building the search payload for one page of schools.
 
-    payload = {
+    Input: the individual page number, the number of schools per page
+    Output: payload as a dict
+    """
+    return {
         "searchTerm": "",
-        "pageSize": 10,
+        "pageSize": page_size,
         "pageNumber": page_number,
         "facets": [],
         "context": "Schools",
@@ -27,7 +37,22 @@ def fetch_data(page_number):
         "dateSortRelevanceFilter": 0,
         "contentId": "10375"
     }
-    response = requests.post(URL, headers=HEADERS, json=payload)
+
+def fetch_data(page_number, page_size=10, use_cache=True, client=None):
+    """
+    Fetching data from the API.
+    
+    Input: the individual page number, the number of schools per page,
+           whether to revalidate against the on-disk response cache,
+           the client shared by the pages of a run (one is opened for this page if None)
+    Output: information in json
+    """
+    if client is None:
+        with make_client(use_cache, headers=HEADERS) as client:
+            return fetch_data(page_number, page_size, use_cache, client)
+
+    payload = build_payload(page_number, page_size)
+    response = client.post(URL, json=payload)
     
     if response.status_code == 200:
         return response.json()
@@ -52,6 +77,28 @@ def extract_zip(address):
     zip_code = rest.split()[-1] if rest.split()[-1].isdigit() else "N/A"
     return street_address, rest, zip_code
 
+def parse_schools(data):
+    """
+    Extracting school name, address and zip code from one page of results.
+
+    Input: information in json for one page
+    Output: list of dicts, one per school
+    """
+    schools = []
+    for school in data["results"]:
+        title = school.get("title", "N/A")
+        full_address = school.get("address", "N/A")
+        
+        street, rest, zip_code = extract_zip(full_address)
+
+        schools.append({
+            "School Name": title,
+            "address": street,
+            #"csz": csz,
+            "Zip Code": zip_code
+        })
+    return schools
+
 def scrape_api(total_pages=65):
     """
     Iterating through all the pages.
@@ -61,32 +108,141 @@ def scrape_api(total_pages=65):
     """
     all_results = []
 
-    for page in range(1, total_pages + 1):
-        print(f"Fetching page {page}")
-        data = fetch_data(page)
+    # One client for every page, so connections are reused
+    with make_client(headers=HEADERS) as client:
+        for page in range(1, total_pages + 1):
+            print(f"Fetching page {page}")
+            data = fetch_data(page, client=client)
 
+            if data and "results" in data:
+                all_results.extend(parse_schools(data))
+            else:
+                print(f"Skipping page {page} due to error or no results.")
+
+            time.sleep(1)
+    return pd.DataFrame(all_results)
+
+
+class TokenBucket:
+    """
+    Async token-bucket rate limiter. Tokens refill at `rate` per second up to 
+    `capacity`, and each request takes one token, so short bursts go out at 
+    once while the average request rate stays at `rate`.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+def get_total_results(data):
+    """
+    Finding the total number of schools reported by the API.
+
+    Input: information in json for the first page
+    Output: total number of schools, or None if the API does not report it
+    """
+    if isinstance(data.get(TOTAL_KEY), int):
+        return data[TOTAL_KEY]
+    print(f"Warning: no '{TOTAL_KEY}' in the API response (fields: {', '.join(sorted(data))}), "
+          f"probing pages until an empty one instead.")
+    return None
+
+async def fetch_page_async(client, bucket, page_number, page_size):
+    """
+    Fetching one page from the API once the rate limiter allows it.
+
+    Input: shared async client, token bucket, page number, page size
+    Output: information in json, or None on error
+    """
+    await bucket.acquire()
+    response = await client.post(URL, json=build_payload(page_number, page_size))
+
+    if response.status_code == 200:
+        return response.json()
+    else:
+        print(f"Error {response.status_code} on page {page_number}: {response.text}")
+        return None
+
+async def scrape_api_paginated(page_size=MAX_PAGE_SIZE, rate=5, burst=5, max_concurrency=5, transport=None, use_cache=True):
+    """
+    Fetching all schools without hard-coding the number of pages.
+
+    The first page is requested with the largest page size. The total number 
+    of schools and the page size the API actually honoured are read from it, 
+    and the remaining pages are fetched concurrently under a token-bucket 
+    rate limiter. If the API does not report a total, pages are fetched in 
+    batches until an empty page comes back, every page of a batch fails, or
+    MAX_PROBE_PAGES pages were requested.
+
+    Input: requested page size, requests per second, burst size, 
+           max requests in flight, optional httpx transport, whether to 
+           revalidate against the on-disk response cache
+    Output: DataFrame with the data
+    """
+    bucket = TokenBucket(rate, burst)
+    async with make_async_client(use_cache, max_concurrency, transport=transport, headers=HEADERS) as client:
+        first = await fetch_page_async(client, bucket, 1, page_size)
+        if not first or "results" not in first:
+            raise RuntimeError("Could not fetch the first page of schools from the API.")
+
+        # The API may cap the page size below what we asked for
+        total = get_total_results(first)
+        if first["results"] and len(first["results"]) < page_size and (total is None or total > len(first["results"])):
+            page_size = len(first["results"])
+
+        pages = {1: first}
+        if total is not None:
+            total_pages = math.ceil(total / page_size) if page_size else 1
+            print(f"Fetching {total} schools in {total_pages} pages of {page_size}")
+            tasks = [fetch_page_async(client, bucket, page, page_size) for page in range(2, total_pages + 1)]
+            pages.update(zip(range(2, total_pages + 1), await asyncio.gather(*tasks)))
+        elif first["results"]:
+            # Probe in batches until a page comes back empty
+            page, done = 2, False
+            while not done:
+                batch = range(page, min(page + max_concurrency, MAX_PROBE_PAGES + 1))
+                results = await asyncio.gather(*[fetch_page_async(client, bucket, p, page_size) for p in batch])
+                for p, data in zip(batch, results):
+                    pages[p] = data
+                    done = done or (data is not None and not data.get("results"))
+                page += len(batch)
+                # Stop when a whole batch failed (nothing else would end the loop) or the cap is reached
+                if all(data is None for data in results):
+                    print(f"Stopping at page {page - 1}: every page of the last batch failed.")
+                    done = True
+                elif page > MAX_PROBE_PAGES:
+                    print(f"Stopping after {MAX_PROBE_PAGES} pages without an empty page.")
+                    done = True
+
+    all_results = []
+    for page in sorted(pages):
+        data = pages[page]
         if data and "results" in data:
-            for school in data["results"]:
-                title = school.get("title", "N/A")
-                full_address = school.get("address", "N/A")
-                
-                street, rest, zip_code = extract_zip(full_address)
-
-                all_results.append({
-                    "School Name": title,
-                    "address": street,
-                    #"csz": csz,
-                    "Zip Code": zip_code
-                })
+            all_results.extend(parse_schools(data))
         else:
             print(f"Skipping page {page} due to error or no results.")
 
-        time.sleep(1)
+    if total is not None and len(all_results) != total:
+        print(f"Warning: expected {total} schools but fetched {len(all_results)}.")
     return pd.DataFrame(all_results)
 
 
 if __name__ == "__main__":
-    df = scrape_api(total_pages=65)
+    df = asyncio.run(scrape_api_paginated())
 
     output_dir = "../data/raw/Schools"
     os.makedirs(output_dir, exist_ok=True)
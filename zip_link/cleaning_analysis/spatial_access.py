@@ -0,0 +1,152 @@
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+from shapely import STRtree
+from zip_link.cleaning_analysis.raw_sources import read_raw
+from zip_link.cleaning_analysis.zip_codes import zip_codes
+
+# Catchment radius in meters (one mile); facilities further than this from a ZIP centroid are out of reach
+CATCHMENT_RADIUS = 1609.34
+
+
+def binary_decay(distance, radius):
+    return np.ones_like(distance)
+
+
+def gaussian_decay(distance, radius):
+    # 1 at the centroid, 0 at the catchment radius
+    edge = np.exp(-0.5)
+    return (np.exp(-0.5 * (distance / radius) ** 2) - edge) / (1 - edge)
+
+
+def gravity_decay(distance, radius, beta=1.0, min_distance=100.0):
+    # Inverse power of the distance, with a floor so facilities at the centroid do not get infinite weight
+    return (np.maximum(distance, min_distance) / min_distance) ** -beta
+
+
+# Distance decay functions of the catchment, each takes distances and the radius in meters
+DECAYS = {"binary": binary_decay, "gaussian": gaussian_decay, "gravity": gravity_decay}
+
+
+def catchment_pairs(demand_points, supply_geoms, radius=CATCHMENT_RADIUS):
+    """
+    Every (demand point, facility) pair closer than the radius, found with an
+    STRtree of the facilities instead of computing every distance.
+
+    Inputs:
+    demand_points (array): Shapely points in a projected (meters) CRS
+    supply_geoms (array): Shapely geometries of the facilities, same CRS (points or polygons)
+    radius (float): Catchment radius in meters
+
+    Returns:
+    demand_idx, supply_idx (arrays): Positions of each pair
+    distance (array): Distance of each pair in meters, 0 for a point inside a polygon
+    """
+    demand_idx, supply_idx = STRtree(supply_geoms).query(demand_points, predicate="dwithin", distance=radius)
+    distance = shapely.distance(demand_points[demand_idx], supply_geoms[supply_idx])
+    return demand_idx, supply_idx, distance
+
+
+def two_step_fca(demand_points, demand, supply_geoms, supply=None, radius=CATCHMENT_RADIUS, decay="gaussian"):
+    """
+    Two-step floating catchment area accessibility:
+    1. each facility's supply is divided by the (distance weighted) population within its catchment
+    2. each ZIP sums the ratios of the facilities within its catchment, weighted by distance again
+
+    Inputs:
+    demand_points (array): ZIP centroids, projected
+    demand (array): Population of each ZIP
+    supply_geoms (array): Facility geometries, projected
+    supply (array): Capacity of each facility, 1 each by default
+    radius (float): Catchment radius in meters
+    decay (str or callable): Key of DECAYS, or a function of (distances, radius)
+
+    Returns:
+    access (array): Facilities within reach per person of each ZIP
+    """
+    demand = np.asarray(demand, dtype=float)
+    supply = np.ones(len(supply_geoms)) if supply is None else np.asarray(supply, dtype=float)
+    weight = DECAYS[decay] if isinstance(decay, str) else decay
+
+    demand_idx, supply_idx, distance = catchment_pairs(demand_points, supply_geoms, radius)
+    w = weight(distance, radius)
+
+    # Step 1: supply to demand ratio of every facility
+    reached = np.bincount(supply_idx, weights=demand[demand_idx] * w, minlength=len(supply_geoms))
+    ratio = np.divide(supply, reached, out=np.zeros(len(supply_geoms)), where=reached > 0)
+
+    # Step 2: sum of the ratios reachable from every ZIP
+    return np.bincount(demand_idx, weights=ratio[supply_idx] * w, minlength=len(demand_points))
+
+
+def zip_polygons(boundaries_path):
+    """
+    ZIP polygons dissolved by ZIP (some ZIPs have one row per polygon).
+
+    Inputs:
+    boundaries_path (str): CSV with ZIP and WKT the_geom columns
+
+    Returns:
+    zones (GeoDataFrame): Zip Code and geometry in WGS84, one row per ZIP
+    """
+    df = pd.read_csv(boundaries_path, usecols=["ZIP", "the_geom"], dtype={"ZIP": str})
+    zones = gpd.GeoDataFrame({"Zip Code": df["ZIP"]}, geometry=shapely.from_wkt(df["the_geom"]), crs="EPSG:4326")
+    return zones.dissolve(by="Zip Code", as_index=False)
+
+
+def zip_centroids(boundaries_path, population):
+    """
+    ZIP polygons dissolved by ZIP, with their population.
+
+    Inputs:
+    boundaries_path (str): CSV with ZIP and WKT the_geom columns
+    population (dataframe): Zip Code and Population (see clean_population_data)
+
+    Returns:
+    zones (GeoDataFrame): Zip Code, Population and geometry in WGS84, one row per ZIP
+    """
+    zones = zip_polygons(boundaries_path)
+
+    people = population.assign(**{"Zip Code": population["Zip Code"].astype(str)}).groupby("Zip Code")["Population"].sum()
+    zones["Population"] = zones["Zip Code"].map(people).fillna(0).to_numpy()
+    return zones
+
+
+def spatial_access_data(population, boundaries_path, grocery_path=None, parks_path=None, radius=CATCHMENT_RADIUS,
+                        decay="gaussian", sink=None):
+    """
+    Distance based accessibility of every ZIP to grocery stores (their Location
+    points) and parks (their polygons), counting facilities across ZIP borders.
+
+    Inputs:
+    population (dataframe): Zip Code and Population
+    boundaries_path (str): CSV of the ZIP polygons
+    grocery_path (str): Raw grocery stores file, the registered one if None
+    parks_path (str): Raw parks file, the registered one if None
+    radius (float): Catchment radius in meters
+    decay (str or callable): See two_step_fca
+    sink (DiskSink or MemorySink): Where the table is saved as spatial_access, nothing is saved if None
+
+    Returns:
+    df (dataframe): Zip Code, grocery_access and park_access, facilities in reach per 1,000 residents
+    """
+    zones = zip_centroids(boundaries_path, population)
+    crs = zones.estimate_utm_crs()
+    centroids = np.asarray(zones.to_crs(crs).centroid.values)
+
+    groceries = read_raw("grocery_points", grocery_path).dropna(subset=["Location"])
+    parks = read_raw("park_shapes", parks_path).dropna(subset=["the_geom"])
+    facilities = {
+        "grocery_access": gpd.GeoSeries(shapely.from_wkt(groceries["Location"]), crs="EPSG:4326"),
+        "park_access": gpd.GeoSeries(shapely.from_wkt(parks["the_geom"]), crs="EPSG:4326"),
+    }
+
+    df = pd.DataFrame({"Zip Code": zip_codes(zones["Zip Code"])})
+    for col, geoms in facilities.items():
+        access = two_step_fca(centroids, zones["Population"], np.asarray(geoms.to_crs(crs).values), radius=radius, decay=decay)
+        df[col] = access * 1000
+
+    if sink is not None:
+        sink.write("spatial_access", df)
+    return df
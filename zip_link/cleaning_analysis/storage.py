@@ -0,0 +1,171 @@
+import os
+import pandas as pd
+
+# Intermediate and final tables are stored as Parquet, which keeps their dtypes
+# and can be read back without parsing. CSV copies are only written on request.
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PREPROCESSED_DIR = os.path.join(PACKAGE_DIR, "data", "preprocessed")
+
+
+def csv_path(path):
+    return os.path.splitext(path)[0] + ".csv"
+
+
+def parquet_path(path):
+    return os.path.splitext(path)[0] + ".parquet"
+
+
+def write_table(df, path, export_csv=False):
+    """
+    Writes a dataframe as Parquet, keeping its dtypes (categories, ints,
+    floats, strings) for the next stage, and optionally as CSV too.
+
+    Input:
+    df (dataframe): Table to save
+    path (str): Artifact path; the extension is replaced by .parquet / .csv
+    export_csv (bool): Also write a CSV copy next to it
+
+    Returns:
+    path (str): Path of the Parquet file
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    out = parquet_path(path)
+    tmp_path = f"{out}.{os.getpid()}.tmp"
+    df.to_parquet(tmp_path, index=False, engine="pyarrow")
+    os.replace(tmp_path, out)
+
+    if export_csv:
+        df.to_csv(csv_path(path), index=False)
+    return out
+
+
+def read_table(path, columns=None):
+    """
+    Reads an artifact written by write_table. Parquet is read without any
+    parsing and only the requested columns are loaded; if there is no Parquet
+    file yet, the CSV next to it is read instead.
+
+    Input:
+    path (str): Artifact path, with any extension
+    columns (list): Columns to load, all if None
+
+    Returns:
+    df (dataframe)
+    """
+    if os.path.exists(parquet_path(path)):
+        return pd.read_parquet(parquet_path(path), columns=columns, engine="pyarrow")
+    return pd.read_csv(csv_path(path), usecols=columns)
+
+
+def export_to_csv(paths):
+    """
+    Writes a CSV copy next to each Parquet artifact, for sharing or
+    opening in a spreadsheet.
+
+    Input:
+    paths (list): Artifact paths
+    """
+    for path in paths:
+        read_table(path).to_csv(csv_path(path), index=False)
+        print(f"Exported '{csv_path(path)}'")
+
+
+# Output sinks. Cleaners hand the tables they produce to a sink instead of
+# writing to fixed paths, and write nothing when no sink is given.
+
+class DiskSink:
+    """
+    Writes every table straight away as <root>/<name>.parquet.
+    """
+
+    def __init__(self, root=PREPROCESSED_DIR):
+        self.root = root
+
+    def __repr__(self):
+        return f"DiskSink(root={self.root!r})"
+
+    def path(self, name):
+        return os.path.join(self.root, f"{name}.parquet")
+
+    def outputs(self, names):
+        """
+        Files written for the given table names, so the pipeline can check they exist.
+        """
+        return [self.path(name) for name in names]
+
+    def write(self, name, df):
+        write_table(df, self.path(name))
+
+    def read(self, name, columns=None):
+        return read_table(self.path(name), columns)
+
+
+class MemorySink:
+    """
+    Keeps every table in a dict, nothing touches the disk.
+    """
+
+    def __init__(self):
+        self.tables = {}
+
+    def __repr__(self):
+        return f"{type(self).__name__}()"
+
+    def outputs(self, names):
+        return []
+
+    def write(self, name, df):
+        self.tables[name] = df.copy()
+
+    def read(self, name, columns=None):
+        df = self.tables[name]
+        return (df if columns is None else df[columns]).copy()
+
+
+def in_memory(sink):
+    """
+    Whether a run into the sink must leave no files behind: a MemorySink (not a
+    StagedSink, which publishes its tables) also keeps the raw scrapes in memory
+    and skips the on-disk HTTP and PDF caches.
+    """
+    return isinstance(sink, MemorySink) and not isinstance(sink, StagedSink)
+
+
+class StagedSink(MemorySink):
+    """
+    Collects the tables in memory and writes them all under root in one
+    publish() at the end: every file is written to a temporary name first and
+    only then renamed into place, so a failed run leaves the previous outputs.
+    """
+
+    def __init__(self, root=PREPROCESSED_DIR):
+        super().__init__()
+        self.root = root
+
+    def __repr__(self):
+        return f"StagedSink(root={self.root!r})"
+
+    def publish(self):
+        """
+        Returns:
+        paths (list): Parquet files written
+        """
+        os.makedirs(self.root, exist_ok=True)
+        staged = []
+        try:
+            for name, df in self.tables.items():
+                path = os.path.join(self.root, f"{name}.parquet")
+                staged.append((f"{path}.{os.getpid()}.staged", path))
+                df.to_parquet(staged[-1][0], index=False, engine="pyarrow")
+        except Exception:
+            for tmp_path, _ in staged:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            raise
+
+        for tmp_path, path in staged:
+            os.replace(tmp_path, path)
+        return [path for _, path in staged]
@@ -1,21 +1,30 @@
+import os
 import pdfplumber
 import csv
 import pandas as pd
 import re
-import tabula
-import jellyfish 
+from zip_link.cleaning_analysis.zip_codes import normalize_zips, zip_codes, count_by_zip
+from zip_link.cleaning_analysis.metros import RAW_DIR, RAW_FILES
+from zip_link.cleaning_analysis.entity_resolution import phone_key, candidate_pairs, resolve_entities, is_match
+from zip_link.cleaning_analysis.entity_store import update_entity_store
+from zip_link.cleaning_analysis.pdf_tables import extract_pdf_tables, PDF_CACHE_DIR
 
-def convert_pdf_to_csv(pdf_path, csv_path):
+# Chicago's health center files
+HEALTH_PDF = os.path.join(RAW_DIR, RAW_FILES["health_pdf"])
+HRSA_DATA = os.path.join(RAW_DIR, RAW_FILES["hrsa"])
+
+def convert_pdf_to_csv(pdf_path, csv_path, engine="tabula"):
     """
-    Converts a pdf into csv
+    Converts a pdf into csv, parsing the pdf only once and reusing the cached
+    extraction when the pdf did not change (see pdf_tables.extract_pdf_tables)
 
     Input: 
     pdf_path (path): path of the pdf to be converted
     csv_path (path): path of where the converted pdf is to be stored
+    engine (str): 'tabula' (needs Java) or 'pdfplumber' (no JVM)
 
     """
-    df = tabula.read_pdf(pdf_path, pages='all')[0]
-    tabula.convert_into(pdf_path, csv_path, output_format="csv", pages='all')
+    extract_pdf_tables(pdf_path, engine).to_csv(csv_path, index=False)
     print(f"Successfully converted '{pdf_path}' to '{csv_path}'")
     
 def process_health_data(input_file):
@@ -29,14 +38,14 @@ def process_health_data(input_file):
     - Extract 5-digit zip code using regex and drop rows with invalid zip codes
 
     Input: 
-    input_file (path): path of the converted pdf on health centers
+    input_file (path or dataframe): path of the converted pdf on health centers, or the extracted tables
 
     Returns: 
     df (dataframe): preprocessed dataset
 
     """
-    # Load the dataset
-    df = pd.read_csv(input_file)
+    # Load the dataset, blank extracted cells count as missing like in the CSV
+    df = input_file.replace("", None) if isinstance(input_file, pd.DataFrame) else pd.read_csv(input_file)
 
     # Filter out relevant columns and rename them
     df = df.iloc[:, :3].set_axis(['Health Center Facility', 'Address', 'Telephone Number'], axis=1)
@@ -56,7 +65,7 @@ def process_health_data(input_file):
 
     return df 
 
-def get_hrsa_data(path):
+def get_hrsa_data(path, city="chicago"):
 
     """
     Processes the HRSA data  
@@ -67,6 +76,7 @@ def get_hrsa_data(path):
 
     Input: 
     input_file (path): path of the raw HRSA data
+    city (str): City whose health centers are kept, case insensitive
 
     Returns: 
     df (dataframe): preprocessed dataset
@@ -75,13 +85,13 @@ def get_hrsa_data(path):
     # Load Data
     df = pd.read_csv(path)
 
-    # Filter Chicago rows only, drop duplicates over combination of columns and rename ZIP Code to Zip Code
-    df = df[df["City"].str.lower() == "chicago"].drop_duplicates(
+    # Filter the city's rows only, drop duplicates over combination of columns and rename ZIP Code to Zip Code
+    df = df[df["City"].str.lower() == city.lower()].drop_duplicates(
         ["Health Center Name", "Operated By", "ZIP Code", "Telephone Number"]
     ).rename(columns={"ZIP Code": "Zip Code"})  
 
     # Extract 5-digit ZIP code and remove trailing and leading spaces across df
-    df.loc[:, "Zip Code"] = df["Zip Code"].astype(str).str[:5]
+    df.loc[:, "Zip Code"] = normalize_zips(df["Zip Code"])
     df = df.map(lambda x: x.strip() if isinstance(x, str) else x)
 
     # Get Telephone Number
@@ -93,62 +103,95 @@ def get_hrsa_data(path):
     df.columns = ['Health Center Facility', 'Address', 'Telephone Number', 'Zip Code']
     return df
 
-def fuzzy_match(df, threshold=0.85):
+def fuzzy_match(df, threshold=0.85, keys=(phone_key,), mode="greedy"):
     """
     Deduplicates health centers within combined dataset using jaro_winkler_similarity.
-    If name_sim or addr_sim is greater than the threshold, AND if telephone_sim is True between 2 rows, second row is considered a duplicate
+    If name_sim or addr_sim is greater than the threshold, AND if telephone_sim is True between 2 rows, second row is considered a duplicate.
+    Only pairs sharing a blocking key are compared (see candidate_pairs), so the work grows with the
+    block sizes instead of the square of the number of rows.
 
     Input: 
     df (dataframe): combined_df with all rows from the pdf and HRSA data
     threshold (int): Cut off for similarity (anything beyond this value is considered a match)
+    keys (list): Blocking key functions, phone_key by default; the candidates of all keys are compared
+    mode (str): 'greedy' keeps the first record and drops the later ones matching it, 'cluster' links
+    every matching pair into clusters and keeps one canonical record per cluster with its cluster_id,
+    whatever the row order (see entity_resolution.resolve_entities)
 
     Returns:
     df (dataframe) with only unique records
     
     """
+    if mode == "cluster":
+        return resolve_entities(df, threshold, keys)[1]
+    if mode != "greedy":
+        raise ValueError(f"mode must be 'greedy' or 'cluster', got '{mode}'")
+
     matched_indices = set()
     records = df.to_dict(orient="records")
+    candidates = candidate_pairs(records, keys)
     unique_records = []
 
     for i, rec1 in enumerate(records):
         if i in matched_indices:
             continue  # Skip already matched records
         
-        for j, rec2 in enumerate(records[i+1:], start=i+1):
+        for j in candidates.get(i, []):
             if j in matched_indices:
                 continue
-            
-            # Compare health center names and addresses
-            name_sim = jellyfish.jaro_winkler_similarity(rec1["Health Center Facility"], rec2["Health Center Facility"])
-            addr_sim = jellyfish.jaro_winkler_similarity(rec1["Address"], rec2["Address"]) if rec1["Address"] and rec2["Address"] else 0
-            telephone_sim = rec1["Telephone Number"] == rec2["Telephone Number"]
-
-            
-            # If similarity is above threshold for both entities, mark as duplicate
-            if (name_sim > threshold or addr_sim > threshold) and telephone_sim:
+            # Compare health center names, addresses and telephone numbers, mark as duplicate on a match
+            if is_match(rec1, records[j], threshold):
                 matched_indices.add(j)
         
         unique_records.append(rec1)  # Keep the first unique record
     return pd.DataFrame(unique_records) 
 
-def join_health_df():
+def join_health_df(convert_pdf=True, sink=None, pdf_path=HEALTH_PDF, hrsa_path=HRSA_DATA, city="chicago", mode="greedy",
+                   pdf_engine="tabula", pdf_cache_dir=PDF_CACHE_DIR):
     """
     Joins both sources of community health centers by using all the functions written above
     and returns a count of all community_health_centers for a zip code.
 
+    Input:
+    convert_pdf (bool): Extract the PDF (or reuse its cached extraction), or read the committed healthcentre_pdf.csv next to it
+    sink (DiskSink or MemorySink): Where the PDF extract (health_pdf_extract), the unified data and counts are saved,
+    nothing is saved if None
+    pdf_path (str): Health center PDF of the city, only HRSA is used if None
+    hrsa_path (str): National HRSA health center file
+    city (str): City of the HRSA rows to keep
+    mode (str): Deduplication mode of fuzzy_match, 'greedy' or 'cluster', or 'store' to only match the rows
+    that changed since the last run against the entity store kept in the sink (see entity_store)
+    pdf_engine (str): 'tabula' or 'pdfplumber', which does not need Java
+    pdf_cache_dir (str): Where PDF extractions are cached, None to always extract
+
     Returns:
     df (dataframe): 2 columns: Zip Code and count of unique community health centers 
     
     """
-    convert_pdf_to_csv("data/raw/community_health_ctr/HealthCentre1.pdf", "data/raw/community_health_ctr/healthcentre_pdf.csv")
-    pdf_data = process_health_data("data/raw/community_health_ctr/healthcentre_pdf.csv")
-    hrsa_data = get_hrsa_data("data/raw/community_health_ctr/HRSA_Data.csv")
-    combined_data = pd.concat([pdf_data, hrsa_data], ignore_index=True)
-    cleaned_data = fuzzy_match(combined_data)
-    cleaned_data.to_csv("data/preprocessed/unified_community_health_data.csv", index=False)
-    zip_counts = cleaned_data["Zip Code"].value_counts().reset_index()
-    zip_counts.columns = ["Zip Code", "cnt_comm_health_ctr"]
-    zip_counts.to_csv("data/preprocessed/unified_community_health_count.csv", index=False)
+    if mode == "store" and sink is None:
+        raise ValueError("The entity store is kept in the sink, pass one with mode='store'")
+
+    sources = {}
+    if pdf_path is not None:
+        if convert_pdf:
+            # The extract goes to the metro's sink, the raw folder is only read
+            extract = extract_pdf_tables(pdf_path, pdf_engine, cache_dir=pdf_cache_dir)
+            if sink is not None:
+                sink.write("health_pdf_extract", extract)
+            sources["pdf"] = process_health_data(extract)
+        else:
+            sources["pdf"] = process_health_data(os.path.join(os.path.dirname(pdf_path), "healthcentre_pdf.csv"))
+    sources["hrsa"] = get_hrsa_data(hrsa_path, city)
+
+    if mode == "store":
+        cleaned_data = update_entity_store(sink, sources).drop(columns="entity_id")
+    else:
+        combined_data = pd.concat(sources.values(), ignore_index=True)
+        cleaned_data = fuzzy_match(combined_data, mode=mode)
+    zip_counts = count_by_zip(zip_codes(cleaned_data["Zip Code"]), "cnt_comm_health_ctr")
+    if sink is not None:
+        sink.write("unified_community_health_data", cleaned_data)
+        sink.write("unified_community_health_count", zip_counts)
     return zip_counts
 
 
@@ -0,0 +1,90 @@
+import os
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+from zip_link.cleaning_analysis.storage import PACKAGE_DIR
+
+# Every metro checks its sources against the ZIPs of its own boundaries file (or
+# its ZIP prefix); the Chicago boundaries are the default list
+KNOWN_ZIPS_PATH = os.path.join(PACKAGE_DIR, "visualization", "Boundaries_-_ZIP_Codes_20250222.csv")
+
+
+@lru_cache(maxsize=None)
+def known_zips(path=KNOWN_ZIPS_PATH):
+    """
+    Sorted array of the ZIP codes of a boundaries file (ZIP column), Chicago's by default.
+    """
+    known = pd.read_csv(path, usecols=["ZIP"], dtype=str)["ZIP"].str.strip()
+    return np.sort(known.unique())
+
+
+def normalize_zips(values):
+    """
+    Vectorized ZIP normalization: first 5 characters, left padded with zeros
+    ('60601-1234' -> '60601', 60601.0 -> '60601', '123' -> '00123'). Missing
+    values stay missing.
+
+    Input:
+    values (Series or list): Raw ZIP codes, as numbers or strings
+
+    Returns:
+    zips (Series): 5 character strings, NaN where the input was missing
+    """
+    values = pd.Series(values)
+    missing = values.isna()
+    zips = values.astype(str).str.strip().str[:5].str.zfill(5)
+    return zips.mask(missing)
+
+
+def zip_codes(values, known=None):
+    """
+    Canonical Zip Code column: normalized ZIPs stored as a categorical whose
+    categories are the known ZIPs first, then any other ZIP found in values.
+    Known ZIPs therefore have the same small integer code in every source.
+
+    Input:
+    values (Series or list): Raw ZIP codes
+    known (array): Sorted known ZIPs of the metro (see known_zips), Chicago's if None
+
+    Returns:
+    zips (Series): Categorical Series with the same index as values
+    """
+    zips = normalize_zips(values)
+    known = known_zips() if known is None else known
+    unknown = np.setdiff1d(zips.dropna().unique().astype(str), known)
+    dtype = pd.CategoricalDtype(np.concatenate([known, unknown]))
+    return pd.Series(pd.Categorical(zips, dtype=dtype), index=zips.index, name=zips.name)
+
+
+def unknown_zips(zips, known=None, zip_prefix=None):
+    """
+    ZIPs of a canonical Zip Code column outside the metro, e.g. suburbs next to
+    Chicago or malformed codes: the ZIPs not in its known list (Chicago's if None),
+    or, with zip_prefix, for a metro without a boundaries file, the ZIPs not starting with it.
+    """
+    present = zips.cat.remove_unused_categories().cat.categories.astype(str)
+    if zip_prefix is not None:
+        return sorted(z for z in present if not z.startswith(zip_prefix))
+    return sorted(set(present) - set(known_zips() if known is None else known))
+
+
+def count_by_zip(zips, name):
+    """
+    Counts rows per ZIP on the integer codes, like value_counts but without
+    hashing strings: most frequent first, ties in code order.
+
+    Inputs:
+    zips (Series): Canonical Zip Code column (see zip_codes)
+    name (str): Name of the count column
+
+    Returns:
+    counts (dataframe): Zip Code and count, only ZIPs that appear
+    """
+    codes = zips.cat.codes.to_numpy()
+    counts = np.bincount(codes[codes >= 0], minlength=len(zips.cat.categories))
+    present = np.flatnonzero(counts)
+    order = present[np.argsort(-counts[present], kind="stable")]
+    return pd.DataFrame({
+        "Zip Code": pd.Categorical.from_codes(order, dtype=zips.dtype),
+        name: counts[order],
+    })
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+
+
+def join_on_zip(frames, how="left", key="Zip Code"):
+    """
+    Joins any number of dataframes on Zip Code in one pass, giving the same
+    rows as reduce(pd.merge) without building an intermediate frame per source.
+
+    Every frame's ZIPs are coded once against one shared categorical key, each
+    source is lined up with the first frame through those integer codes, and
+    the final table is assembled with a single aligned concat.
+
+    Inputs:
+    frames (list): Dataframes with a `key` column; all but the first must have unique keys
+    how (str): 'left' keeps every row of the first frame, 'inner' only ZIPs present in all frames
+    key (str): Name of the ZIP column
+
+    Returns:
+    df (dataframe): key followed by the columns of each frame in order. A
+    categorical key keeps the first frame's dtype, any other key is returned as a string.
+    """
+    if how not in ("left", "inner"):
+        raise ValueError(f"how must be 'left' or 'inner', got '{how}'")
+
+    if all(isinstance(df[key].dtype, pd.CategoricalDtype) for df in frames):
+        # Canonical ZIP columns (see zip_codes): only the categories need lining up, not every row
+        categories = pd.Index(frames[0][key].cat.categories)
+        for df in frames[1:]:
+            categories = categories.append(df[key].cat.categories.difference(categories))
+        dtype = pd.CategoricalDtype(categories)
+        keys = [df[key] for df in frames]
+        codes = [k.cat.set_categories(categories).cat.codes.to_numpy() for k in keys]
+    else:
+        # Shared categorical key, so every lookup below is on small integer codes
+        keys = [df[key].astype(str) for df in frames]
+        dtype = pd.CategoricalDtype(pd.concat(keys, ignore_index=True).unique())
+        codes = [pd.Categorical(k, dtype=dtype).codes for k in keys]
+
+    columns = [c for df in frames for c in df.columns if c != key]
+    if len(columns) != len(set(columns)):
+        raise ValueError("Frames share column names other than the key, rename them before joining")
+
+    # Position of each ZIP code in every other frame, -1 where it is missing
+    positions = []
+    for i, (df, code) in enumerate(zip(frames[1:], codes[1:]), start=1):
+        valid = code >= 0  # Missing keys have code -1 and never match
+        if len(np.unique(code[valid])) != valid.sum():
+            raise ValueError(f"Frame {i} has duplicate '{key}' values, joining it would multiply rows")
+        lookup = np.full(len(dtype.categories), -1)
+        lookup[code[valid]] = np.arange(len(df))[valid]
+        positions.append(np.where(codes[0] >= 0, lookup[codes[0]], -1))
+
+    rows = np.arange(len(frames[0]))
+    if how == "inner":
+        rows = rows[np.all([p >= 0 for p in positions], axis=0)] if positions else rows
+        positions = [p[rows] for p in positions]
+
+    # Rows of each source lined up with the first frame, NaN where a ZIP is missing
+    parts = [frames[0].drop(columns=key).iloc[rows].reset_index(drop=True)]
+    for df, pos in zip(frames[1:], positions):
+        parts.append(df.drop(columns=key).reset_index(drop=True).reindex(pos).reset_index(drop=True))
+
+    joined = pd.concat(parts, axis=1)
+    joined.insert(0, key, keys[0].iloc[rows].reset_index(drop=True))
+    return joined
@@ -0,0 +1,157 @@
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+from shapely import STRtree
+from zip_link.cleaning_analysis.raw_sources import read_raw
+from zip_link.cleaning_analysis.spatial_access import zip_polygons
+from zip_link.cleaning_analysis.zip_codes import zip_codes, count_by_zip
+from zip_link.cleaning_analysis.zip_join import join_on_zip
+
+
+def zip_index(zone_geoms):
+    """
+    STRtree over the ZIP polygons, prepared so every predicate query reuses their edge index.
+    """
+    shapely.prepare(zone_geoms)
+    return STRtree(zone_geoms)
+
+
+def points_in_zips(points, zone_geoms, tree=None):
+    """
+    Position of the ZIP polygon containing each point, with one vectorized
+    point-in-polygon query, -1 for points outside every ZIP or missing.
+
+    Inputs:
+    points (array): Shapely points, same CRS as the polygons
+    zone_geoms (array): ZIP polygons
+    tree (STRtree): zip_index of the polygons, built if None
+
+    Returns:
+    zone_of (array): ZIP position of each point
+    """
+    tree = tree or zip_index(zone_geoms)
+    point_idx, zone_idx = tree.query(points, predicate="intersects")
+    zone_of = np.full(len(points), -1)
+    # A point on the border of two ZIPs goes to the first one
+    first = np.unique(point_idx, return_index=True)[1]
+    zone_of[point_idx[first]] = zone_idx[first]
+    return zone_of
+
+
+def polygon_zip_shares(polygons, zone_geoms, tree=None):
+    """
+    Share of each polygon's area in every ZIP it overlaps (use a projected CRS).
+
+    Inputs:
+    polygons (array): Shapely polygons, same CRS as the ZIP polygons
+    zone_geoms (array): ZIP polygons
+    tree (STRtree): zip_index of the ZIP polygons, built if None
+
+    Returns:
+    polygon_idx, zone_idx (arrays): Positions of each overlapping (polygon, ZIP) pair
+    share (array): Share of the polygon's area in the ZIP, adding up to 1 for a polygon entirely inside the ZIPs
+    """
+    tree = tree or zip_index(zone_geoms)
+    polygon_idx, zone_idx = tree.query(polygons, predicate="intersects")
+    overlap = shapely.area(shapely.intersection(polygons[polygon_idx], zone_geoms[zone_idx]))
+    keep = overlap > 0
+    polygon_idx, zone_idx, overlap = polygon_idx[keep], zone_idx[keep], overlap[keep]
+    share = overlap / shapely.area(polygons)[polygon_idx]
+    return polygon_idx, zone_idx, share
+
+
+def spatial_zip_counts(facilities, shares, zips):
+    """
+    Facility counts by the ZIP the facilities lie in rather than their listed ZIP:
+    each grocery store counts once in its spatial ZIP, each park counts in every
+    ZIP it overlaps by its share of area there (so a park split in two adds 0.5 to each).
+
+    Inputs:
+    facilities (dataframe): reassign_zips output
+    shares (dataframe): park, Zip Code and share, one row per overlapping (park, ZIP) pair
+    zips (array): Zip Codes of the boundaries
+
+    Returns:
+    counts (dataframe): Zip Code, grocery_store_count and park_count of every ZIP of the boundaries
+    """
+    known = np.sort(zips.astype(str))
+    groceries = facilities.loc[facilities["source"] == "grocery_stores", "spatial_zip"]
+    grocery_counts = count_by_zip(zip_codes(groceries, known), "grocery_store_count")
+    park_counts = shares.groupby("Zip Code", sort=False)["share"].sum().rename("park_count").reset_index()
+    park_counts["Zip Code"] = zip_codes(park_counts["Zip Code"], known)
+    counts = join_on_zip([pd.DataFrame({"Zip Code": zip_codes(known, known)}), grocery_counts, park_counts])
+    return counts.fillna({"grocery_store_count": 0, "park_count": 0.0}).astype({"grocery_store_count": "int64"})
+
+
+def reassign_zips(boundaries_path, grocery_path=None, parks_path=None, sink=None, return_counts=False):
+    """
+    Spatial join of the located facilities onto the ZIP boundaries, to check the
+    free-text ZIPs the cleaners use: each grocery store Location point gets the
+    ZIP that contains it, and each park polygon the ZIP holding the largest share
+    of its area (all its shares are kept in park_zip_shares). Facilities without
+    a location are kept with no spatial ZIP and are not counted as disagreeing.
+
+    Inputs:
+    boundaries_path (str): CSV of the ZIP polygons
+    grocery_path, parks_path (str): Raw files, the registered ones if None
+    sink (DiskSink or MemorySink): Where facility_zips (every facility), zip_disagreements
+    (the facilities whose listed ZIP is not their spatial ZIP), park_zip_shares and
+    spatial_zip_counts (see spatial_zip_counts) are saved, nothing is saved if None
+    return_counts (bool): Return the spatial_zip_counts instead of the facilities, for the merge of a run with
+    spatial counts (see zip_bulk_stages)
+
+    Returns:
+    facilities (dataframe): source, name, listed_zip, spatial_zip (None outside every ZIP or without a location),
+    zip_share (share of the facility in its spatial ZIP) and disagrees
+    """
+    zones = zip_polygons(boundaries_path)
+    zips = np.asarray(zip_codes(zones["Zip Code"]).astype(object))
+    crs = zones.estimate_utm_crs()
+    zone_geoms = np.asarray(zones.to_crs(crs).geometry.values)
+    tree = zip_index(zone_geoms)
+
+    # Grocery stores: one point each, stores without a Location stay outside every ZIP
+    groceries = read_raw("grocery_points", grocery_path).reset_index(drop=True)
+    points = np.asarray(gpd.GeoSeries(shapely.from_wkt(groceries["Location"]), crs="EPSG:4326").to_crs(crs).values)
+    zone_of = points_in_zips(points, zone_geoms, tree)
+    grocery_rows = pd.DataFrame({
+        "source": "grocery_stores",
+        "name": groceries["Store Name"].str.replace(r"\s+", " ", regex=True).str.strip(),
+        "listed_zip": zip_codes(groceries["Zip"]).astype(object),
+        "spatial_zip": np.where(zone_of >= 0, zips[zone_of], None),
+        "zip_share": (zone_of >= 0).astype(float),
+        "located": groceries["Location"].notna().to_numpy(),
+    })
+
+    # Parks: split by area, the largest share names the park's ZIP
+    parks = read_raw("park_shapes", parks_path).dropna(subset=["the_geom"]).reset_index(drop=True)
+    polygons = np.asarray(gpd.GeoSeries(shapely.from_wkt(parks["the_geom"]), crs="EPSG:4326").to_crs(crs).values)
+    park_idx, zone_idx, share = polygon_zip_shares(polygons, zone_geoms, tree)
+    shares = pd.DataFrame({"park": park_idx, "Zip Code": zips[zone_idx], "share": share})
+    largest = shares.sort_values(["park", "share"], ascending=[True, False]).drop_duplicates("park").set_index("park")
+    park_rows = pd.DataFrame({
+        "source": "parks",
+        "name": parks["PARK"],
+        "listed_zip": zip_codes(parks["ZIP"]).astype(object),
+        "spatial_zip": largest["Zip Code"].reindex(range(len(parks))).to_numpy(),
+        "zip_share": largest["share"].reindex(range(len(parks))).fillna(0).to_numpy(),
+        "located": True,
+    })
+    shares.insert(1, "name", parks["PARK"].to_numpy()[park_idx])
+
+    facilities = pd.concat([grocery_rows, park_rows], ignore_index=True)
+    located = facilities.pop("located").to_numpy(dtype=bool)
+    facilities["disagrees"] = located & (facilities["listed_zip"].fillna("") != facilities["spatial_zip"].fillna(""))
+    disagreements = facilities[facilities["disagrees"]]
+    for source, rows in facilities.groupby("source"):
+        print(f"{source}: {int(rows['disagrees'].sum())} of {len(rows)} rows have a listed ZIP other than the ZIP they are in"
+              f" ({int((~located[rows.index]).sum())} without a location)")
+    counts = spatial_zip_counts(facilities, shares, zips)
+
+    if sink is not None:
+        sink.write("facility_zips", facilities)
+        sink.write("zip_disagreements", disagreements)
+        sink.write("park_zip_shares", shares)
+        sink.write("spatial_zip_counts", counts)
+    return counts if return_counts else facilities
@@ -1,14 +1,171 @@
-import requests
+import argparse
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
 import lxml.html as lh
 import pandas as pd
 import re
-from functools import reduce
 from zip_link.cleaning_analysis.bulk_data_processing import clean_parks_data, clean_grocery_data, clean_publictransit_data, clean_hospital_data, clean_school_data, clean_population_data
-from zip_link.cleaning_analysis.unified_community_health import join_health_df 
-from zip_link.cleaning_analysis.accessibility_index import calculate_accessibility_index
+from zip_link.cleaning_analysis.unified_community_health import join_health_df
+from zip_link.cleaning_analysis.pdf_tables import PDF_CACHE_DIR
+from zip_link.cleaning_analysis.accessibility_index import calculate_accessibility_index, index_definitions, zip_areas
+from zip_link.cleaning_analysis.spatial_access import spatial_access_data
+from zip_link.cleaning_analysis.hex_grid import hex_access_data
+from zip_link.cleaning_analysis.zip_reassignment import reassign_zips
+from zip_link.cleaning_analysis.http_session import make_client, make_async_client, METRICS
+from zip_link.cleaning_analysis.pipeline import Stage, run_pipeline
+from zip_link.cleaning_analysis.storage import DiskSink, StagedSink, export_to_csv, in_memory, PREPROCESSED_DIR
+from zip_link.cleaning_analysis.zip_join import join_on_zip
+from zip_link.cleaning_analysis.zip_codes import zip_codes, unknown_zips, known_zips, KNOWN_ZIPS_PATH
+from zip_link.cleaning_analysis.metros import METROS, metro_dir
 
 
-def scrape_zipatlas(url, output_csv):
+# ZipAtlas comparison pages and the raw file each one is saved to
+ZIPATLAS_PAGES = [
+    ("lowest-property-prices", "median_property_prices.csv"),
+    ("lowest-housing-costs", "median_housing_costs.csv"),
+    ("highest-owner-occupied-housing-costs", "owner_median_housing_costs.csv"),
+    ("highest-renter-occupied-housing-costs", "renter_median_housing_costs.csv"),
+    ("highest-housing-cost-as-percentage-of-income", "housing_cost_perc_income.csv"),
+    ("highest-unemployment-rate", "unemployment_rates.csv"),
+    ("highest-poverty", "poverty_levels.csv"),
+]
+
+
+def zipatlas_urls(metro):
+    """
+    (url, output_csv) pairs of the ZipAtlas pages of a metro, saved under its raw directory.
+    """
+    return [(f"https://zipatlas.com/{metro.zipatlas_path}/zip-code-comparison/{page}.htm",
+             os.path.join(metro.raw_dir, "zipatlas_data", filename))
+            for page, filename in ZIPATLAS_PAGES]
+
+
+# List of URLs and corresponding output filenames for Chicago
+ZIPATLAS_URLS = zipatlas_urls(METROS["chicago"])
+
+HEADERS = {'User-Agent': 'Mozilla/5.0'}
+
+# Max number of ZipAtlas pages requested at the same time by the async scraper
+MAX_CONCURRENT_REQUESTS = 8
+
+# Characters dropped before converting a ZipAtlas value like "$312,400" or "12.4%"
+VALUE_JUNK = str.maketrans("", "", "$,% ")
+
+
+def parse_value(text):
+    """
+    Converts one ZipAtlas cell into a number and its unit.
+
+    Input:
+    text (str): Cell text, e.g. "$312,400", "12.4%" or "1,244"
+
+    Returns:
+    (value, unit) tuple: value is a float (NaN if the cell is not a number) and
+    unit is 'USD', 'percent' or None
+    """
+    text = text.strip()
+    if text.startswith(("$", "-$")):
+        unit = "USD"
+    elif text.endswith("%"):
+        unit = "percent"
+    else:
+        unit = None
+    try:
+        value = float(text.translate(VALUE_JUNK))
+    except ValueError:
+        value = float("nan")
+    return value, unit
+
+
+def zipatlas_frame(rows, col_name):
+    """
+    Builds the typed dataframe of one ZipAtlas page: canonical Zip Code (see
+    zip_codes) and the attribute as floats, with its unit kept in df.attrs['units'].
+
+    Inputs:
+    rows (iterable): (zip code, cell text) pairs
+    col_name (str): Name of the attribute column
+
+    Returns:
+    df (DataFrame): Zip Code and attribute column
+    """
+    zips, values, units = [], [], set()
+    for zip_code, text in rows:
+        value, unit = parse_value(str(text))
+        zips.append(str(zip_code))
+        values.append(value)
+        units.add(unit)
+
+    units.discard(None)
+    df = pd.DataFrame({"Zip Code": zip_codes(zips), col_name: pd.Series(values, dtype="float64")})
+    df.attrs["units"] = {col_name: units.pop() if len(units) == 1 else None}
+    return df
+
+
+def read_zipatlas_rows(html_text):
+    """
+    Extracts the (Zip Code, value text) pairs of the table with id 'comp'
+    from a ZipAtlas page, or None if the table is not found.
+    """
+    root = lh.fromstring(html_text)
+
+    # Locate the table by its ID
+    table = root.xpath("//table[@id='comp']")
+
+    if not table:
+        return None
+    table = table[0]  # Get the first matching table
+
+    # Keep the 2nd and 3rd cells of every row: Zip Code and the attribute, skipping rows without them
+    rows = []
+    for tr in table.xpath(".//tbody//tr"):
+        cells = [td.text_content().strip() for td in tr.xpath(".//td")]
+        if len(cells) >= 3:
+            rows.append((cells[1], cells[2]))
+    return rows
+
+
+def zipatlas_column(output_csv):
+    return re.search(r'/([^/]+)\.csv', output_csv).group(1)  # Named after the output file
+
+
+def parse_zipatlas_table(html_text, output_csv):
+    """
+    Parses the table with id 'comp' from a ZipAtlas page into a dataframe 
+    with Zip Code and the housing-related attribute of the page, converted
+    to numbers while the rows are extracted.
+
+    Inputs:
+    html_text (str): HTML of the ZipAtlas page.
+    output_csv (path): The name of the output CSV file, used to name the attribute column.
+
+    Returns:
+    df (DataFrame): Zip Code and numeric attribute column (unit in df.attrs['units']), or None if the table is not found.
+    """
+    rows = read_zipatlas_rows(html_text)
+    if rows is None:
+        return None
+    return zipatlas_frame(rows, zipatlas_column(output_csv))
+
+
+def save_zipatlas_rows(rows, output_csv):
+    """
+    Saves the scraped rows as they appear on the page, so the raw file keeps the units.
+    """
+    pd.DataFrame(rows, columns=["Zip Code", zipatlas_column(output_csv)]).to_csv(output_csv, index=False)
+    print(f"Data successfully saved to '{output_csv}'.")
+
+
+def read_zipatlas_csv(path):
+    """
+    Reads a raw ZipAtlas file into the same typed dataframe the scraper returns.
+    """
+    raw = pd.read_csv(path, dtype=str, keep_default_na=False)
+    return zipatlas_frame(raw.itertuples(index=False), raw.columns[1])
+
+
+def scrape_zipatlas(url, output_csv, use_cache=True, client=None):
     """
     Scrapes a table with id 'comp' from the given URL where zip-specific 
     housing-related attributes are present and saves it as a CSV file.
@@ -16,122 +173,357 @@ def scrape_zipatlas(url, output_csv):
     Inputs:
     url (str): The webpage URL to scrape.
     output_csv (path): The name of the output CSV file.
+    use_cache (bool): Revalidate against the on-disk response cache instead of re-downloading.
+    client (httpx.Client): Client shared by the pages of a run, so connections are reused;
+    a client is opened for this page only if None.
+
+    Returns:
+    df (DataFrame): Zip Code and numeric attribute column, or None if the page failed.
     """
-    headers = {'User-Agent': 'Mozilla/5.0'}
-    response = requests.get(url, headers=headers)
+    if client is None:
+        with make_client(use_cache, headers=HEADERS, follow_redirects=True) as client:
+            return scrape_zipatlas(url, output_csv, use_cache, client)
+    response = client.get(url)
 
     if response.status_code == 200:
-        root = lh.fromstring(response.text)
+        rows = read_zipatlas_rows(response.text)
         
-        # Locate the table by its ID
-        table = root.xpath("//table[@id='comp']")
-        
-        if table:
-            table = table[0]  # Get the first matching table
-            
-            # Extract headers
-            headers = [th.text_content().strip() for th in table.xpath(".//thead//td")]
-
-            # Extract table rows
-            rows = []
-            for tr in table.xpath(".//tbody//tr"):
-                cells = [td.text_content().strip() for td in tr.xpath(".//td")]
-                rows.append(cells)
-            
-            # Convert to DataFrame
-            df = pd.DataFrame(rows, columns=headers)
-            df = df.iloc[:, 1:3] # Retain 2nd and 3rd rows 
-            col_name = re.search(r'/([^/]+)\.csv', output_csv).group(1) 
-            df.columns = ['Zip Code', col_name] # Name 2nd column based on output_csv name
-
+        if rows is not None:
             # Save to CSV
-            df.to_csv(output_csv, index=False)
-            print(f"Data successfully saved to '{output_csv}'.")
+            save_zipatlas_rows(rows, output_csv)
+            return zipatlas_frame(rows, zipatlas_column(output_csv))
         else:
             print(f"Table with id 'comp' not found in {url}.")
     else:
         print(f"Failed to fetch {url}, status code: {response.status_code}")
 
-def create_zipatlas_data():
 
+async def fetch_zipatlas(client, semaphore, url, output_csv, save=True):
     """
-    Scrape all the 7 urls of relevance from ZipAtlas, and inner joins all the data into one dataframe using Zip Code as the key
-    
-    Returns: 
-    merged_df (DataFrame): merged dataframe with Zip Code and all the housing-related variables of relevance.
+    Fetches one ZipAtlas page with the shared async client, parses its 'comp' 
+    table as soon as the response arrives and saves it as a CSV file.
 
+    Inputs:
+    client (httpx.AsyncClient): Shared client that keeps connections alive.
+    semaphore (asyncio.Semaphore): Limits how many requests are in flight.
+    url (str): The webpage URL to scrape.
+    output_csv (path): The name of the output CSV file.
+    save (bool): Save the CSV file, or only return the table.
+
+    Returns:
+    df (DataFrame): Zip Code and numeric attribute column, or None if the page failed.
     """
+    async with semaphore:
+        response = await client.get(url)
 
-    # List of URLs and corresponding output filenames
-    urls = [
-        ("https://zipatlas.com/us/il/chicago/zip-code-comparison/lowest-property-prices.htm", "data/raw/zipatlas_data/median_property_prices.csv"),
-        ("https://zipatlas.com/us/il/chicago/zip-code-comparison/lowest-housing-costs.htm", "data/raw/zipatlas_data/median_housing_costs.csv"),
-        ("https://zipatlas.com/us/il/chicago/zip-code-comparison/highest-owner-occupied-housing-costs.htm", "data/raw/zipatlas_data/owner_median_housing_costs.csv"),
-        ("https://zipatlas.com/us/il/chicago/zip-code-comparison/highest-renter-occupied-housing-costs.htm", "data/raw/zipatlas_data/renter_median_housing_costs.csv"),
-        ("https://zipatlas.com/us/il/chicago/zip-code-comparison/highest-housing-cost-as-percentage-of-income.htm", "data/raw/zipatlas_data/housing_cost_perc_income.csv"),
-        ("https://zipatlas.com/us/il/chicago/zip-code-comparison/highest-unemployment-rate.htm", "data/raw/zipatlas_data/unemployment_rates.csv"),
-        ("https://zipatlas.com/us/il/chicago/zip-code-comparison/highest-poverty.htm", "data/raw/zipatlas_data/poverty_levels.csv")
-    ]
+    if response.status_code != 200:
+        print(f"Failed to fetch {url}, status code: {response.status_code}")
+        return None
 
-    # Scrape each URL
-    for url, filename in urls:
-        scrape_zipatlas(url, filename)
+    # Parse in a worker thread so other responses keep streaming in meanwhile
+    rows = await asyncio.to_thread(read_zipatlas_rows, response.text)
+    if rows is None:
+        print(f"Table with id 'comp' not found in {url}.")
+        return None
 
-     # Read and merge data
-    dfs = [pd.read_csv(f) for _, f in urls]
-    df_merged = reduce(lambda left, right: pd.merge(left, right, on="Zip Code", how="inner"), dfs)
+    if save:
+        save_zipatlas_rows(rows, output_csv)
+    return zipatlas_frame(rows, zipatlas_column(output_csv))
 
-    return df_merged 
 
+async def scrape_zipatlas_async(urls, max_concurrency=MAX_CONCURRENT_REQUESTS, transport=None, use_cache=True, save=True):
+    """
+    Scrapes all the given ZipAtlas pages concurrently over one pooled 
+    httpx.AsyncClient, so the wall time stays close to the slowest page.
 
-def zip_bulk_data():
+    Inputs:
+    urls (list): (url, output_csv) pairs to scrape.
+    max_concurrency (int): Max number of requests running at once.
+    transport (httpx.AsyncBaseTransport): Optional transport for the client.
+    use_cache (bool): Revalidate against the on-disk response cache when no transport is given.
+    save (bool): Save the raw CSV files, or only return the tables.
 
+    Returns:
+    dfs (list): One dataframe (or None on failure) per url, in the same order as urls. A page
+    that raises is reported and returned as None, the other pages are kept.
     """
-    - Merges all our data sources together but pre-processing each one of them and executing left joins iteratively. The key for these joins will once again be Zip Code.
-    - Create a new column called total_healthcare_services which is the sum of hospitals and community health centers. 
-    - Convert all columns except Zip Code to floats
-    - Saves this data in the data/preprocessed folder
-    - Adds the Accessibility Index at the end and also saves the final file to the data/preprocessed folder
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async with make_async_client(use_cache, max_concurrency, transport=transport,
+                                 headers=HEADERS, follow_redirects=True) as client:
+        tasks = [fetch_zipatlas(client, semaphore, url, filename, save) for url, filename in urls]
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+
+    dfs = []
+    for (url, _), result in zip(urls, results):
+        if isinstance(result, Exception):
+            print(f"Failed to scrape {url}: {result!r}")
+            result = None
+        dfs.append(result)
+    return dfs
+
+def create_zipatlas_data(concurrent=True, scrape=True, urls=ZIPATLAS_URLS, frames=None):
 
     """
+    Scrape all the 7 urls of relevance from ZipAtlas, and inner joins all the data into one dataframe using Zip Code as the key
 
-    # Load the datasets into DataFrames
-    zipatlas_df = create_zipatlas_data()
-    comm_health_df = join_health_df()
-    parks_count = clean_parks_data("data/raw/parks/CPD_Parks_2025.csv")
-    grocery_store_count = clean_grocery_data("data/raw/grocery_stores/grocery_stores_data.csv")
-    public_transit_count = clean_publictransit_data("data/raw/public_transit/publictransit_2024.csv")
-    hospital_count = clean_hospital_data("data/raw/hospitals/hospitals.csv")
-    school_count = clean_school_data("data/raw/schools/schools_data.csv")
-    population = clean_population_data("data/raw/population/Population_Data.csv")
+    Inputs:
+    concurrent (bool): Scrape the pages concurrently with the async scraper (default) or one after another.
+    scrape (bool): Scrape the pages (saving the raw ZipAtlas files) and merge the scraped tables, or only
+    merge the raw files already saved. A page that fails to scrape is read from its raw file.
+    urls (list): (url, output_csv) pairs of the metro, Chicago's by default (see zipatlas_urls).
+    frames (list): Tables already scraped for the urls (None for a page to read from its raw file),
+    used instead of scraping.
+    
+    Returns: 
+    merged_df (DataFrame): merged dataframe with Zip Code and all the housing-related variables of relevance.
+
+    """
+    # Scrape each URL, unless the pages were already scraped
+    dfs = list(frames) if frames is not None else [None] * len(urls)
+    scrape = scrape and frames is None
+    if scrape and concurrent:
+        dfs = asyncio.run(scrape_zipatlas_async(urls))
+        print(METRICS.report())
+    elif scrape:
+        # One client for every page, as the async path does
+        with make_client(headers=HEADERS, follow_redirects=True) as client:
+            dfs = [scrape_zipatlas(url, filename, client=client) for url, filename in urls]
+        print(METRICS.report())
+
+    # Merge the scraped tables, the raw files are only parsed for the pages that were not scraped
+    dfs = [df if df is not None else read_zipatlas_csv(f) for df, (_, f) in zip(dfs, urls)]
+    df_merged = join_on_zip(dfs, how="inner")
+    df_merged.attrs["units"] = {col: unit for df in dfs for col, unit in df.attrs["units"].items()}
+
+    return df_merged 
 
 
+def merge_zip_bulk_data(zipatlas_df, comm_health_df, parks_count, grocery_store_count, public_transit_count, hospital_count, school_count, population,
+                        spatial_counts=None, sink=None, boundaries_path=KNOWN_ZIPS_PATH, zip_prefix=None):
+
+    """
+    Left joins the cleaned sources onto the ZipAtlas data using Zip Code, adds
+    total_healthcare_services, casts all columns except Zip Code to floats 
+    and saves the result to the sink as zipatlas_bulk_merge. The ZipAtlas units
+    are kept in final_df.attrs['units'].
+
+    Input:
+    spatial_counts (DataFrame): Grocery store and park counts by the ZIP the facilities lie in (see
+    zip_reassignment.spatial_zip_counts), used instead of the counts by listed ZIP if given
+    boundaries_path (str): Boundaries file of the metro's ZIPs, the ZIPs of every source are checked against it
+    zip_prefix (str): Prefix of the metro's ZIPs, used instead when the metro has no boundaries file
+
+    Returns:
+    final_df (DataFrame): merged data, one row per ZipAtlas Zip Code
+    """
+    if spatial_counts is not None:
+        parks_count = spatial_counts[["Zip Code", "park_count"]]
+        grocery_store_count = spatial_counts[["Zip Code", "grocery_store_count"]]
     dfs = [zipatlas_df, comm_health_df, parks_count, grocery_store_count, public_transit_count, hospital_count, school_count, population]
-    dfs = [df.astype({'Zip Code': 'str'}) for df in dfs] # Ensure Zip Code is a string in all dfs
 
-    # Perform left joins iteratively
-    final_df = reduce(lambda left, right: pd.merge(left, right, on='Zip Code', how='left'), dfs)
-    final_df = final_df.fillna(0)
+    # Report ZIPs outside the metro, they cannot match a ZipAtlas row
+    known = known_zips(boundaries_path) if boundaries_path is not None else None
+    for df in dfs:
+        unknown = unknown_zips(zip_codes(df["Zip Code"], known), known, None if boundaries_path is not None else zip_prefix)
+        if unknown:
+            print(f"{df.columns[1]}: {len(unknown)} unknown Zip Codes ignored ({', '.join(unknown[:5])}{', ...' if len(unknown) > 5 else ''})")
+
+    # Left join every source onto the ZipAtlas Zip Codes in one pass
+    final_df = join_on_zip(dfs, how='left')
+    values = final_df.columns.drop('Zip Code')
+    final_df[values] = final_df[values].fillna(0)
 
     # Sum hospitals and comm_health_ctr count for new column and drop the original 2 
     final_df['total_healthcare_services'] = final_df['cnt_comm_health_ctr'] + final_df['hospital_count'] 
     final_df = final_df.drop(['cnt_comm_health_ctr', 'hospital_count'], axis=1)
 
-    # Convert all columns other than Zip Code to float
+    # Values were already typed when they were read, so only check the dtypes and cast to float
     for col in final_df.columns:
         if col != "Zip Code":
-            final_df[col] = (final_df[col].astype(str)  # Ensure strings for cleaning
-                .str.replace(r'[^0-9.-]', '', regex=True)  # Remove non-numeric units
-                .astype(float)
-            )
+            if not pd.api.types.is_numeric_dtype(final_df[col]):
+                raise TypeError(f"Column '{col}' is not numeric ({final_df[col].dtype}), parse it when it is read")
+            final_df[col] = final_df[col].astype(float)
+    final_df.attrs["units"] = zipatlas_df.attrs.get("units", {})
 
-    final_df.to_csv("data/preprocessed/zipatlas_bulk_merge.csv", index=False)
-    print(f"Zip and Bulk Data merged and successfully saved.")
-    calculate_accessibility_index("data/preprocessed/zipatlas_bulk_merge.csv")
+    if sink is not None:
+        sink.write("zipatlas_bulk_merge", final_df)
+        print(f"Zip and Bulk Data merged and successfully saved.")
+    return final_df
 
 
-if __name__ == "__main__":
-    zip_bulk_data()
+def zip_bulk_stages(sink=None, metro=METROS["chicago"], zipatlas_frames=None, spatial_counts=False):
+
+    """
+    Describes zip_bulk_data for one metro as pipeline stages, each with the files it
+    reads and writes, so unchanged stages can be skipped (see pipeline.run_pipeline).
+
+    Input:
+    sink (DiskSink, MemorySink or StagedSink): Where the stages save their tables, the metro's partition by default
+    metro (Metro): Metro whose raw files are cleaned, Chicago by default
+    zipatlas_frames (list): ZipAtlas tables scraped in memory for the metro's pages, merged instead of the raw files
+    spatial_counts (bool): Count grocery stores and parks by the ZIP they lie in (the zip_reassignment stage)
+    rather than by their listed ZIP in the merge and the index. Needs the metro's ZIP boundaries
+
+    Returns:
+    stages (list): Stage objects in execution order
+    """
+    if spatial_counts and metro.zip_boundaries is None:
+        raise ValueError(f"Spatial counts need ZIP boundaries, {metro.name} has none")
+    sink = sink or DiskSink(metro_dir(metro))
+    urls = zipatlas_urls(metro)
+    zipatlas_kwargs = {"scrape": False, "urls": urls}
+    if zipatlas_frames is not None:
+        zipatlas_kwargs["frames"] = zipatlas_frames
+    health_pdf = metro.raw_path("health_pdf") if metro.health_pdf else None
+    hrsa = metro.raw_path("hrsa")
+    paths = {name: metro.raw_path(name) for name in ["parks", "grocery_stores", "public_transit", "hospitals", "schools", "population"]}
+    stages = [
+        Stage("zipatlas", create_zipatlas_data, kwargs=zipatlas_kwargs,
+              inputs=[f for _, f in urls]),
+        Stage("community_health", join_health_df, kwargs={"sink": sink, "pdf_path": health_pdf, "hrsa_path": hrsa, "city": metro.city,
+                                                               "pdf_cache_dir": None if in_memory(sink) else PDF_CACHE_DIR},
+              inputs=[p for p in [health_pdf, hrsa] if p is not None],
+              outputs=sink.outputs(["unified_community_health_data", "unified_community_health_count"]
+                                   + (["health_pdf_extract"] if health_pdf else []))),
+        Stage("parks", clean_parks_data, kwargs={"path": paths["parks"], "sink": sink}, inputs=[paths["parks"]],
+              outputs=sink.outputs(["park_data"])),
+        Stage("grocery_stores", clean_grocery_data, kwargs={"path": paths["grocery_stores"], "sink": sink}, inputs=[paths["grocery_stores"]],
+              outputs=sink.outputs(["grocery_store_data"])),
+        Stage("public_transit", clean_publictransit_data, kwargs={"path": paths["public_transit"], "sink": sink, "zip_prefix": metro.zip_prefix},
+              inputs=[paths["public_transit"]], outputs=sink.outputs(["public_transit_data"])),
+        Stage("hospitals", clean_hospital_data, kwargs={"path": paths["hospitals"], "sink": sink}, inputs=[paths["hospitals"]],
+              outputs=sink.outputs(["hospital_data"])),
+        Stage("schools", clean_school_data, kwargs={"path": paths["schools"], "sink": sink}, inputs=[paths["schools"]],
+              outputs=sink.outputs(["school_data"])),
+        Stage("population", clean_population_data, kwargs={"path": paths["population"], "sink": sink}, inputs=[paths["population"]],
+              outputs=sink.outputs(["population_data"])),
+        Stage("merge", merge_zip_bulk_data, kwargs={"sink": sink, "boundaries_path": metro.zip_boundaries, "zip_prefix": metro.zip_prefix},
+              outputs=sink.outputs(["zipatlas_bulk_merge"]),
+              deps=["zipatlas", "community_health", "parks", "grocery_stores", "public_transit", "hospitals", "schools", "population"]
+              + (["zip_reassignment"] if spatial_counts else [])),
+        Stage("accessibility_index", calculate_accessibility_index, kwargs={"sink": sink}, deps=["merge"],
+              outputs=sink.outputs(["zipatlas_bulk_merge"])),
+        Stage("zip_areas", zip_areas, kwargs={"boundaries_path": metro.zip_boundaries, "transit_path": paths["public_transit"],
+                                              "zip_prefix": metro.zip_prefix},
+              inputs=[metro.zip_boundaries or paths["public_transit"]]),
+        Stage("index_definitions", index_definitions, kwargs={"sink": sink}, deps=["merge", "zip_areas"],
+              outputs=sink.outputs(["index_definitions"])),
+    ]
+    # Distance based accessibility needs the metro's ZIP polygons
+    if metro.zip_boundaries is not None:
+        stages.append(Stage("spatial_access", spatial_access_data, deps=["population"],
+                            kwargs={"boundaries_path": metro.zip_boundaries, "grocery_path": paths["grocery_stores"],
+                                    "parks_path": paths["parks"], "sink": sink},
+                            inputs=[metro.zip_boundaries, paths["grocery_stores"], paths["parks"]],
+                            outputs=sink.outputs(["spatial_access"])))
+        stages.append(Stage("hex_access", hex_access_data, deps=["population"],
+                            kwargs={"boundaries_path": metro.zip_boundaries, "grocery_path": paths["grocery_stores"],
+                                    "parks_path": paths["parks"], "sink": sink},
+                            inputs=[metro.zip_boundaries, paths["grocery_stores"], paths["parks"]],
+                            outputs=sink.outputs(["hex_cells", "hex_cell_zip"])))
+        stages.append(Stage("zip_reassignment", reassign_zips,
+                            kwargs={"boundaries_path": metro.zip_boundaries, "grocery_path": paths["grocery_stores"],
+                                    "parks_path": paths["parks"], "sink": sink, "return_counts": True},
+                            inputs=[metro.zip_boundaries, paths["grocery_stores"], paths["parks"]],
+                            outputs=sink.outputs(["facility_zips", "zip_disagreements", "park_zip_shares", "spatial_zip_counts"])))
+    return stages
+
+
+def run_metro(metro, incremental=True, workers=1, export_csv=False, sink=None, root=PREPROCESSED_DIR, zipatlas_frames=None,
+              spatial_counts=False):
+    """
+    Runs the stages of one metro into its sink. Module-level so metros can run in
+    worker processes; each metro has its own partition and stage cache, so
+    recomputing one never touches the others. zipatlas_frames are tables scraped
+    in memory and spatial_counts switches the merge to the spatial facility counts,
+    see zip_bulk_stages.
+
+    Returns:
+    sink: The sink holding the metro's tables
+    """
+    sink = sink or DiskSink(metro_dir(metro, root))
+    on_disk = isinstance(sink, DiskSink)
+    print(f"=== {metro.name} ({metro.state}) ===")
+    stages = zip_bulk_stages(sink, metro, zipatlas_frames, spatial_counts)
+    cache_dir = os.path.join(sink.root, ".pipeline_cache") if on_disk else None
+    run_pipeline(stages, cache_dir=cache_dir, force=not incremental, workers=workers)
+
+    paths = sorted({path for stage in stages for path in stage.outputs})
+    if isinstance(sink, StagedSink):
+        paths = sink.publish()
+    if export_csv:
+        export_to_csv(paths)
+    return sink
 
 
+def zip_bulk_data(incremental=True, scrape=True, workers=1, export_csv=False, sink=None, metros=("chicago",),
+                  root=PREPROCESSED_DIR, spatial_counts=False):
 
+    """
+    - Merges all our data sources together but pre-processing each one of them and executing left joins iteratively. The key for these joins will once again be Zip Code.
+    - Create a new column called total_healthcare_services which is the sum of hospitals and community health centers. 
+    - Convert all columns except Zip Code to floats
+    - Saves this data in the metro's partition of data/preprocessed (state=<state>/metro=<name>)
+    - Adds the Accessibility Index at the end and also saves the final file to the same partition
+
+    Inputs:
+    incremental (bool): Skip stages whose inputs and code did not change since the last run.
+    scrape (bool): Refresh the raw ZipAtlas files of the metros before running.
+    workers (int): Number of processes. With several metros each process runs a whole metro,
+    with one metro they run its independent cleaning stages at the same time.
+    export_csv (bool): Also write CSV copies of the Parquet files.
+    sink (DiskSink, MemorySink or StagedSink): Where the tables go, the metro's partition by default.
+    Only for a single metro. A MemorySink keeps everything in memory, including the scraped ZipAtlas
+    tables (saved to it as zipatlas_<column> instead of data/raw), and skips the HTTP and PDF caches on disk.
+    A StagedSink publishes all files at the end. Both run every stage, in this process, without the stage cache.
+    metros (list): Names in metros.METROS (or Metro objects) to run, Chicago by default.
+    root (str): Folder holding the metro partitions, data/preprocessed by default.
+    spatial_counts (bool): Count grocery stores and parks by the ZIP polygon they lie in instead of the ZIP
+    listed in the raw files (see zip_reassignment). Off by default; every metro needs ZIP boundaries.
+
+    Returns:
+    sinks (dict or sink): Metro name -> sink holding its tables; just the sink for a single metro
+    """
+    metros = [METROS[m] if isinstance(m, str) else m for m in metros]
+    if sink is not None and len(metros) > 1:
+        raise ValueError("A custom sink holds a single metro, run the metros one at a time")
+    if sink is not None and not isinstance(sink, DiskSink) and workers > 1:
+        raise ValueError("Tables written to an in-memory sink by worker processes would be lost, use workers=1")
+
+    frames = None
+    if scrape:
+        pairs = [pair for metro in metros for pair in zipatlas_urls(metro)]
+        memory = in_memory(sink)
+        scraped = asyncio.run(scrape_zipatlas_async(pairs, use_cache=not memory, save=not memory))
+        print(METRICS.report())
+        if memory:
+            # Nothing is written to data/raw, the raw tables go to the sink with the others
+            frames = scraped
+            for (_, output_csv), df in zip(pairs, scraped):
+                if df is not None:
+                    sink.write(f"zipatlas_{zipatlas_column(output_csv)}", df)
+
+    if len(metros) == 1:
+        return run_metro(metros[0], incremental, workers, export_csv, sink, root, frames, spatial_counts)
+
+    # Metros are independent, so each one runs in its own process
+    with ProcessPoolExecutor(max_workers=max(workers, 1)) as pool:
+        futures = {metro.name: pool.submit(run_metro, metro, incremental, 1, export_csv, None, root, None, spatial_counts) for metro in metros}
+        return {name: future.result() for name, future in futures.items()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the merged ZIP code dataset and Accessibility Index.")
+    parser.add_argument("--workers", type=int, default=1, help="Processes for metros or independent cleaning stages (default 1)")
+    parser.add_argument("--full", action="store_true", help="Re-run every stage instead of skipping unchanged ones")
+    parser.add_argument("--no-scrape", action="store_true", help="Use the raw ZipAtlas files already in data/raw")
+    parser.add_argument("--csv", action="store_true", help="Also export the preprocessed tables as CSV")
+    parser.add_argument("--spatial-counts", action="store_true",
+                        help="Count grocery stores and parks by the ZIP they lie in instead of their listed ZIP")
+    parser.add_argument("--metro", action="append", choices=sorted(METROS) + ["all"],
+                        help="Metro to run, can be repeated or 'all' (default chicago)")
+    args = parser.parse_args()
+    metros = sorted(METROS) if args.metro and "all" in args.metro else (args.metro or ["chicago"])
+    zip_bulk_data(incremental=not args.full, scrape=not args.no_scrape, workers=args.workers, export_csv=args.csv,
+                  metros=metros, spatial_counts=args.spatial_counts)
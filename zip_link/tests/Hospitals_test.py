@@ -1,8 +1,10 @@
 import pytest
 import requests
+import httpx
 import pandas as pd
 import re
 from lxml import html
+from zip_link.cleaning_analysis.hospital_data import iter_hospital_records, parse_hospital_cell, scrape_hospitals
 
 # URL for the hospital page
 URL = "https://cookcountysheriffil.gov/departments/c-c-s-p-d/cemeteries/hospitals-cook-county/"
@@ -18,6 +20,7 @@ def extract_zip(zip_code):
     zip_match = re.match(r"^\d{5}", str(zip_code))
     return zip_match.group() if zip_match else "N/A"
 
+@pytest.mark.live
 def test_web_scraper_response():
     """
     Tests if the web scraper successfully fetches data from the hospital webpage.
@@ -63,3 +66,71 @@ def test_zip_codes_in_valid_range():
     
     for zip_code in zip_codes:
         assert zip_code in valid_zip_codes, f"Invalid ZIP code found: {zip_code}"
+
+SAMPLE_PAGE = b"""<html><body><table><tr>
+<td>Mercy Hospital
+2525 S Michigan Ave
+Chicago, Illinois 60616</td>
+<td>Advocate Christ Medical Center
+4440 W 95th St
+Oak Lawn, Illinois 60453</td>
+<td>Swedish Hospital
+5145 N California Ave
+Chicago, Illinois 60625-3688</td>
+</tr></table></body></html>"""
+
+def test_parse_hospital_cell():
+    """
+    Tests that only Chicago hospitals are extracted from a cell
+    """
+    assert parse_hospital_cell("Mercy Hospital\n2525 S Michigan Ave\nChicago, Illinois 60616") == ("Mercy Hospital", "60616")
+    assert parse_hospital_cell("Some Hospital\n1 Main St\nOak Lawn, Illinois 60453") is None
+
+@pytest.mark.parametrize("chunk_size", [7, 64, len(SAMPLE_PAGE)])
+def test_streaming_parser(chunk_size):
+    """
+    Tests that records are the same however the page is split into chunks
+    """
+    chunks = [SAMPLE_PAGE[i:i + chunk_size] for i in range(0, len(SAMPLE_PAGE), chunk_size)]
+    records = list(iter_hospital_records(chunks))
+    assert records == [("Mercy Hospital", "60616"), ("Swedish Hospital", "60625-3688")]
+
+def test_scrape_hospitals(tmp_path):
+    """
+    Tests the scraper end to end against a fake page
+    """
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, content=SAMPLE_PAGE))
+    output_file = tmp_path / "hospitals" / "hospitals.csv"
+    df = scrape_hospitals(output_file=str(output_file), transport=transport)
+
+    assert list(df.columns) == ["Hospital Name", "ZIP Code"]
+    assert len(pd.read_csv(output_file)) == 2
+
+
+def test_records_parsed_while_page_streams(tmp_path):
+    """
+    Tests that the retry and cache layers pass the page through as it arrives:
+    the first hospital is parsed before the last chunk is sent, and the page is still cached
+    """
+    from zip_link.cleaning_analysis.http_session import RetryTransport, SessionMetrics
+    from zip_link.cleaning_analysis.response_cache import CachingTransport, ResponseCache
+    chunks = [SAMPLE_PAGE[i:i + 64] for i in range(0, len(SAMPLE_PAGE), 64)]
+    sent = []
+
+    class SlowPage(httpx.SyncByteStream):
+        def __iter__(self):
+            for chunk in chunks:
+                sent.append(chunk)
+                yield chunk
+
+    upstream = httpx.MockTransport(lambda request: httpx.Response(200, headers={"ETag": '"v1"'}, stream=SlowPage()))
+    cache = ResponseCache(root=str(tmp_path))
+    transport = CachingTransport(cache, RetryTransport(upstream, metrics=SessionMetrics()))
+    with httpx.Client(transport=transport) as client, client.stream("GET", URL) as response:
+        records = iter_hospital_records(response.iter_bytes())
+        assert next(records) == ("Mercy Hospital", "60616")
+        assert len(sent) < len(chunks)
+        assert list(records) == [("Swedish Hospital", "60625-3688")]
+
+    entry = cache.get(cache.request_key("GET", URL))
+    assert cache.read_body(entry) == SAMPLE_PAGE
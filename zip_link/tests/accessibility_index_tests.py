@@ -0,0 +1,131 @@
+import numpy as np
+import pandas as pd
+import pytest
+from zip_link.cleaning_analysis.storage import MemorySink
+from zip_link.cleaning_analysis.accessibility_index import (calculate_accessibility_index, accessibility_scores,
+                                                            score_weight_sets, weight_sensitivity, rank_columns,
+                                                            index_definitions, zip_areas, INDEX_DEFINITIONS,
+                                                            SERVICE_COLUMNS)
+
+
+@pytest.fixture
+def merged():
+    """Merged dataset without the columns the index adds."""
+    df = pd.read_csv("data/preprocessed/zipatlas_bulk_merge.csv", dtype={"Zip Code": str})
+    return df.drop(columns=[c for c in df.columns if c.startswith("normalized_") or "Accessibility" in c
+                            or c == "total_normalized_services"])
+
+
+def test_same_index_as_before(merged):
+    """Test that the engine reproduces the committed index (min-max normalization, equal weights)."""
+    expected = pd.read_csv("data/preprocessed/zipatlas_bulk_merge.csv", dtype={"Zip Code": str})
+    result = calculate_accessibility_index(merged)
+    np.testing.assert_allclose(result["Accessibility Index"], expected["Accessibility Index"], rtol=1e-12)
+    assert result["Normalized Accessibility Index"].tolist() == expected["Normalized Accessibility Index"].tolist()
+
+
+def test_batch_equals_single_calls(merged):
+    """Test that scoring several weight sets at once gives each set's own result."""
+    weight_sets = {"equal": [1, 1, 1, 1, 1], "health": {"total_healthcare_services": 1}, "mixed": [0.4, 0.1, 0.3, 0.1, 0.1]}
+    batch = score_weight_sets(merged, weight_sets)
+    assert list(batch.columns) == ["Zip Code", "equal", "health", "mixed"]
+    for name, weights in [("equal", [1, 1, 1, 1, 1]), ("health", [1, 0, 0, 0, 0]), ("mixed", [0.4, 0.1, 0.3, 0.1, 0.1])]:
+        _, _, single = accessibility_scores(merged[SERVICE_COLUMNS], merged["Population"], weights)
+        np.testing.assert_array_equal(batch[name], single)
+
+
+@pytest.mark.parametrize("normalization", ["minmax", "zscore", "percentile", "max"])
+def test_normalizations(merged, normalization):
+    normalized, index, normalized_index = accessibility_scores(merged[SERVICE_COLUMNS], merged["Population"],
+                                                               normalization=normalization)
+    assert normalized.shape == (len(merged), len(SERVICE_COLUMNS))
+    assert normalized_index.min() == 0 and normalized_index.max() == 1
+
+
+def test_in_memory_arrays():
+    """Test the engine on plain arrays and a custom normalization."""
+    values = np.array([[0.0, 2.0], [1.0, 4.0], [2.0, 6.0]])
+    normalized, index, _ = accessibility_scores(values, [10, 10, 20], weights=[1, 2], normalization=lambda v: v / 2)
+    np.testing.assert_allclose(index, [0.2, 0.45, 0.35])
+    with pytest.raises(ValueError):
+        accessibility_scores(values, [1, 1, 1], normalization="log")
+
+
+def test_weight_sensitivity_matches_sample_loop(merged):
+    """Test the running counts against ranking every sampled weight vector on its own and comparing every pair."""
+    summary = weight_sensitivity(merged, samples=300, batch_size=64, seed=3)
+    weights = np.random.default_rng(3).dirichlet(np.ones(len(SERVICE_COLUMNS)), size=300)
+    ranks = np.column_stack([rank_columns(accessibility_scores(merged[SERVICE_COLUMNS], merged["Population"], w)[1][:, None])[:, 0]
+                             for w in weights])
+    base = summary["baseline_rank"].to_numpy()
+    assert (summary["rank_min"] == ranks.min(axis=1)).all() and (summary["rank_max"] == ranks.max(axis=1)).all()
+    for q, column in [(5, "rank_p05"), (50, "rank_median"), (95, "rank_p95")]:
+        np.testing.assert_array_equal(summary[column], np.percentile(ranks, q, axis=1, method="inverted_cdf"))
+    np.testing.assert_allclose(summary["rank_change_probability"], (ranks != base[:, None]).mean(axis=1))
+    flipped = (ranks[:, None, :] < ranks[None, :, :]) != (base[:, None] < base[None, :])[:, :, None]
+    np.testing.assert_allclose(summary["flip_probability"], flipped.mean(axis=2).sum(axis=1) / (len(merged) - 1))
+
+
+def test_weight_sensitivity_batch_size(merged):
+    """Test that the counts do not depend on how the samples are split into batches."""
+    whole = weight_sensitivity(merged, samples=200, batch_size=200, seed=5)
+    pd.testing.assert_frame_equal(whole, weight_sensitivity(merged, samples=200, batch_size=7, seed=5))
+
+
+def test_weight_sensitivity_concentration(merged):
+    """Test that weights concentrated around equal weights keep the equal weights ranking."""
+    summary = weight_sensitivity(merged, samples=2000, concentration=1e6)
+    assert (summary["rank_median"] == summary["baseline_rank"]).all()
+    assert summary["flip_probability"].max() < 0.05
+
+
+def test_zip_areas_agree():
+    """Test that the boundaries and the transit file give about the same area for the same ZIPs."""
+    boundaries = zip_areas("visualization/Boundaries_-_ZIP_Codes_20250222.csv").set_index("Zip Code")["area_sq_miles"]
+    transit = zip_areas().set_index("Zip Code")["area_sq_miles"]
+    both = boundaries.index.intersection(transit.index)
+    assert len(both) > 50
+    assert (boundaries[both] - transit[both]).abs().median() < 0.2
+
+
+def test_index_definitions(merged):
+    """Test that every definition is a column and per capita is the Accessibility Index."""
+    expected = pd.read_csv("data/preprocessed/zipatlas_bulk_merge.csv", dtype={"Zip Code": str})
+    areas = zip_areas("visualization/Boundaries_-_ZIP_Codes_20250222.csv")
+    result = index_definitions(merged, areas)
+    assert list(result.columns) == ["Zip Code"] + [f"{name}_index" for name in INDEX_DEFINITIONS]
+    assert result.notna().all().all()
+    np.testing.assert_allclose(result["per_capita_index"], expected["Accessibility Index"], rtol=1e-12)
+    np.testing.assert_allclose(result["zscore_index"].mean(), 0, atol=1e-12)
+    assert result["percentile_index"].min() == 0 and result["percentile_index"].max() == 1
+    # Rank preserving definitions order the ZIPs like the Accessibility Index
+    order = result["per_capita_index"].rank()
+    assert (result["log_index"].rank() == order).all() and (result["percentile_index"].rank() == order).all()
+
+
+def pandas_index(df):
+    """The index as computed before the engine, with pandas skipping missing values."""
+    normalized = (df[SERVICE_COLUMNS] - df[SERVICE_COLUMNS].min()) / (df[SERVICE_COLUMNS].max() - df[SERVICE_COLUMNS].min())
+    index = normalized.sum(axis=1) / df["Population"]
+    return index, ((index - index.min()) / round(index.max() - index.min(), 6)).round(2)
+
+
+def test_missing_count_only_affects_its_zip(merged):
+    """Test that a missing service count is skipped like pandas did instead of making every ZIP NaN."""
+    merged.loc[3, "park_count"] = np.nan
+    expected_index, expected_normalized = pandas_index(merged)
+    result = calculate_accessibility_index(merged)
+    assert result["Normalized Accessibility Index"].notna().all()
+    np.testing.assert_allclose(result["Accessibility Index"], expected_index, rtol=1e-12)
+    np.testing.assert_array_equal(result["Normalized Accessibility Index"], expected_normalized)
+    for normalization in ["zscore", "percentile", "max"]:
+        normalized, index, _ = accessibility_scores(merged[SERVICE_COLUMNS], merged["Population"], normalization=normalization)
+        assert np.isnan(normalized).sum() == 1 and np.isfinite(index).all()
+
+
+def test_total_normalized_services_is_weighted(merged):
+    """Test that total_normalized_services is the weighted sum, so it is the index times the population."""
+    sink = MemorySink()
+    calculate_accessibility_index(merged, sink=sink, weights=[2, 0, 1, 0.5, 1])
+    df = sink.read("zipatlas_bulk_merge")
+    np.testing.assert_allclose(df["total_normalized_services"] / df["Population"], df["Accessibility Index"])
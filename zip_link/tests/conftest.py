@@ -0,0 +1,27 @@
+import os
+import pytest
+from zip_link.cleaning_analysis.http_replay import HTTP_MODE_ENV, get_http_mode
+
+# Replay the recorded responses in tests/fixtures/http unless a mode is set 
+# explicitly, so the suite runs in seconds without network
+os.environ.setdefault(HTTP_MODE_ENV, "replay")
+
+
+@pytest.fixture
+def tmp_zipatlas_urls(tmp_path):
+    """Chicago's ZipAtlas pages, saved under tmp_path so scraping never overwrites the tracked raw files."""
+    from zip_link.cleaning_analysis.zipatlas_data import ZIPATLAS_URLS
+    return [(url, str(tmp_path / os.path.basename(output_csv))) for url, output_csv in ZIPATLAS_URLS]
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", f"live: checks the real upstream site, only runs with {HTTP_MODE_ENV}=live or record")
+
+
+def pytest_collection_modifyitems(config, items):
+    if get_http_mode() in ("live", "record"):
+        return
+    skip_live = pytest.mark.skip(reason=f"needs network, run with {HTTP_MODE_ENV}=live")
+    for item in items:
+        if "live" in item.keywords:
+            item.add_marker(skip_live)
@@ -0,0 +1,61 @@
+import random
+import jellyfish
+import numpy as np
+import pandas as pd
+import pytest
+from zip_link.cleaning_analysis.entity_resolution import jaro_winkler_batch, find_clusters, resolve_entities
+from zip_link.cleaning_analysis.unified_community_health import process_health_data, get_hrsa_data, fuzzy_match, HRSA_DATA
+
+
+@pytest.fixture
+def combined():
+    return pd.concat([process_health_data("data/raw/community_health_ctr/healthcentre_pdf.csv"),
+                      get_hrsa_data(HRSA_DATA)], ignore_index=True)
+
+
+@pytest.fixture
+def chain():
+    """A~B and B~C match, A and C do not."""
+    return pd.DataFrame({
+        "Health Center Facility": ["Lawndale Christian Health", "Lawndale Christian Health Center", "LCHC Ogden Campus"],
+        "Address": ["3860 W Ogden Ave", "3750 W Ogden Ave", "3750 W Ogden Ave"],
+        "Telephone Number": ["872-588-3000", "872-588-3000", "872-588-3000"],
+        "Zip Code": ["60623", "60623", "60623"],
+    })
+
+
+def test_batch_matches_jellyfish(combined):
+    """Test that the batched scores are jellyfish's values for every pair, on real names and random strings."""
+    rng = random.Random(0)
+    left = list(combined["Health Center Facility"]) + ["".join(rng.choice("abc ") for _ in range(rng.randint(0, 9))) for _ in range(2000)]
+    right = list(combined["Health Center Facility"].sample(frac=1, random_state=0)) + \
+        ["".join(rng.choice("abc ") for _ in range(rng.randint(0, 9))) for _ in range(2000)]
+    expected = [jellyfish.jaro_winkler_similarity(a, b) for a, b in zip(left, right)]
+    np.testing.assert_allclose(jaro_winkler_batch(left, right), expected, rtol=0, atol=1e-12)
+    assert len(jaro_winkler_batch([], [])) == 0
+
+
+def test_find_clusters():
+    assert find_clusters(5, [(3, 4), (1, 3), (0, 2)]).tolist() == [0, 1, 0, 1, 1]
+
+
+def test_chain_is_one_cluster_in_any_order(chain):
+    """Test that a chain resolves to the same single cluster and canonical record whatever the row order."""
+    results = [resolve_entities(chain.iloc[list(order)])[1] for order in [(0, 1, 2), (2, 0, 1), (1, 2, 0)]]
+    assert len(results[0]) == 1 and results[0]["cluster_size"].iloc[0] == 3
+    for result in results[1:]:
+        pd.testing.assert_frame_equal(result, results[0])
+
+
+def test_cluster_mode_is_order_independent(combined):
+    """Test that shuffling the real data gives the same canonical records and cluster ids."""
+    canonical = fuzzy_match(combined, mode="cluster")
+    shuffled = fuzzy_match(combined.sample(frac=1, random_state=1), mode="cluster")
+    pd.testing.assert_frame_equal(canonical, shuffled)
+    assert canonical["cluster_size"].sum() == len(combined)
+    assert len(canonical) <= len(fuzzy_match(combined))  # Chains can only merge more than greedy skipping
+
+
+def test_records_get_their_cluster_id(chain):
+    records, canonical = resolve_entities(pd.concat([chain, chain.iloc[[0]].assign(**{"Telephone Number": None})]))
+    assert records["cluster_id"].nunique() == len(canonical) == 2
@@ -0,0 +1,78 @@
+import pandas as pd
+import pytest
+from zip_link.cleaning_analysis.entity_store import update_entity_store, SOURCES_TABLE
+from zip_link.cleaning_analysis.entity_resolution import resolve_entities
+from zip_link.cleaning_analysis.storage import DiskSink, MemorySink
+from zip_link.cleaning_analysis.unified_community_health import process_health_data, get_hrsa_data, join_health_df, HRSA_DATA
+
+
+@pytest.fixture
+def sources():
+    return {"pdf": process_health_data("data/raw/community_health_ctr/healthcentre_pdf.csv"), "hrsa": get_hrsa_data(HRSA_DATA)}
+
+
+def groups(sink):
+    """Sets of source rows (by hash) sharing an entity."""
+    stored = sink.read(SOURCES_TABLE)
+    return set(stored.groupby("entity_id")["row_hash"].apply(frozenset))
+
+
+def expected_groups(sink, sources):
+    """Same grouping from resolving everything from scratch."""
+    combined = pd.concat(sources.values(), ignore_index=True)
+    records, _ = resolve_entities(combined)
+    hashes = sink.read(SOURCES_TABLE).set_index(["source", "Health Center Facility", "Address", "Zip Code"])["row_hash"]
+    keys = pd.MultiIndex.from_arrays([[name for name, df in sources.items() for _ in range(len(df))],
+                                      combined["Health Center Facility"], combined["Address"], combined["Zip Code"]])
+    return set(pd.Series(hashes.loc[keys].to_numpy()).groupby(records["cluster_id"]).apply(frozenset))
+
+
+def test_first_run_matches_full_resolution(tmp_path, sources):
+    sink = DiskSink(str(tmp_path))
+    entities = update_entity_store(sink, sources)
+    assert len(entities) == len(resolve_entities(pd.concat(sources.values(), ignore_index=True))[1])
+    assert groups(sink) == expected_groups(sink, sources)
+
+
+def test_unchanged_refresh_does_no_work(tmp_path, sources, capsys):
+    sink = DiskSink(str(tmp_path))
+    entities = update_entity_store(sink, sources)
+    capsys.readouterr()
+    assert update_entity_store(sink, sources)["entity_id"].tolist() == entities["entity_id"].tolist()
+    assert "[hrsa] 0 new or changed rows, 0 removed" in capsys.readouterr().out
+
+
+def test_delta_refresh(tmp_path, sources, capsys):
+    """Test that a changed and a dropped HRSA row are the only work done, and the result equals a full re-run."""
+    sink = DiskSink(str(tmp_path))
+    first = update_entity_store(sink, sources)
+    hrsa = sources["hrsa"].copy()
+    hrsa.iloc[3, 0] = hrsa.iloc[3, 0] + " Annex"
+    refreshed = {"pdf": sources["pdf"], "hrsa": hrsa.drop(hrsa.index[5])}
+    capsys.readouterr()
+
+    entities = update_entity_store(sink, refreshed)
+    assert "[hrsa] 1 new or changed rows, 2 removed" in capsys.readouterr().out
+    assert groups(sink) == expected_groups(sink, refreshed)
+    assert set(entities["entity_id"]) - set(first["entity_id"]) <= {first["entity_id"].max() + 1}  # Stored ids are kept
+
+
+def test_removed_link_splits_entity():
+    """Test that removing the row linking two others re-clusters what is left."""
+    rows = pd.DataFrame({
+        "Health Center Facility": ["Alpha Clinic", "Alpha Clinic North", "Northside Center"],
+        "Address": ["1 Main St", "900 Lake St", "900 Lake St"],
+        "Telephone Number": ["312-555-0000"] * 3,
+        "Zip Code": ["60601"] * 3,
+    })
+    sink = MemorySink()
+    assert len(update_entity_store(sink, {"hrsa": rows})) == 1
+    assert len(update_entity_store(sink, {"hrsa": rows.drop(1)})) == 2
+
+
+def test_join_health_df_store_mode():
+    sink = MemorySink()
+    counts = join_health_df(convert_pdf=False, sink=sink, mode="store")
+    assert counts["cnt_comm_health_ctr"].sum() == len(sink.read("health_center_entities"))
+    with pytest.raises(ValueError):
+        join_health_df(convert_pdf=False, mode="store")
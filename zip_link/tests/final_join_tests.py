@@ -6,11 +6,11 @@ from zip_link.cleaning_analysis.unified_community_health import join_health_df
 from functools import reduce
 
 @pytest.fixture
-def test_data():
+def test_data(tmp_zipatlas_urls):
     """Fixture to set up initial data for testing."""
     # Mock or create the DataFrames that are used in the function
-    zipatlas_df = create_zipatlas_data()
-    comm_health_df = join_health_df()
+    zipatlas_df = create_zipatlas_data(urls=tmp_zipatlas_urls)
+    comm_health_df = join_health_df(convert_pdf=False)  # Reuse the committed PDF extract instead of starting tabula
     parks_count = clean_parks_data("data/raw/parks/CPD_Parks_2025.csv")
     grocery_store_count = clean_grocery_data("data/raw/grocery_stores/grocery_stores_data.csv")
     public_transit_count = clean_publictransit_data("data/raw/public_transit/publictransit_2024.csv")
@@ -1,7 +1,8 @@
 import pytest
 import pandas as pd
 import re
-from zip_link.cleaning_analysis.unified_community_health import process_health_data, get_hrsa_data, fuzzy_match  
+from zip_link.cleaning_analysis.unified_community_health import process_health_data, get_hrsa_data, fuzzy_match, HRSA_DATA
+from zip_link.cleaning_analysis.entity_resolution import phone_key, zip_name_key, candidate_pairs
 
 @pytest.fixture
 def health_data():
@@ -88,4 +89,30 @@ def test_fuzzy_match():
     })
     result = fuzzy_match(df, threshold=0.9)
     assert len(result) == 1  # Should merge duplicates
- 
\ No newline at end of file
+ 
+
+
+def all_pairs(record):
+    """Puts every record in one block, i.e. the comparison of every pair fuzzy_match used to do."""
+    return 0
+
+
+def test_blocking_matches_all_pairs():
+    """Tests that blocking on the phone gives exactly the records comparing every pair gives, on the real data."""
+    combined = pd.concat([process_health_data("data/raw/community_health_ctr/healthcentre_pdf.csv"),
+                          get_hrsa_data(HRSA_DATA)], ignore_index=True)
+    pd.testing.assert_frame_equal(fuzzy_match(combined), fuzzy_match(combined, keys=[all_pairs]))
+    pd.testing.assert_frame_equal(fuzzy_match(combined, keys=[phone_key, zip_name_key]), fuzzy_match(combined))
+
+
+def test_missing_phones_are_not_blocked():
+    """Tests that records without a number are never compared, as NaN never equals NaN."""
+    df = pd.DataFrame({
+        "Health Center Facility": ["ABC Health", "ABC Health", "ABC Health"],
+        "Address": ["100 Main St", "100 Main St", "100 Main St"],
+        "Telephone Number": [float("nan"), float("nan"), "312 555 1111"],
+    })
+    records = df.to_dict(orient="records")
+    assert candidate_pairs(records, [phone_key]) == {}
+    assert len(fuzzy_match(df)) == 3
+
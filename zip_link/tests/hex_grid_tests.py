@@ -0,0 +1,78 @@
+import numpy as np
+import geopandas as gpd
+import shapely
+from shapely.geometry import box
+from zip_link.cleaning_analysis.bulk_data_processing import clean_population_data
+from zip_link.cleaning_analysis.metros import METROS
+from zip_link.cleaning_analysis.hex_grid import hex_cells, build_hex_surface, hex_access_data, hex_index
+
+
+def square_zones():
+    """Two adjacent ZIPs of about 4 x 4 km near Chicago, in WGS84."""
+    zones = gpd.GeoDataFrame({"Zip Code": ["60601", "60602"], "Population": [1000.0, 3000.0]},
+                             geometry=[box(0, 0, 4000, 4000), box(4000, 0, 8000, 4000)], crs="EPSG:32616")
+    zones = zones.set_geometry(zones.translate(440000, 4630000)).set_crs("EPSG:32616", allow_override=True)
+    return zones.to_crs("EPSG:4326")
+
+
+def test_hex_cells_tile_the_box():
+    """Test that the cells are regular hexagons that cover the box without overlapping."""
+    cells = hex_cells((0, 0, 5000, 3000), size=300)
+    area = 3 * np.sqrt(3) / 2 * 300 ** 2
+    np.testing.assert_allclose(shapely.area(cells), area)
+    assert box(0, 0, 5000, 3000).difference(shapely.union_all(cells)).area < 1e-3
+    assert np.isclose(shapely.union_all(cells).area, area * len(cells))
+
+
+def test_matrix_matches_dense():
+    """Test the sparse roll up against the dense matrix, for a vector, a batch and the transpose."""
+    surface = build_hex_surface(square_zones(), size=400)
+    dense = surface.matrix.toarray()
+    values = np.random.default_rng(0).random((len(surface.cells), 3))
+    np.testing.assert_allclose(surface.matrix @ values[:, 0], dense @ values[:, 0])
+    np.testing.assert_allclose(surface.matrix @ values, dense @ values)
+    np.testing.assert_allclose(surface.population, dense.T @ np.array([1000.0, 3000.0]))
+
+
+def test_population_is_apportioned_by_area():
+    """Test that every ZIP's shares add up to 1 and the cells hold all of the population."""
+    surface = build_hex_surface(square_zones(), size=400)
+    np.testing.assert_allclose(np.asarray(surface.matrix.sum(axis=1)).ravel(), 1, rtol=1e-6)
+    assert np.isclose(surface.population.sum(), 4000, rtol=1e-6)
+    # The eastern ZIP is three times as dense
+    x = shapely.get_x(shapely.centroid(surface.cells))
+    west, east = x < x.mean() - 1000, x > x.mean() + 1000
+    assert surface.population[east].max() > 2.5 * surface.population[west].max()
+
+
+def test_assign_points_to_cells():
+    """Test the vectorized point-in-polygon against checking every cell."""
+    surface = build_hex_surface(square_zones(), size=400)
+    x0, y0, x1, y1 = shapely.total_bounds(surface.cells)
+    rng = np.random.default_rng(1)
+    points = shapely.points(np.column_stack([rng.uniform(x0 - 500, x1 + 500, 300), rng.uniform(y0 - 500, y1 + 500, 300)]))
+    cell_of = surface.assign(points)
+    for point, cell in zip(points, cell_of):
+        inside = np.nonzero(shapely.intersects(surface.cells, point))[0]
+        assert cell in inside if len(inside) else cell == -1
+
+
+def test_constant_cells_roll_up_to_constant():
+    """Test that the roll up is a weighted mean: equal cells give the same value to every ZIP."""
+    surface = build_hex_surface(square_zones(), size=400)
+    np.testing.assert_allclose(surface.matrix @ np.full(len(surface.cells), 2.5), 2.5)
+
+
+def test_chicago_hex_access():
+    population = clean_population_data("data/raw/population/Population_Data.csv")
+    cells, surface = hex_access_data(population, METROS["chicago"].zip_boundaries)
+    assert np.isclose(cells["Population"].sum(), population["Population"].sum())
+    assert cells["grocery_count"].sum() > 0 and cells["park_count"].sum() > 0
+    assert (cells[["grocery_access", "park_access"]] >= 0).all().all()
+
+    # A batch of weights is rolled up in the same product as a single weight vector
+    weights = np.array([[1, 1], [1, 0], [0, 1]])
+    cell_index, zip_index = hex_index(cells, surface, weights)
+    assert cell_index.shape == (len(cells), 3) and len(zip_index) == 59
+    _, single = hex_index(cells, surface, weights[1])
+    np.testing.assert_allclose(single["hex_index"], zip_index["hex_index_1"])
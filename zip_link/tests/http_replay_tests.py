@@ -0,0 +1,69 @@
+import pytest
+import asyncio
+import httpx
+from zip_link.cleaning_analysis.http_replay import (RecordingTransport, ReplayTransport, ReplayServer,
+                                                     ServerRedirectTransport, AsyncServerRedirectTransport,
+                                                     FixtureNotFound)
+from zip_link.cleaning_analysis.http_session import build_transport, RetryTransport
+from zip_link.cleaning_analysis.zipatlas_data import scrape_zipatlas, ZIPATLAS_URLS
+
+PAGE = "<html><body><p>Recorded page</p></body></html>"
+
+
+@pytest.fixture
+def recorded(tmp_path):
+    """Records one GET and one POST into a temporary fixture directory."""
+    upstream = httpx.MockTransport(lambda request: httpx.Response(200, headers={"content-type": "text/html"},
+                                                                  text=PAGE + request.content.decode()))
+    with httpx.Client(transport=RecordingTransport(upstream, str(tmp_path))) as client:
+        client.get("https://zipatlas.test/page.htm")
+        client.post("https://cps.test/api", json={"pageNumber": 2})
+    return str(tmp_path)
+
+
+def test_replay_matches_recording(recorded):
+    """Tests that replayed responses match what was recorded, request body included."""
+    with httpx.Client(transport=ReplayTransport(recorded)) as client:
+        assert client.get("https://zipatlas.test/page.htm").text == PAGE
+        assert client.post("https://cps.test/api", json={"pageNumber": 2}).text.endswith('{"pageNumber":2}')
+
+
+def test_replay_missing_fixture(recorded):
+    """Tests that an unrecorded request fails loudly instead of going to the network."""
+    with httpx.Client(transport=ReplayTransport(recorded)) as client:
+        with pytest.raises(FixtureNotFound):
+            client.post("https://cps.test/api", json={"pageNumber": 3})
+
+
+def test_stand_in_server(recorded):
+    """Tests that the local server replays fixtures for sync and async clients."""
+    with ReplayServer(recorded) as server:
+        with httpx.Client(transport=ServerRedirectTransport(server.url)) as client:
+            assert client.get("https://zipatlas.test/page.htm").text == PAGE
+            assert client.get("https://zipatlas.test/other.htm").status_code == 404
+
+        async def fetch():
+            async with httpx.AsyncClient(transport=AsyncServerRedirectTransport(server.url)) as client:
+                return await client.get("https://zipatlas.test/page.htm")
+
+        assert asyncio.run(fetch()).text == PAGE
+
+
+def test_scraper_replays_committed_fixtures(tmp_path, monkeypatch):
+    """Tests that the ZipAtlas scraper runs offline from the committed fixtures."""
+    monkeypatch.setenv("ZIP_LINK_HTTP_MODE", "replay")
+    assert isinstance(build_transport().transport, ReplayTransport)
+
+    url, _ = ZIPATLAS_URLS[0]
+    output_csv = str(tmp_path / "median_property_prices.csv")
+    scrape_zipatlas(url, output_csv)
+    assert open(output_csv).readline().strip() == "Zip Code,median_property_prices"
+
+
+def test_fixtures_found_from_any_directory(tmp_path, monkeypatch):
+    """Tests that the committed fixtures do not depend on the working directory."""
+    monkeypatch.setenv("ZIP_LINK_HTTP_MODE", "replay")
+    monkeypatch.delenv("ZIP_LINK_HTTP_FIXTURES", raising=False)
+    monkeypatch.chdir(tmp_path)
+    url, _ = ZIPATLAS_URLS[0]
+    assert scrape_zipatlas(url, str(tmp_path / "median_property_prices.csv")) is not None
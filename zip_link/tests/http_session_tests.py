@@ -0,0 +1,110 @@
+import pytest
+import asyncio
+import threading
+import time
+import httpx
+from zip_link.cleaning_analysis.http_session import RetryTransport, AsyncRetryTransport, SessionMetrics, backoff_delay
+
+
+def flaky(failures, status=503):
+    """Fake upstream that fails `failures` times before answering 200."""
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if len(calls) <= failures:
+            return httpx.Response(status)
+        return httpx.Response(200, text="ok")
+
+    return handler, calls
+
+
+def test_retries_transient_errors():
+    """Tests that a transient 503 is retried until the page comes through."""
+    handler, calls = flaky(failures=2)
+    metrics = SessionMetrics()
+    transport = RetryTransport(httpx.MockTransport(handler), backoff=0.001, metrics=metrics)
+    with httpx.Client(transport=transport) as client:
+        response = client.get("https://cps.test/api")
+
+    assert response.status_code == 200
+    assert len(calls) == 3
+    summary = metrics.summary()
+    assert (summary["requests"], summary["retries"], summary["failures"]) == (3, 2, 0)
+    assert summary["bytes"] == 2
+
+
+def test_gives_up_after_max_retries():
+    """Tests that the last error response is returned and counted as a failure."""
+    handler, calls = flaky(failures=10)
+    metrics = SessionMetrics()
+    transport = RetryTransport(httpx.MockTransport(handler), max_retries=2, backoff=0.001, metrics=metrics)
+    with httpx.Client(transport=transport) as client:
+        response = client.get("https://cps.test/api")
+
+    assert response.status_code == 503
+    assert len(calls) == 3
+    assert metrics.summary()["failures"] == 1
+
+
+def test_does_not_retry_client_errors():
+    """Tests that a 404 is returned straight away."""
+    handler, calls = flaky(failures=10, status=404)
+    with httpx.Client(transport=RetryTransport(httpx.MockTransport(handler), metrics=SessionMetrics())) as client:
+        assert client.get("https://cps.test/api").status_code == 404
+    assert len(calls) == 1
+
+
+def test_retries_connection_errors():
+    """Tests that connection errors are retried and re-raised when they persist."""
+    def handler(request):
+        raise httpx.ConnectError("connection refused", request=request)
+
+    transport = RetryTransport(httpx.MockTransport(handler), max_retries=1, backoff=0.001, metrics=SessionMetrics())
+    with httpx.Client(transport=transport) as client:
+        with pytest.raises(httpx.ConnectError):
+            client.get("https://cps.test/api")
+
+
+def test_per_host_cap():
+    """Tests that no more than max_per_host requests run against one host at once."""
+    in_flight, peak = [0], [0]
+    lock = threading.Lock()
+
+    def handler(request):
+        with lock:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+        time.sleep(0.02)
+        with lock:
+            in_flight[0] -= 1
+        return httpx.Response(200)
+
+    transport = RetryTransport(httpx.MockTransport(handler), max_per_host=2, metrics=SessionMetrics())
+    with httpx.Client(transport=transport) as client:
+        threads = [threading.Thread(target=client.get, args=("https://zipatlas.test/",)) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    assert peak[0] == 2
+
+
+def test_async_retries():
+    """Tests that the async transport retries the same way."""
+    handler, calls = flaky(failures=1, status=429)
+
+    async def fetch():
+        transport = AsyncRetryTransport(httpx.MockTransport(handler), backoff=0.001, metrics=SessionMetrics())
+        async with httpx.AsyncClient(transport=transport) as client:
+            return await client.get("https://zipatlas.test/")
+
+    assert asyncio.run(fetch()).status_code == 200
+    assert len(calls) == 2
+
+
+def test_backoff_delay():
+    """Tests jittered exponential backoff and Retry-After."""
+    assert all(0 <= backoff_delay(3, backoff=1, max_backoff=5) <= 5 for _ in range(50))
+    assert backoff_delay(0, httpx.Response(503, headers={"Retry-After": "2"})) == 2
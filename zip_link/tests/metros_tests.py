@@ -0,0 +1,79 @@
+import os
+from dataclasses import replace
+import pandas as pd
+import pytest
+from zip_link.cleaning_analysis.metros import METROS, Metro, RAW_DIR, RAW_FILES, metro_dir
+from zip_link.cleaning_analysis.zipatlas_data import ZIPATLAS_URLS, zipatlas_urls, zip_bulk_data, merge_zip_bulk_data
+from zip_link.cleaning_analysis.storage import DiskSink, PACKAGE_DIR
+
+
+@pytest.fixture
+def metros(tmp_path):
+    """
+    Chicago without its PDF (tabula is not started) plus a second metro with its
+    own raw folder: Chicago's city files, Evanston's HRSA rows and ZIP prefix.
+    """
+    raw_dir = tmp_path / "raw" / "IL" / "evanston"
+    for name in ["parks", "grocery_stores", "hospitals", "schools", "population"]:
+        os.makedirs(raw_dir / os.path.dirname(RAW_FILES[name]), exist_ok=True)
+        os.symlink(os.path.abspath(os.path.join(RAW_DIR, RAW_FILES[name])), raw_dir / RAW_FILES[name])
+    os.symlink(os.path.abspath(os.path.join(RAW_DIR, "zipatlas_data")), raw_dir / "zipatlas_data")
+    evanston = Metro("evanston", "IL", "Evanston", "602", "us/il/evanston", raw_dir=str(raw_dir))
+    return [replace(METROS["chicago"], health_pdf=False), evanston]
+
+
+def test_chicago_paths_unchanged():
+    """Test that the Chicago config points at the files the pipeline always used, from any working directory."""
+    chicago = METROS["chicago"]
+    assert ZIPATLAS_URLS[0] == ("https://zipatlas.com/us/il/chicago/zip-code-comparison/lowest-property-prices.htm",
+                                os.path.join(PACKAGE_DIR, "data/raw/zipatlas_data/median_property_prices.csv"))
+    assert chicago.raw_path("parks") == os.path.join(PACKAGE_DIR, "data/raw/parks/CPD_Parks_2025.csv")
+    assert metro_dir(chicago, "out") == os.path.join("out", "state=IL", "metro=chicago")
+
+
+def test_national_files_are_shared(metros):
+    _, evanston = metros
+    assert evanston.raw_path("public_transit") == METROS["chicago"].raw_path("public_transit")
+    assert evanston.raw_path("parks").startswith(evanston.raw_dir)
+    assert zipatlas_urls(evanston)[0][0].startswith("https://zipatlas.com/us/il/evanston/")
+
+
+def test_metros_run_in_parallel_into_own_partitions(tmp_path, metros):
+    """Test that two metros run in worker processes, each into its own partition with its own filters."""
+    sinks = zip_bulk_data(scrape=False, workers=2, metros=metros, root=str(tmp_path / "out"))
+    chicago, evanston = sinks["chicago"], sinks["evanston"]
+
+    assert chicago.root == metro_dir(metros[0], str(tmp_path / "out"))
+    assert "Normalized Accessibility Index" in evanston.read("zipatlas_bulk_merge").columns
+    assert evanston.read("public_transit_data")["Zip Code"].str.startswith("602").all()
+    assert chicago.read("public_transit_data")["Zip Code"].str.startswith("606").all()
+    assert len(evanston.read("unified_community_health_data")) == 2  # Evanston's HRSA rows only, no PDF
+
+
+def test_one_metro_recomputed_alone(tmp_path, metros):
+    """Test that re-running one metro leaves the other partition untouched."""
+    root = str(tmp_path / "out")
+    zip_bulk_data(scrape=False, workers=2, metros=metros, root=root)
+    chicago_dir = metro_dir(metros[0], root)
+    before = {f: os.path.getmtime(os.path.join(chicago_dir, f)) for f in os.listdir(chicago_dir)}
+
+    sink = zip_bulk_data(scrape=False, incremental=False, metros=[metros[1]], root=root)
+    assert isinstance(sink, DiskSink)
+    assert {f: os.path.getmtime(os.path.join(chicago_dir, f)) for f in os.listdir(chicago_dir)} == before
+
+
+def test_custom_sink_needs_a_single_metro(metros):
+    with pytest.raises(ValueError):
+        zip_bulk_data(scrape=False, metros=metros, sink=DiskSink("unused"))
+
+
+def test_merge_checks_the_metro_zips(capsys):
+    """Test that the merge reports the ZIPs outside the metro being merged, not outside Chicago."""
+    columns = ["median_income", "cnt_comm_health_ctr", "park_count", "grocery_count", "transit_count", "hospital_count",
+               "school_count", "Population"]
+    dfs = [pd.DataFrame({"Zip Code": ["60201", "60202"], column: [1.0, 2.0]}) for column in columns]
+    dfs[2] = pd.DataFrame({"Zip Code": ["60201", "60601"], "park_count": [1.0, 2.0]})
+    merge_zip_bulk_data(*dfs, boundaries_path=None, zip_prefix="602")
+    out = capsys.readouterr().out
+    assert "park_count: 1 unknown Zip Codes ignored (60601)" in out
+    assert "median_income" not in out
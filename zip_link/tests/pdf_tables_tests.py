@@ -0,0 +1,71 @@
+import sys
+import types
+import pandas as pd
+import pytest
+from zip_link.cleaning_analysis import pdf_tables
+from zip_link.cleaning_analysis.pdf_tables import extract_pdf_tables, compact_row, positional_row, TABLE_COLUMNS
+from zip_link.cleaning_analysis.unified_community_health import convert_pdf_to_csv, process_health_data, HEALTH_PDF
+
+TABULA_CSV = "data/raw/community_health_ctr/healthcentre_pdf.csv"
+
+
+def test_compact_row():
+    assert compact_row(["X", "1 Main St", "312-555-1234", None, float("nan"), ""]) == ["X", "1 Main St", "312-555-1234"]
+    assert compact_row(["60601", None]) == ["60601", "", ""]
+
+
+def test_positional_row():
+    assert positional_row(["X", None, None, "1 Main St", None, float("nan"), "312-555-1234", ""]) == ["X", "1 Main St", "312-555-1234"]
+    assert positional_row(["60601", None]) == ["60601", "", ""]
+    # A blank Address keeps the phone in its own column
+    assert positional_row(["X", None, None, "", None, None, "312-555-1234", None, None]) == ["X", "", "312-555-1234"]
+    assert positional_row(["X", float("nan"), "312-555-1234"]) == ["X", "", "312-555-1234"]
+
+
+def test_tabula_rows_keep_every_center(monkeypatch):
+    """Test the tabula path on rows shaped like real tabula output (the committed extract, values packed left)."""
+    table = pd.read_csv(TABULA_CSV, header=None, dtype=str)
+    monkeypatch.setitem(sys.modules, "tabula", types.SimpleNamespace(read_pdf=lambda *args, **kwargs: [table]))
+    df = extract_pdf_tables(HEALTH_PDF, "tabula", cache_dir=None)
+    result = process_health_data(df)
+    expected = process_health_data(TABULA_CSV)
+    assert len(result) == len(expected) == 105
+    assert result["Zip Code"].tolist() == expected["Zip Code"].tolist()
+
+
+def test_pdfplumber_matches_tabula_extract(tmp_path):
+    """Test that the JVM-free path finds the same health centers as the committed tabula extract."""
+    convert_pdf_to_csv(HEALTH_PDF, str(tmp_path / "pdf.csv"), engine="pdfplumber")
+    result = process_health_data(str(tmp_path / "pdf.csv"))
+    expected = process_health_data(TABULA_CSV)
+    assert len(result) == len(expected)
+    assert sorted(result["Zip Code"]) == sorted(expected["Zip Code"])
+    assert list(pd.read_csv(tmp_path / "pdf.csv").columns) == TABLE_COLUMNS
+
+
+def test_parallel_pages_keep_order(tmp_path):
+    serial = extract_pdf_tables(HEALTH_PDF, "pdfplumber", workers=1, cache_dir=None)
+    parallel = extract_pdf_tables(HEALTH_PDF, "pdfplumber", workers=3, cache_dir=None)
+    pd.testing.assert_frame_equal(serial, parallel)
+
+
+def test_extraction_is_cached_by_contents(tmp_path, monkeypatch):
+    """Test that tabula runs once per PDF contents: a copy of the same PDF is served from the cache."""
+    calls = []
+    monkeypatch.setattr(pdf_tables, "tabula_rows", lambda path: calls.append(path) or [["A", "1 Main St 60601", "312-555-1234"]])
+    copy = tmp_path / "copy.pdf"
+    copy.write_bytes(open(HEALTH_PDF, "rb").read())
+
+    first = extract_pdf_tables(HEALTH_PDF, cache_dir=str(tmp_path / "cache"))
+    second = extract_pdf_tables(str(copy), cache_dir=str(tmp_path / "cache"))
+    assert calls == [HEALTH_PDF]
+    pd.testing.assert_frame_equal(first, second)
+
+    copy.write_bytes(open(HEALTH_PDF, "rb").read() + b"\n")  # Changed contents are extracted again
+    extract_pdf_tables(str(copy), cache_dir=str(tmp_path / "cache"))
+    assert len(calls) == 2
+
+
+def test_unknown_engine():
+    with pytest.raises(ValueError):
+        extract_pdf_tables(HEALTH_PDF, "camelot")
@@ -0,0 +1,120 @@
+import importlib
+import pytest
+import pandas as pd
+from zip_link.cleaning_analysis.pipeline import Stage, StageError, code_version, run_pipeline, topological_order
+
+
+def count_rows(path):
+    """Toy source stage: number of rows in a CSV."""
+    return len(pd.read_csv(path))
+
+
+def add(*counts):
+    return sum(counts)
+
+
+@pytest.fixture
+def toy_pipeline(tmp_path):
+    """Two independent sources feeding one merge stage."""
+    a, b = tmp_path / "a.csv", tmp_path / "b.csv"
+    pd.DataFrame({"x": [1, 2]}).to_csv(a, index=False)
+    pd.DataFrame({"x": [1, 2, 3]}).to_csv(b, index=False)
+    stages = [
+        Stage("a", count_rows, kwargs={"path": str(a)}, inputs=[str(a)]),
+        Stage("b", count_rows, kwargs={"path": str(b)}, inputs=[str(b)]),
+        Stage("total", add, deps=["a", "b"]),
+    ]
+    return stages, str(tmp_path / "cache"), a
+
+
+def test_no_change_rebuild_skips_everything(toy_pipeline):
+    """Test that a second run with unchanged inputs runs no stage."""
+    stages, cache_dir, _ = toy_pipeline
+    results, executed = run_pipeline(stages, cache_dir)
+    assert results["total"] == 5
+    assert executed == ["a", "b", "total"]
+
+    results, executed = run_pipeline(stages, cache_dir)
+    assert results["total"] == 5
+    assert executed == []
+
+
+def test_changed_input_reruns_stage_and_downstream(toy_pipeline):
+    """Test that only the changed source and the stages after it re-run."""
+    stages, cache_dir, a = toy_pipeline
+    run_pipeline(stages, cache_dir)
+    pd.DataFrame({"x": [1, 2, 3, 4]}).to_csv(a, index=False)
+
+    results, executed = run_pipeline(stages, cache_dir)
+    assert executed == ["a", "total"]
+    assert results["total"] == 7
+
+
+def test_missing_output_reruns_stage(toy_pipeline, tmp_path):
+    """Test that a stage re-runs when one of its output files was deleted."""
+    stages, cache_dir, _ = toy_pipeline
+    output = tmp_path / "out.csv"
+    stages[2].outputs = [str(output)]
+    run_pipeline(stages, cache_dir)
+
+    _, executed = run_pipeline(stages, cache_dir)
+    assert executed == ["total"]
+
+
+def test_version_bump_reruns_stage(toy_pipeline):
+    """Test that bumping a stage version invalidates its cached result."""
+    stages, cache_dir, _ = toy_pipeline
+    run_pipeline(stages, cache_dir)
+    stages[1].version = "2"
+
+    _, executed = run_pipeline(stages, cache_dir)
+    assert executed == ["b", "total"]
+
+
+def test_cycle_is_rejected():
+    """Test that a cycle between stages raises an error."""
+    stages = [Stage("a", add, deps=["b"]), Stage("b", add, deps=["a"])]
+    with pytest.raises(ValueError):
+        topological_order(stages)
+
+
+def fail(*counts):
+    raise ValueError("bad data")
+
+
+def test_parallel_matches_sequential(toy_pipeline, tmp_path):
+    """Test that running stages in a process pool gives the same results in the same order."""
+    stages, cache_dir, _ = toy_pipeline
+    sequential, _ = run_pipeline(stages, cache_dir, force=True)
+    parallel, executed = run_pipeline(stages, str(tmp_path / "parallel_cache"), workers=2)
+
+    assert parallel == sequential
+    assert list(parallel) == list(sequential)
+    assert executed == ["a", "b", "total"]
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_stage_error_names_stage(toy_pipeline, workers):
+    """Test that a failing stage surfaces as a StageError naming it."""
+    stages, cache_dir, _ = toy_pipeline
+    stages[2].func = fail
+    with pytest.raises(StageError) as excinfo:
+        run_pipeline(stages, cache_dir, workers=workers)
+    assert excinfo.value.stage_name == "total"
+    assert isinstance(excinfo.value.error, ValueError)
+
+
+def test_helper_module_change_changes_code_version(tmp_path, monkeypatch):
+    """Test that editing a module the stage imports, not only the stage's own module, changes its code version."""
+    package = tmp_path / "toy_stages"
+    package.mkdir()
+    (package / "__init__.py").write_text("")
+    (package / "helpers.py").write_text("def double(x):\n    return 2 * x\n")
+    (package / "stages.py").write_text("from toy_stages.helpers import double\n\n\ndef stage(x):\n    return double(x)\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    stage = importlib.import_module("toy_stages.stages").stage
+
+    before = code_version(stage)
+    assert code_version(stage) == before
+    (package / "helpers.py").write_text("def double(x):\n    return x + x\n")
+    assert code_version(stage) != before
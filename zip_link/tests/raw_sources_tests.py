@@ -0,0 +1,47 @@
+import pandas as pd
+from zip_link.cleaning_analysis.raw_sources import RAW_SOURCES, read_raw
+
+
+def test_transit_matches_full_read():
+    """Test that the projected, filtered read keeps the same rows as reading everything and filtering."""
+    full = pd.read_csv(RAW_SOURCES["public_transit"].path, dtype={"ZCTA20": str})
+    expected = full.loc[full["ZCTA20"].str.startswith("606"), ["ZCTA20", "COUNT_NTM_STOPS"]].reset_index(drop=True)
+    result = read_raw("public_transit")
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_parks_only_reads_declared_columns():
+    result = read_raw("parks")
+    assert list(result.columns) == ["PARK", "LOCATION", "ZIP", "PARK_CLASS"]
+    assert len(result) == len(pd.read_csv(RAW_SOURCES["parks"].path, usecols=["PARK"]))
+
+
+def test_small_chunks_give_same_result():
+    """Test that the predicate is applied per chunk without changing the result."""
+    pd.testing.assert_frame_equal(read_raw("public_transit", block_size=1 << 14), read_raw("public_transit"))
+
+
+def test_other_path_and_missing_values(tmp_path):
+    """Test reading a file other than the default path, keeping missing values as missing."""
+    path = tmp_path / "grocery.csv"
+    pd.DataFrame({
+        "Store Name": ["A", "B", "C"],
+        "Address": ["1 Main St", "", "3 Main St"],
+        "Zip": ["60601", "60602", ""],
+        "New status": ["OPEN", "CLOSED", "OPEN"],
+    }).to_csv(path, index=False)
+
+    result = read_raw("grocery_stores", str(path))
+    assert result["Store Name"].tolist() == ["A", "C"]
+    assert result["Zip"].tolist()[0] == "60601" and pd.isna(result["Zip"].iloc[1])
+
+
+def test_types_do_not_depend_on_the_first_chunk(tmp_path):
+    """Test that a column numeric in the first chunk and text later is read as strings in every chunk."""
+    path = tmp_path / "hospitals.csv"
+    names = [f"Hospital {i}" for i in range(2000)]
+    zips = ["60601"] * 1000 + ["60601-1234"] * 1000
+    pd.DataFrame({"Hospital Name": names, "ZIP Code": zips}).to_csv(path, index=False)
+
+    result = read_raw("hospitals", str(path), block_size=1 << 12)
+    assert result["ZIP Code"].tolist() == zips
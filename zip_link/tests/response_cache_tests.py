@@ -0,0 +1,142 @@
+import pytest
+import asyncio
+import os
+import httpx
+from zip_link.cleaning_analysis.response_cache import ResponseCache, CachingTransport, AsyncCachingTransport
+
+PAGE = "<html><body><table id='comp'></table></body></html>"
+
+
+def make_server(etag='"v1"'):
+    """
+    Fake upstream that honours If-None-Match and records the requests it gets
+    """
+    seen = []
+
+    def handler(request):
+        seen.append(request)
+        if request.headers.get("If-None-Match") == etag:
+            return httpx.Response(304, headers={"ETag": etag})
+        return httpx.Response(200, headers={"ETag": etag, "Content-Type": "text/html"}, text=PAGE)
+
+    return handler, seen
+
+
+def test_revalidation_returns_cached_body(tmp_path):
+    """Tests that a repeat request is conditional and served from the cache on 304."""
+    handler, seen = make_server()
+    cache = ResponseCache(root=str(tmp_path))
+
+    with httpx.Client(transport=CachingTransport(cache, httpx.MockTransport(handler))) as client:
+        first = client.get("https://zipatlas.test/page.htm")
+        second = client.get("https://zipatlas.test/page.htm")
+
+    assert "If-None-Match" not in seen[0].headers
+    assert seen[1].headers["If-None-Match"] == '"v1"'
+    assert first.status_code == second.status_code == 200
+    assert second.text == PAGE
+    assert second.headers["x-cache"] == "revalidated"
+
+
+def test_cache_persists_across_instances(tmp_path):
+    """Tests that the index is reloaded from disk by a new cache."""
+    handler, seen = make_server()
+    with httpx.Client(transport=CachingTransport(ResponseCache(root=str(tmp_path)), httpx.MockTransport(handler))) as client:
+        client.get("https://zipatlas.test/page.htm")
+    with httpx.Client(transport=CachingTransport(ResponseCache(root=str(tmp_path)), httpx.MockTransport(handler))) as client:
+        response = client.get("https://zipatlas.test/page.htm")
+
+    assert response.headers["x-cache"] == "revalidated"
+
+
+def test_identical_bodies_stored_once(tmp_path):
+    """Tests that bodies are content-addressed."""
+    handler, _ = make_server()
+    cache = ResponseCache(root=str(tmp_path))
+    with httpx.Client(transport=CachingTransport(cache, httpx.MockTransport(handler))) as client:
+        client.get("https://zipatlas.test/a.htm")
+        client.get("https://zipatlas.test/b.htm")
+
+    assert len(cache.index) == 2
+    assert len(os.listdir(cache.bodies_dir)) == 1
+
+
+def test_post_body_is_part_of_key(tmp_path):
+    """Tests that different API payloads are cached separately."""
+    handler, _ = make_server()
+    cache = ResponseCache(root=str(tmp_path))
+    with httpx.Client(transport=CachingTransport(cache, httpx.MockTransport(handler))) as client:
+        client.post("https://cps.test/api", json={"pageNumber": 1})
+        response = client.post("https://cps.test/api", json={"pageNumber": 2})
+
+    assert response.headers["x-cache"] == "miss"
+    assert len(cache.index) == 2
+
+
+def test_age_and_size_eviction(tmp_path):
+    """Tests that stale entries and entries beyond the size budget are evicted."""
+    cache = ResponseCache(root=str(tmp_path), max_bytes=10, max_age=60)
+    cache.put("old", "https://a.test", 200, {"etag": '"a"'}, b"12345")
+    cache.index["old"]["validated_at"] -= 120
+    cache.put("new", "https://b.test", 200, {"etag": '"b"'}, b"abcdef")
+    assert set(cache.index) == {"new"}
+
+    cache.put("newest", "https://c.test", 200, {"etag": '"c"'}, b"ghijkl")
+    assert set(cache.index) == {"newest"}
+    assert cache.total_bytes() <= 10
+    assert len(os.listdir(cache.bodies_dir)) == 1
+
+
+def test_async_transport(tmp_path):
+    """Tests that the async transport shares the same revalidation logic."""
+    handler, seen = make_server()
+    cache = ResponseCache(root=str(tmp_path))
+
+    async def fetch_twice():
+        async with httpx.AsyncClient(transport=AsyncCachingTransport(cache, httpx.MockTransport(handler))) as client:
+            await client.get("https://zipatlas.test/page.htm")
+            return await client.get("https://zipatlas.test/page.htm")
+
+    response = asyncio.run(fetch_twice())
+    assert response.text == PAGE
+    assert [r.headers.get("If-None-Match") for r in seen] == [None, '"v1"']
+
+
+def test_put_only_evicts_over_budget(tmp_path, monkeypatch):
+    """Tests that puts within the byte budget skip the eviction pass and keep a running total."""
+    cache = ResponseCache(root=str(tmp_path), max_bytes=100, max_age=60)
+    calls = []
+    monkeypatch.setattr(cache, "evict", lambda now=None: calls.append(now))
+    for i in range(5):
+        cache.put(f"k{i}", f"https://{i}.test", 200, {"etag": f'"{i}"'}, b"0123456789")
+    cache.put("same", "https://same.test", 200, {"etag": '"s"'}, b"0123456789")  # Shares the body of the others
+    assert calls == [] and cache.total_bytes() == 10
+
+    cache.put("k0", "https://0.test", 200, {"etag": '"x"'}, b"new body")  # Replaces an entry
+    assert cache.total_bytes() == 18 and len(os.listdir(cache.bodies_dir)) == 2
+    cache.put("big", "https://big.test", 200, {"etag": '"b"'}, b"x" * 90)
+    assert len(calls) == 1
+
+
+def test_eviction_keeps_shared_bodies(tmp_path):
+    """Tests that a body is deleted only with the last entry pointing to it."""
+    cache = ResponseCache(root=str(tmp_path), max_bytes=12, max_age=60)
+    cache.put("a", "https://a.test", 200, {"etag": '"a"'}, b"shared")
+    cache.put("b", "https://b.test", 200, {"etag": '"b"'}, b"shared")
+    cache.put("c", "https://c.test", 200, {"etag": '"c"'}, b"other!")
+    cache.index["a"]["used_at"] -= 10
+    cache.index["c"]["used_at"] -= 5
+    cache.put("d", "https://d.test", 200, {"etag": '"d"'}, b"third!")
+    # Dropping "a" frees nothing (its body is still used by "b"), so "c" goes too
+    assert set(cache.index) == {"b", "d"} and cache.get("b") is not None
+    assert cache.total_bytes() <= 12
+    assert sorted(os.listdir(cache.bodies_dir)) == sorted({cache.index[k]["digest"] for k in cache.index})
+
+
+def test_cache_dirs_do_not_depend_on_cwd():
+    """Tests that the caches are the same folders whether the code runs from the repo root or zip_link."""
+    from zip_link.cleaning_analysis.pipeline import PIPELINE_CACHE_DIR
+    from zip_link.cleaning_analysis.response_cache import CACHE_DIR
+    from zip_link.cleaning_analysis.storage import PACKAGE_DIR
+    assert CACHE_DIR == os.path.join(PACKAGE_DIR, "data", "raw", "http_cache")
+    assert PIPELINE_CACHE_DIR == os.path.join(PACKAGE_DIR, "data", "preprocessed", ".pipeline_cache")
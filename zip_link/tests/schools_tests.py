@@ -1,15 +1,21 @@
 
 import pytest
+import asyncio
+import json
+import time
+import httpx
 import requests
 import pandas as pd
 import re
-from zip_link.cleaning_analysis.schools_data import extract_zip
+from zip_link.cleaning_analysis import schools_data
+from zip_link.cleaning_analysis.schools_data import extract_zip, scrape_api_paginated, TokenBucket
 
 #30122-project-zip-link/zip_link$ uv run pytest tests/schools_tests.py
 
 URL = "https://www.cps.edu/api/v1/search/results"
 HEADERS = {"Content-Type": "application/json"}
 
+@pytest.mark.live
 def test_api_response():
     """
     Tests if the response from the API is valid
@@ -26,6 +32,8 @@ def test_api_response():
         "contentId": "10375"
     })
     assert response.status_code == 200, f"API request failed. Status :{response.status_code}"
+    # The total the paginated scraper reads, without falling back to probing pages
+    assert isinstance(response.json().get(schools_data.TOTAL_KEY), int)
 
 
 @pytest.mark.parametrize(
@@ -77,3 +85,94 @@ def test_zip_codes_in_valid_range():
     # Assert that every zip code is in the valid_zip_codes list
     for zip_code in zip_codes:
         assert zip_code in valid_zip_codes, f"Invalid zip code found: {zip_code}"
+
+
+def make_api_handler(n_schools, max_page_size, report_total=True):
+    """
+    Builds a fake CPS API that caps the page size and optionally reports the total
+    """
+    schools = [{"title": f"School {i}", "address": f"{i} W Main St, Chicago, IL 606{i % 10:02d}"}
+               for i in range(n_schools)]
+    requested = []
+
+    def handler(request):
+        payload = json.loads(request.content)
+        requested.append(payload)
+        size = min(payload["pageSize"], max_page_size)
+        start = (payload["pageNumber"] - 1) * size
+        body = {"results": schools[start:start + size]}
+        if report_total:
+            body["totalResults"] = n_schools
+        return httpx.Response(200, json=body)
+
+    return handler, requested
+
+
+def test_paginated_fetch_uses_total_and_page_cap():
+    """
+    Tests that the total and effective page size are read from the first response
+    """
+    handler, requested = make_api_handler(n_schools=23, max_page_size=10)
+    df = asyncio.run(scrape_api_paginated(rate=1000, burst=10, transport=httpx.MockTransport(handler)))
+
+    assert df["School Name"].tolist() == [f"School {i}" for i in range(23)]
+    assert requested[0]["pageSize"] == 100
+    assert sorted(p["pageNumber"] for p in requested) == [1, 2, 3]
+
+
+def test_paginated_fetch_without_total(capsys):
+    """
+    Tests that pages are fetched until an empty page, with a warning, when the total is not reported
+    """
+    handler, _ = make_api_handler(n_schools=37, max_page_size=10, report_total=False)
+    df = asyncio.run(scrape_api_paginated(rate=1000, burst=10, transport=httpx.MockTransport(handler)))
+
+    assert len(df) == 37
+    assert df["School Name"].is_unique
+    assert "Warning: no 'totalResults' in the API response (fields: results)" in capsys.readouterr().out
+
+
+def test_paginated_fetch_stops_when_pages_fail():
+    """
+    Tests that probing without a total stops once a whole batch of pages fails
+    """
+    requested = []
+
+    def handler(request):
+        payload = json.loads(request.content)
+        requested.append(payload["pageNumber"])
+        if payload["pageNumber"] == 1:
+            return httpx.Response(200, json={"results": [{"title": "School 0", "address": "1 Main St, Chicago, IL 60601"}]})
+        return httpx.Response(400, text="bad request")
+
+    df = asyncio.run(scrape_api_paginated(rate=1000, burst=10, max_concurrency=5, transport=httpx.MockTransport(handler)))
+    assert len(df) == 1
+    assert sorted(requested) == [1, 2, 3, 4, 5, 6]
+
+
+def test_paginated_fetch_probe_cap(monkeypatch):
+    """
+    Tests that probing stops at MAX_PROBE_PAGES if the API never returns an empty page
+    """
+    monkeypatch.setattr(schools_data, "MAX_PROBE_PAGES", 12)
+
+    def handler(request):
+        return httpx.Response(200, json={"results": [{"title": "School", "address": "1 Main St, Chicago, IL 60601"}]})
+
+    df = asyncio.run(scrape_api_paginated(rate=1000, burst=10, max_concurrency=5, transport=httpx.MockTransport(handler)))
+    assert len(df) == 12
+
+
+def test_token_bucket_rate():
+    """
+    Tests that the token bucket spaces out requests beyond the burst size
+    """
+    async def take(n):
+        bucket = TokenBucket(rate=20, capacity=1)
+        for _ in range(n):
+            await bucket.acquire()
+
+    start = time.perf_counter()
+    asyncio.run(take(5))
+    assert time.perf_counter() - start >= 0.19
+
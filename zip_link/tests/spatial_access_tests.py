@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+import shapely
+from shapely.geometry import Point, box
+from zip_link.cleaning_analysis.bulk_data_processing import clean_population_data
+from zip_link.cleaning_analysis.metros import METROS
+from zip_link.cleaning_analysis.spatial_access import catchment_pairs, two_step_fca, spatial_access_data
+
+# Points in meters
+ZONES = np.array([Point(0, 0), Point(1000, 0), Point(5000, 0)])
+
+
+def test_catchment_pairs_match_all_distances():
+    """Test that the STRtree finds exactly the pairs a full distance matrix keeps."""
+    rng = np.random.default_rng(0)
+    zones = shapely.points(rng.uniform(0, 20000, (200, 2)))
+    stores = shapely.points(rng.uniform(0, 20000, (500, 2)))
+    demand_idx, supply_idx, distance = catchment_pairs(zones, stores, 1500)
+    full = shapely.distance(zones[:, None], stores[None, :])
+    assert set(zip(demand_idx, supply_idx)) == set(zip(*np.nonzero(full <= 1500)))
+    np.testing.assert_allclose(distance, full[demand_idx, supply_idx])
+
+
+def test_two_step_fca_binary():
+    """Test the ratios by hand: one store reached by the first two zones, none by the third."""
+    access = two_step_fca(ZONES, [100, 300, 50], np.array([Point(500, 0)]), radius=1000, decay="binary")
+    np.testing.assert_allclose(access, [1 / 400, 1 / 400, 0])
+
+
+def test_polygons_count_from_their_edge():
+    """Test that a park whose edge is in reach counts even if its center is far away."""
+    park = np.array([box(1500, -100, 9000, 100)])
+    access = two_step_fca(ZONES, [100, 100, 100], park, radius=800, decay="binary")
+    assert access[0] == 0 and access[1] > 0 and access[2] > 0
+
+
+def test_supply_is_conserved():
+    """Test that, with binary decay, the population times access adds up to the facilities in reach."""
+    rng = np.random.default_rng(1)
+    zones = shapely.points(rng.uniform(0, 10000, (50, 2)))
+    stores = shapely.points(rng.uniform(0, 10000, (80, 2)))
+    population = rng.integers(100, 1000, 50)
+    access = two_step_fca(zones, population, stores, radius=1200, decay="binary")
+    reached = np.unique(catchment_pairs(zones, stores, 1200)[1])
+    assert np.isclose((access * population).sum(), len(reached))
+
+
+@pytest.mark.parametrize("decay", ["binary", "gaussian", "gravity"])
+def test_chicago_access(decay):
+    population = clean_population_data("data/raw/population/Population_Data.csv")
+    df = spatial_access_data(population, METROS["chicago"].zip_boundaries, decay=decay)
+    assert len(df) == df["Zip Code"].nunique() == 59
+    assert (df[["grocery_access", "park_access"]] >= 0).all().all()
+    assert (df["park_access"] > 0).mean() > 0.9
@@ -0,0 +1,139 @@
+import os
+import sys
+import types
+import pytest
+import pandas as pd
+from zip_link.cleaning_analysis.storage import (write_table, read_table, export_to_csv, csv_path, DiskSink, MemorySink,
+                                                StagedSink, PREPROCESSED_DIR)
+from zip_link.cleaning_analysis.bulk_data_processing import clean_hospital_data
+from zip_link.cleaning_analysis.pipeline import run_pipeline
+from zip_link.cleaning_analysis.zipatlas_data import zip_bulk_stages
+from zip_link.cleaning_analysis.pdf_tables import PDF_CACHE_DIR
+
+
+@pytest.fixture
+def table():
+    """Small preprocessed table with the dtypes a CSV round trip loses."""
+    return pd.DataFrame({
+        "Zip Code": ["06001", "60601", "60602"],
+        "park_count": pd.array([1, None, 3], dtype="Int64"),
+        "Status": pd.Categorical(["OPEN", "OPEN", "CLOSED"]),
+        "median_property_prices": [312400.0, 250000.5, 0.0],
+    })
+
+
+def test_round_trip_keeps_dtypes(tmp_path, table):
+    """Test that a written table comes back with identical values and dtypes."""
+    path = write_table(table, str(tmp_path / "parks.csv"))
+    assert path.endswith("parks.parquet")
+    pd.testing.assert_frame_equal(read_table(path), table)
+    assert read_table(path)["Zip Code"].iloc[0] == "06001"  # Leading zero kept
+
+
+def test_column_projection(tmp_path, table):
+    """Test that only the requested columns are loaded."""
+    path = write_table(table, str(tmp_path / "parks.parquet"))
+    result = read_table(path, columns=["Zip Code", "park_count"])
+    assert list(result.columns) == ["Zip Code", "park_count"]
+
+
+def test_csv_only_on_request(tmp_path, table):
+    """Test that a CSV copy is written only with export_csv."""
+    path = str(tmp_path / "parks.parquet")
+    write_table(table, path)
+    assert not (tmp_path / "parks.csv").exists()
+    write_table(table, path, export_csv=True)
+    assert (tmp_path / "parks.csv").exists()
+
+
+def test_falls_back_to_csv(tmp_path, table):
+    """Test that a table only available as CSV is still readable."""
+    table.to_csv(tmp_path / "parks.csv", index=False)
+    result = read_table(str(tmp_path / "parks.parquet"), columns=["park_count"])
+    assert result["park_count"].sum() == 4
+
+
+def test_export_to_csv(tmp_path, table):
+    """Test exporting existing Parquet artifacts as CSV."""
+    path = write_table(table, str(tmp_path / "parks.parquet"))
+    export_to_csv([path])
+    exported = pd.read_csv(csv_path(path), dtype={"Zip Code": str})
+    assert list(exported["Zip Code"]) == list(table["Zip Code"])
+
+
+def test_memory_sink(table):
+    """Test that a MemorySink keeps copies of the tables and supports projection."""
+    sink = MemorySink()
+    sink.write("parks", table)
+    table.loc[0, "Zip Code"] = "99999"  # Later edits by the caller do not leak in
+    assert sink.read("parks")["Zip Code"].iloc[0] == "06001"
+    assert list(sink.read("parks", columns=["park_count"]).columns) == ["park_count"]
+    assert sink.outputs(["parks"]) == []
+
+
+def test_staged_sink_publishes_at_the_end(tmp_path, table):
+    """Test that a StagedSink writes nothing until publish, then every table."""
+    sink = StagedSink(str(tmp_path))
+    sink.write("parks", table)
+    sink.write("schools", table.head(1))
+    assert list(tmp_path.iterdir()) == []
+
+    paths = sink.publish()
+    assert sorted(os.path.basename(p) for p in paths) == ["parks.parquet", "schools.parquet"]
+    assert len(DiskSink(str(tmp_path)).read("schools")) == 1
+    assert not [p for p in tmp_path.iterdir() if p.name.endswith(".staged")]
+
+
+def test_cleaners_write_only_to_their_sink(tmp_path):
+    """Test that a cleaner writes nothing without a sink and only under the sink root with one."""
+    raw = tmp_path / "hospitals.csv"
+    pd.DataFrame({"Hospital Name": ["A", "B"], "ZIP Code": ["60601", "60602-1234"]}).to_csv(raw, index=False)
+    before = os.listdir(PREPROCESSED_DIR)
+
+    clean_hospital_data(str(raw))
+    sink = DiskSink(str(tmp_path / "out"))
+    counts = clean_hospital_data(str(raw), sink=sink)
+
+    assert os.listdir(PREPROCESSED_DIR) == before
+    assert os.listdir(tmp_path / "out") == ["hospital_data.parquet"]
+    assert sink.read("hospital_data")["Zip Code"].tolist() == ["60601", "60602"]
+    assert counts["hospital_count"].sum() == 2
+
+
+def test_pipeline_in_memory():
+    """Test that the whole pipeline runs into a MemorySink without touching data/preprocessed."""
+    before = {f: os.path.getmtime(os.path.join(PREPROCESSED_DIR, f)) for f in os.listdir(PREPROCESSED_DIR)}
+    sink = MemorySink()
+    stages = zip_bulk_stages(sink)
+    stages[1].kwargs["convert_pdf"] = False  # Reuse the committed PDF extract instead of starting tabula
+    results, executed = run_pipeline(stages, cache_dir=None)
+
+    assert len(executed) == len(stages)
+    assert "Normalized Accessibility Index" in sink.read("zipatlas_bulk_merge").columns
+    assert set(sink.tables) == {"unified_community_health_data", "unified_community_health_count", "park_data",
+                                "grocery_store_data", "public_transit_data", "hospital_data", "school_data",
+                                "population_data", "zipatlas_bulk_merge", "index_definitions", "spatial_access",
+                                "hex_cells", "hex_cell_zip", "facility_zips", "zip_disagreements", "park_zip_shares",
+                                "spatial_zip_counts"}
+    assert {f: os.path.getmtime(os.path.join(PREPROCESSED_DIR, f)) for f in os.listdir(PREPROCESSED_DIR)} == before
+
+
+def test_memory_run_leaves_no_files(monkeypatch):
+    """Test that a scraping run into a MemorySink writes no raw file and skips the HTTP and PDF caches."""
+    from zip_link.cleaning_analysis import zipatlas_data
+    raw = {f: os.path.getmtime(f) for _, f in zipatlas_data.ZIPATLAS_URLS}
+    cached = os.listdir(PDF_CACHE_DIR) if os.path.exists(PDF_CACHE_DIR) else []
+    clients = []
+    make_async_client = zipatlas_data.make_async_client
+    monkeypatch.setattr(zipatlas_data, "make_async_client",
+                        lambda use_cache=True, *args, **kwargs: clients.append(use_cache) or make_async_client(use_cache, *args, **kwargs))
+    # tabula returns the committed extract, as Java is not always available
+    table = pd.read_csv("data/raw/community_health_ctr/healthcentre_pdf.csv", header=None, dtype=str)
+    monkeypatch.setitem(sys.modules, "tabula", types.SimpleNamespace(read_pdf=lambda *args, **kwargs: [table]))
+
+    sink = zipatlas_data.zip_bulk_data(sink=MemorySink())
+    assert clients == [False]
+    assert {f: os.path.getmtime(f) for _, f in zipatlas_data.ZIPATLAS_URLS} == raw
+    assert (os.listdir(PDF_CACHE_DIR) if os.path.exists(PDF_CACHE_DIR) else []) == cached
+    assert "zipatlas_median_property_prices" in sink.tables and "health_pdf_extract" in sink.tables
+    assert len(sink.read("zipatlas_bulk_merge")) == len(sink.read("zipatlas_median_property_prices"))
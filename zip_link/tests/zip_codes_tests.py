@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+from zip_link.cleaning_analysis.zip_codes import known_zips, normalize_zips, zip_codes, unknown_zips, count_by_zip
+from zip_link.cleaning_analysis.zip_join import join_on_zip
+
+
+def test_known_zips():
+    """Test that the known list is the Chicago boundaries file."""
+    known = known_zips()
+    assert "60601" in known and "60827" in known
+    assert list(known) == sorted(known)
+
+
+def test_normalize_zips():
+    """Test the same normalization the cleaners used to repeat, plus missing values."""
+    result = normalize_zips(pd.Series([60601, 60602.0, "60603-1234", " 60604", "123", None]))
+    assert result.tolist()[:5] == ["60601", "60602", "60603", "60604", "00123"]
+    assert pd.isna(result.iloc[5])
+
+
+def test_known_zips_share_codes():
+    """Test that a known ZIP gets the same code whatever else is in the column."""
+    a = zip_codes(["60601", "60827", "12345"])
+    b = zip_codes([60827, 60601])
+    assert a.cat.codes[1] == b.cat.codes[0]
+    assert a.cat.codes[0] == b.cat.codes[1]
+    assert a.tolist() == ["60601", "60827", "12345"]  # Unknown ZIPs are kept
+
+
+def test_unknown_zips():
+    assert unknown_zips(zip_codes(["60601", "60635", "123", None])) == ["00123", "60635"]
+
+
+def test_metro_known_zips(tmp_path):
+    """Test that another metro's ZIPs come from its own boundaries file or prefix."""
+    path = tmp_path / "boundaries.csv"
+    pd.DataFrame({"ZIP": ["60202", "60201"], "the_geom": ["", ""]}).to_csv(path, index=False)
+    known = known_zips(str(path))
+    assert list(known) == ["60201", "60202"]
+    zips = zip_codes(["60201", "60601", "60202"], known)
+    assert list(zips.cat.categories[:2]) == ["60201", "60202"]
+    assert unknown_zips(zips, known) == ["60601"]
+    assert unknown_zips(zips, zip_prefix="602") == ["60601"]
+
+
+def test_count_by_zip_matches_value_counts():
+    """Test that counting on codes gives the same counts as value_counts."""
+    rng = np.random.default_rng(0)
+    raw = rng.choice(["60601", "60602", "60608", "60635"], 200)
+    counts = count_by_zip(zip_codes(raw), "count")
+    expected = pd.Series(raw).value_counts()
+    assert dict(zip(counts["Zip Code"], counts["count"])) == expected.to_dict()
+    assert counts["count"].is_monotonic_decreasing
+
+
+def test_join_on_canonical_zips():
+    """Test that canonical ZIP columns with different unknown ZIPs join like strings."""
+    base = pd.DataFrame({"Zip Code": zip_codes(["60601", "60602", "60608"]), "x": [1, 2, 3]})
+    other = pd.DataFrame({"Zip Code": zip_codes(["60635", "60608", "60601"]), "y": [7, 8, 9]})
+    result = join_on_zip([base, other])
+    assert result["Zip Code"].dtype == base["Zip Code"].dtype
+    assert result["y"].tolist()[0] == 9 and pd.isna(result["y"].iloc[1]) and result["y"].iloc[2] == 8
@@ -0,0 +1,39 @@
+import pytest
+import numpy as np
+import pandas as pd
+from functools import reduce
+from zip_link.cleaning_analysis.zip_join import join_on_zip
+
+
+@pytest.fixture
+def sources():
+    """ZipAtlas-like base frame plus count sources covering different ZIPs."""
+    rng = np.random.default_rng(0)
+    zips = [f"606{i:02d}" for i in range(1, 40)]
+    base = pd.DataFrame({"Zip Code": [int(z) for z in zips], "median_property_prices": rng.integers(1, 9, 39)})
+    parks = pd.DataFrame({"Zip Code": rng.permutation(zips)[:25], "park_count": rng.integers(1, 9, 25)})
+    schools = pd.DataFrame({"Zip Code": rng.permutation(zips + ["60827"])[:30], "school_count": rng.integers(1, 9, 30)})
+    return [base, parks, schools]
+
+
+@pytest.mark.parametrize("how", ["left", "inner"])
+def test_matches_reduce_merge(sources, how):
+    """Test that the one-pass join gives the same table as iterative pd.merge."""
+    expected = reduce(lambda left, right: pd.merge(left, right, on="Zip Code", how=how),
+                      [df.astype({"Zip Code": "str"}) for df in sources])
+    result = join_on_zip(sources, how=how)
+    pd.testing.assert_frame_equal(result, expected)
+
+
+def test_left_join_keeps_base_rows(sources):
+    """Test that ZIPs missing from a source get NaN and rows are never dropped."""
+    result = join_on_zip(sources, how="left")
+    assert len(result) == len(sources[0])
+    assert result["park_count"].isna().sum() == len(sources[0]) - 25
+
+
+def test_duplicate_keys_rejected(sources):
+    """Test that a source with duplicate ZIPs is rejected instead of multiplying rows."""
+    dup = pd.DataFrame({"Zip Code": ["60601", "60601"], "hospital_count": [1, 2]})
+    with pytest.raises(ValueError):
+        join_on_zip(sources + [dup])
@@ -0,0 +1,92 @@
+import time
+import numpy as np
+import pandas as pd
+import pytest
+import shapely
+from shapely.geometry import box
+from zip_link.cleaning_analysis.metros import METROS, Metro
+from zip_link.cleaning_analysis.pipeline import run_pipeline
+from zip_link.cleaning_analysis.raw_sources import read_raw
+from zip_link.cleaning_analysis.storage import MemorySink
+from zip_link.cleaning_analysis.zip_reassignment import points_in_zips, polygon_zip_shares, reassign_zips, spatial_zip_counts
+from zip_link.cleaning_analysis.zipatlas_data import zip_bulk_stages
+
+# 2 x 2 grid of 1 km ZIPs
+ZONES = np.array([box(0, 0, 1000, 1000), box(1000, 0, 2000, 1000), box(0, 1000, 1000, 2000), box(1000, 1000, 2000, 2000)])
+
+
+def test_points_in_zips_match_every_polygon():
+    """Test the tree query against testing every point with every polygon."""
+    rng = np.random.default_rng(0)
+    points = shapely.points(rng.uniform(-200, 2200, (2000, 2)))
+    zone_of = points_in_zips(points, ZONES)
+    inside = shapely.contains(ZONES[None, :], points[:, None])
+    expected = np.where(inside.any(axis=1), inside.argmax(axis=1), -1)
+    assert (zone_of == expected).all()
+
+
+def test_polygon_shares():
+    """Test that a park over two ZIPs is split by area and one outside the ZIPs keeps only its inside share."""
+    parks = np.array([box(750, 100, 1250, 200), box(1900, 1900, 2100, 2100)])
+    park_idx, zone_idx, share = polygon_zip_shares(parks, ZONES)
+    assert sorted(zip(park_idx, zone_idx, np.round(share, 6))) == [(0, 0, 0.5), (0, 1, 0.5), (1, 3, 0.25)]
+
+
+def test_tens_of_thousands_of_points():
+    rng = np.random.default_rng(1)
+    cells = np.array([box(x, y, x + 100, y + 100) for x in range(0, 5000, 100) for y in range(0, 5000, 100)])
+    points = shapely.points(rng.uniform(0, 5000, (50_000, 2)))
+    start = time.perf_counter()
+    zone_of = points_in_zips(points, cells)
+    assert time.perf_counter() - start < 1
+    assert (zone_of >= 0).all()
+
+
+def test_spatial_zip_counts():
+    """Test that stores count in their spatial ZIP and parks by their share of area."""
+    facilities = pd.DataFrame({"source": ["grocery_stores", "grocery_stores", "grocery_stores", "parks"],
+                               "spatial_zip": ["60601", "60601", None, "60601"]})
+    shares = pd.DataFrame({"park": [0, 0], "Zip Code": ["60601", "60602"], "share": [0.75, 0.25]})
+    counts = spatial_zip_counts(facilities, shares, np.array(["60603", "60602", "60601"], dtype=object))
+    assert counts["Zip Code"].tolist() == ["60601", "60602", "60603"]
+    assert counts["grocery_store_count"].tolist() == [2, 0, 0]
+    assert counts["park_count"].tolist() == [0.75, 0.25, 0.0]
+
+
+def test_chicago_disagreements():
+    sink = MemorySink()
+    facilities = reassign_zips(METROS["chicago"].zip_boundaries, sink=sink)
+    assert set(facilities["source"]) == {"grocery_stores", "parks"}
+    # Stores without a Location are kept, with no spatial ZIP and no disagreement
+    groceries = facilities[facilities["source"] == "grocery_stores"]
+    missing = read_raw("grocery_points")["Location"].isna().to_numpy()
+    assert len(groceries) == len(missing) and missing.any()
+    assert groceries["spatial_zip"].isna().to_numpy()[missing].all() and not groceries["disagrees"].to_numpy()[missing].any()
+    counts = sink.read("spatial_zip_counts")
+    assert counts["grocery_store_count"].sum() == groceries["spatial_zip"].notna().sum()
+    # Most listed ZIPs are right, every park gets a ZIP
+    assert facilities["disagrees"].mean() < 0.2
+    parks = facilities[facilities["source"] == "parks"]
+    assert parks["spatial_zip"].notna().all() and (parks["zip_share"] > 0.5).mean() > 0.95
+
+
+def test_merge_uses_spatial_counts():
+    """Test that with spatial_counts the merge takes the grocery store and park counts of zip_reassignment."""
+    sink = MemorySink()
+    stages = zip_bulk_stages(sink, spatial_counts=True)
+    stages[1].kwargs["convert_pdf"] = False  # Reuse the committed PDF extract instead of starting tabula
+    run_pipeline([s for s in stages if s.name not in {"spatial_access", "hex_access"}], cache_dir=None)
+
+    merged = sink.read("zipatlas_bulk_merge").set_index("Zip Code")
+    counts = sink.read("spatial_zip_counts").set_index("Zip Code").reindex(merged.index)
+    assert np.allclose(merged["park_count"], counts["park_count"])
+    assert np.allclose(merged["grocery_store_count"], counts["grocery_store_count"])
+    # The default merge counts by listed ZIP, which differs for some ZIPs
+    listed = sink.read("park_data")["Zip Code"].value_counts().reindex(merged.index, fill_value=0)
+    assert not np.allclose(listed, counts["park_count"])
+
+
+def test_spatial_counts_need_boundaries():
+    metro = Metro("rockford", "IL", "Rockford", "611", "us/il/rockford")
+    with pytest.raises(ValueError, match="boundaries"):
+        zip_bulk_stages(MemorySink(), metro, spatial_counts=True)
@@ -1,10 +1,15 @@
-from zip_link.cleaning_analysis.zipatlas_data import scrape_zipatlas, create_zipatlas_data
+from zip_link.cleaning_analysis.zipatlas_data import scrape_zipatlas, create_zipatlas_data, parse_zipatlas_table, scrape_zipatlas_async, parse_value, merge_zip_bulk_data
+import asyncio
+import httpx
+import math
 import os 
+import time
 import pandas as pd 
+import pytest
 
-def test_scraping_works():
+def test_scraping_works(tmp_path):
     url = 'https://zipatlas.com/us/il/chicago/zip-code-comparison/lowest-property-prices.htm'
-    output_csv = 'data/raw/zipatlas_data/test_output.csv'
+    output_csv = str(tmp_path / 'test_output.csv')
     # Test real URL scraping
     scrape_zipatlas(url, output_csv)
     # Check that the file has been created
@@ -13,20 +18,147 @@ def test_scraping_works():
     df = pd.read_csv(output_csv)
     assert not df.empty, "Dataframe is empty."
 
-    # Clean up
-    os.remove(output_csv)
-
-def test_successful_merge():
-    df = create_zipatlas_data()
+def test_successful_merge(tmp_zipatlas_urls):
+    df = create_zipatlas_data(urls=tmp_zipatlas_urls)
     assert 'Zip Code' in df.columns, "Zip Code column is missing."
     assert df.shape[1] == 8, f"Expected 8 columns, but got {df.shape[1]} columns."
 
 
-def test_no_missing_values():
+def test_no_missing_values(tmp_zipatlas_urls):
     # Call the function to create the data
-    df = create_zipatlas_data()
+    df = create_zipatlas_data(urls=tmp_zipatlas_urls)
     # Check that the DataFrame has no missing values
     assert df.isnull().sum().sum() == 0, "There are missing values in the dataframe."
 
 
 
+
+SAMPLE_PAGE = """
+<html><body>
+<table id="comp">
+  <thead><tr><td>#</td><td>Zip Code</td><td>Median Property Price</td><td>Population</td></tr></thead>
+  <tbody>
+    <tr><td>1.</td><td>60601</td><td>$312,400</td><td>14,675</td></tr>
+    <tr><td>2.</td><td>60602</td><td>$275,000</td><td>1,244</td></tr>
+  </tbody>
+</table>
+</body></html>
+"""
+
+def test_parse_zipatlas_table():
+    df = parse_zipatlas_table(SAMPLE_PAGE, 'data/raw/zipatlas_data/median_property_prices.csv')
+    assert list(df.columns) == ['Zip Code', 'median_property_prices']
+    assert df['Zip Code'].tolist() == ['60601', '60602']
+    assert df['median_property_prices'].tolist() == [312400.0, 275000.0]
+    assert df.attrs['units'] == {'median_property_prices': 'USD'}
+
+
+def test_parse_value():
+    assert parse_value("$312,400") == (312400.0, "USD")
+    assert parse_value(" 12.4% ") == (12.4, "percent")
+    assert parse_value("1,244") == (1244.0, None)
+    assert parse_value("-$1,000") == (-1000.0, "USD")
+    value, unit = parse_value("N/A")
+    assert math.isnan(value) and unit is None
+
+
+def test_create_zipatlas_data_is_typed():
+    df = create_zipatlas_data(scrape=False)
+    assert all(df[col].dtype == "float64" for col in df.columns if col != 'Zip Code')
+    assert df.attrs['units']['median_property_prices'] == 'USD'
+    assert df.attrs['units']['poverty_levels'] == 'percent'
+
+
+def test_merge_rejects_untyped_columns():
+    zipatlas = pd.DataFrame({'Zip Code': ['60601'], 'median_property_prices': ['$312,400']})
+    counts = [pd.DataFrame({'Zip Code': ['60601'], name: [1]}) for name in
+              ['cnt_comm_health_ctr', 'park_count', 'grocery_store_count', 'num_public_transit_stops',
+               'hospital_count', 'school_count', 'Population']]
+    with pytest.raises(TypeError):
+        merge_zip_bulk_data(zipatlas, *counts)
+
+
+def test_parse_zipatlas_table_missing():
+    assert parse_zipatlas_table("<html><body><p>No table</p></body></html>", 'data/x.csv') is None
+
+
+def test_async_scrape_is_concurrent(tmp_path):
+    delay = 0.2
+
+    async def handler(request):
+        await asyncio.sleep(delay)
+        return httpx.Response(200, text=SAMPLE_PAGE)
+
+    urls = [(f"https://zipatlas.test/page{i}.htm", str(tmp_path / f"metric_{i}.csv")) for i in range(7)]
+    start = time.perf_counter()
+    dfs = asyncio.run(scrape_zipatlas_async(urls, transport=httpx.MockTransport(handler)))
+    elapsed = time.perf_counter() - start
+
+    # All pages are in flight together, so wall time is close to a single page
+    assert elapsed < delay * 3, f"Scraping took {elapsed:.2f}s"
+    assert [df.columns[1] for df in dfs] == [f"metric_{i}" for i in range(7)]
+    assert all(os.path.exists(f) for _, f in urls)
+
+
+def test_async_scrape_failed_page(tmp_path):
+    def handler(request):
+        return httpx.Response(503)
+
+    urls = [("https://zipatlas.test/page.htm", str(tmp_path / "metric.csv"))]
+    dfs = asyncio.run(scrape_zipatlas_async(urls, transport=httpx.MockTransport(handler)))
+    assert dfs == [None]
+    assert not os.path.exists(urls[0][1])
+
+
+def test_sync_scrape_shares_one_client(tmp_path, monkeypatch):
+    """Test that the sequential scrape opens one client for all the pages instead of one per page."""
+    from zip_link.cleaning_analysis import zipatlas_data
+    opened = []
+
+    def fake_client(*args, **kwargs):
+        opened.append(kwargs)
+        return httpx.Client(transport=httpx.MockTransport(lambda request: httpx.Response(200, text=SAMPLE_PAGE)))
+
+    monkeypatch.setattr(zipatlas_data, "make_client", fake_client)
+    urls = [(f"https://zipatlas.test/page{i}.htm", str(tmp_path / f"metric_{i}.csv")) for i in range(3)]
+    df = create_zipatlas_data(concurrent=False, urls=urls)
+    assert len(opened) == 1
+    assert list(df.columns) == ["Zip Code", "metric_0", "metric_1", "metric_2"]
+
+
+def test_scraped_tables_are_not_read_back(tmp_path, monkeypatch):
+    """Test that the scraped tables are merged as they are, and only a failed page is read from its raw file."""
+    from zip_link.cleaning_analysis import zipatlas_data
+    read = []
+    monkeypatch.setattr(zipatlas_data, "read_zipatlas_csv", lambda path: read.append(path) or zipatlas_data.zipatlas_frame(
+        [("60601", "1"), ("60602", "2")], "metric_2"))
+
+    async def handler(request):
+        return httpx.Response(503 if request.url.path == "/page2.htm" else 200, text=SAMPLE_PAGE)
+
+    async def scrape(urls):
+        return await scrape_zipatlas_async(urls, transport=httpx.MockTransport(handler))
+
+    monkeypatch.setattr(zipatlas_data, "scrape_zipatlas_async", scrape)
+    urls = [(f"https://zipatlas.test/page{i}.htm", str(tmp_path / f"metric_{i}.csv")) for i in range(3)]
+    df = create_zipatlas_data(urls=urls)
+    assert read == [urls[2][1]]
+    assert df["metric_0"].tolist() == [312400.0, 275000.0] and df["metric_2"].tolist() == [1.0, 2.0]
+
+
+def test_short_rows_are_skipped():
+    page = SAMPLE_PAGE.replace("<tbody>", "<tbody><tr><td colspan='4'>Advertisement</td></tr>")
+    df = parse_zipatlas_table(page, 'data/x.csv')
+    assert df["Zip Code"].tolist() == ["60601", "60602"]
+
+
+def test_async_scrape_keeps_other_pages(tmp_path):
+    """Test that a page failing with an error is returned as None without losing the other pages."""
+    def handler(request):
+        if request.url.path == "/bad.htm":
+            raise httpx.ConnectError("refused")
+        return httpx.Response(200, text=SAMPLE_PAGE)
+
+    urls = [("https://zipatlas.test/bad.htm", str(tmp_path / "bad.csv")), ("https://zipatlas.test/good.htm", str(tmp_path / "good.csv"))]
+    dfs = asyncio.run(scrape_zipatlas_async(urls, transport=httpx.MockTransport(handler)))
+    assert dfs[0] is None and dfs[1]["good"].tolist() == [312400.0, 275000.0]
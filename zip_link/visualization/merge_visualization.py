@@ -1,3 +1,4 @@
+import os
 import dash
 from dash import dcc, html
 import pandas as pd
@@ -7,11 +8,27 @@ import plotly.express as px
 import plotly.graph_objects as go
 from dash.dependencies import Input, Output
 import dash_leaflet as dl
+from zip_link.cleaning_analysis.storage import read_table, DiskSink
+from zip_link.cleaning_analysis.accessibility_index import INDEX_DEFINITIONS, index_definitions, zip_areas
+from zip_link.cleaning_analysis.metros import METROS, metro_dir
+from zip_link.cleaning_analysis.zip_codes import zip_codes
 
-# Load the preprocessed data
-data_path = "data/preprocessed/zipatlas_bulk_merge.csv"
-df = pd.read_csv(data_path)
-df["Zip Code"] = df["Zip Code"].astype(str)
+# Load Chicago's preprocessed data (Parquet in its partition, or the tracked CSV export if the pipeline was not run)
+data_path = DiskSink(metro_dir(METROS["chicago"])).path("zipatlas_bulk_merge")
+if not os.path.exists(data_path):
+    data_path = "data/preprocessed/zipatlas_bulk_merge.csv"
+df = read_table(data_path)
+df["Zip Code"] = zip_codes(df["Zip Code"])  # Also canonical when read from the CSV export
+
+# Every index definition, computed once by the pipeline (or here, from the merged data, if it was not run)
+definitions_path = DiskSink(metro_dir(METROS["chicago"])).path("index_definitions")
+if os.path.exists(definitions_path):
+    df_definitions = read_table(definitions_path)
+else:
+    df_definitions = index_definitions(df, zip_areas(METROS["chicago"].zip_boundaries))
+df_definitions["Zip Code"] = zip_codes(df_definitions["Zip Code"])
+df = df.merge(df_definitions, on="Zip Code", how="left")
+index_columns = ["Normalized Accessibility Index"] + [f"{name}_index" for name in INDEX_DEFINITIONS]
 
 # Load ZIP Code shapefile
 df_shapefile = pd.read_csv("visualization/Boundaries_-_ZIP_Codes_20250222.csv")
@@ -20,7 +37,7 @@ df_shapefile["the_geom"] = df_shapefile["the_geom"].apply(loads)
 gdf = gpd.GeoDataFrame(df_shapefile, geometry="the_geom", crs="EPSG:4326")
 gdf.to_file("visualization/zcta_shapefile.shp", driver="ESRI Shapefile")
 gdf_zcta = gpd.read_file("visualization/zcta_shapefile.shp")
-gdf_zcta["ZIP"] = gdf_zcta["ZIP"].astype(str)
+gdf_zcta["ZIP"] = zip_codes(gdf_zcta["ZIP"])
 merged_gdf = gdf_zcta.merge(df, left_on='ZIP', right_on='Zip Code')
 merged_gdf["lon"] = merged_gdf.geometry.centroid.x
 merged_gdf["lat"] = merged_gdf.geometry.centroid.y
@@ -31,8 +48,8 @@ non_discrete_vars = [
     "median_property_prices", "median_housing_costs", "owner_median_housing_costs",
     "renter_median_housing_costs", "housing_cost_perc_income", "unemployment_rates",
     "poverty_levels", "park_count", "total_healthcare_services", "num_public_transit_stops", 
-    "grocery_store_count" ,"school_count", "Normalized Accessibility Index"
-] 
+    "grocery_store_count" ,"school_count"
+] + index_columns
 
 # Formats to be applied to each of these variables
 format_dict = {
@@ -48,7 +65,7 @@ format_dict = {
     "num_public_transit_stops": lambda x:x, 
     "grocery_store_count": lambda x:x,
      "school_count": lambda x:x,
-    "Normalized Accessibility Index": lambda x: x 
+    **{col: lambda x: round(x, 6) for col in index_columns}
 }
 
 app = dash.Dash(__name__)
@@ -74,6 +91,18 @@ app.layout = html.Div(style={"backgroundColor": "#041C24", "padding": "20px"}, c
         ),
     ], style={"textAlign": "center", "padding": "20px"}),
 
+    # Switch between the index definitions, all read from the same table
+    html.Div([
+        html.Label("Accessibility Index Definition:", style={"fontSize": "18px", "color": "#E1E1E8"}),
+        dcc.RadioItems(
+            id="index-definition",
+            options=[{'label': col.replace('_', ' ').title(), 'value': col} for col in index_columns],
+            value="Normalized Accessibility Index",
+            inline=True,
+            style={"color": "#E1E1E8"}
+        ),
+    ], style={"textAlign": "center", "padding": "10px"}),
+
     # First 2 visualizations
 
     dcc.Graph(id="choropleth-map"),
@@ -106,10 +135,10 @@ app.layout = html.Div(style={"backgroundColor": "#041C24", "padding": "20px"}, c
 # Callback to update visualizations
 @app.callback(
     [Output("choropleth-map", "figure"), Output("scatter-plot", "figure")],
-    Input("variable-dropdown", "value")
+    [Input("variable-dropdown", "value"), Input("index-definition", "value")]
 )
 
-def update_visualizations(selected_variable):
+def update_visualizations(selected_variable, index_column):
 
     formatted_column_name = selected_variable.replace('_', ' ').title()
     merged_gdf[formatted_column_name] = merged_gdf[selected_variable].apply(format_dict[selected_variable])
@@ -128,8 +157,10 @@ def update_visualizations(selected_variable):
         "num_public_transit_stops": "Number of Public Transport Transits",
         "grocery_store_count": 'Number of Grocery Stores',
         "poverty_levels": 'Poverty Levels',
-        "Normalized Accessibility Index": "Normalized Accessibility Index"
+        "Normalized Accessibility Index": "Normalized Accessibility Index",
+        **{f"{name}_index": f"Accessibility Index ({name.replace('_', ' ')})" for name in INDEX_DEFINITIONS}
     }
+    index_title = variable_titles[index_column]
 
     # Set up Choropleth Map
     fig_map = px.choropleth_map(
@@ -141,7 +172,7 @@ def update_visualizations(selected_variable):
         hover_data={'Zip Code': False,
             selected_variable: False,
             formatted_column_name: True,
-            'Normalized Accessibility Index': True},
+            index_column: True},
         color_continuous_scale="Blues",
         opacity=0.8,
         center={"lat": 41.8500, "lon": -87.6000},
@@ -192,22 +223,22 @@ def update_visualizations(selected_variable):
     # Get desired format of selected variable
     df[formatted_column_name] = df[selected_variable].apply(format_dict[selected_variable])
 
-    # Visualize Normalized Accessibility Index against selected var 
+    # Visualize the selected Accessibility Index definition against selected var 
     fig_scatter = px.scatter(
         df,
         x=selected_variable,
-        y="Normalized Accessibility Index",
-        title=f"{variable_titles.get(selected_variable, selected_variable)} vs Accessibility Index",
+        y=index_column,
+        title=f"{variable_titles.get(selected_variable, selected_variable)} vs {index_title}",
         hover_data={
             'Zip Code': True,
             selected_variable: False,
             formatted_column_name: True,
-            'Normalized Accessibility Index': True
+            index_column: True
         }
     )
 
-    # Set up horizontal red line to show avg Normalized Accessibility Index in Chicago 
-    avg_accessibility_index = df["Normalized Accessibility Index"].mean()
+    # Set up horizontal red line to show avg Accessibility Index in Chicago 
+    avg_accessibility_index = df[index_column].mean()
     fig_scatter.add_hline(
         y=avg_accessibility_index,
         line_dash="dash",